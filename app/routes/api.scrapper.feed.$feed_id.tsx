@@ -19,7 +19,18 @@ function escapeXml(unsafe: string = ""): string {
     .replace(/'/g, "&apos;");
 }
 
-function jsonToXml(content: any): string {
+/**
+ * Thumbnail for the requested output ("ctv", "web", ...): the scrapers store
+ * CDN-resized renditions per output next to the default thumbnail_url.
+ */
+function thumbnailFor(item: any, output: string | null): string | undefined {
+  if (output && item.thumbnail_renditions?.[output]) {
+    return item.thumbnail_renditions[output];
+  }
+  return item.thumbnail_url;
+}
+
+function jsonToXml(content: any, output: string | null = null): string {
   const channel = content.channel;
 
   let xml = `<?xml version="1.0" encoding="utf-8"?>\n`;
@@ -75,8 +86,9 @@ function jsonToXml(content: any): string {
         xml += `        <ctv:thumbnails>${escapeXml(thumb)}</ctv:thumbnails>\n`;
       }
     }
-    if (item.thumbnail_url) {
-      xml += `        <ctv:thumbnail_url>${escapeXml(item.thumbnail_url)}</ctv:thumbnail_url>\n`;
+    const thumbnailUrl = thumbnailFor(item, output);
+    if (thumbnailUrl) {
+      xml += `        <ctv:thumbnail_url>${escapeXml(thumbnailUrl)}</ctv:thumbnail_url>\n`;
     }
     if (item.sentiment) {
       xml += `        <ctv:sentiment>${escapeXml(item.sentiment)}</ctv:sentiment>\n`;
@@ -93,8 +105,9 @@ function jsonToXml(content: any): string {
   return xml;
 }
 
-export async function loader({ params }: LoaderFunctionArgs) {
+export async function loader({ params, request }: LoaderFunctionArgs) {
   const { feed_id } = params;
+  const output = new URL(request.url).searchParams.get("output"); // e.g. ?output=web
 
   if (!feed_id) {
     return json({ error: "Feed ID is required" }, { status: 400 });
@@ -140,7 +153,7 @@ export async function loader({ params }: LoaderFunctionArgs) {
       }
     }
 
-    const xml = jsonToXml(parsed);
+    const xml = jsonToXml(parsed, output);
 
     return new Response(xml, {
       headers: { "Content-Type": "application/xml" },
@@ -0,0 +1,119 @@
+from bs4 import BeautifulSoup, Tag
+
+from html_parsing import is_feed_link
+
+MAX_CONTEXT_PARAGRAPHS = 3
+BOILERPLATE_KEYWORDS = ["nav", "menu", "header", "footer", "sidebar", "widget", "trending", "related"]
+
+
+def _is_icon_link(tag: Tag) -> bool:
+    rel = tag.get("rel") or []
+    if isinstance(rel, str):
+        rel = [rel]
+    return any("icon" in r.lower() for r in rel)
+
+
+def collect_anchor_contexts(soup: BeautifulSoup, max_paragraphs: int = MAX_CONTEXT_PARAGRAPHS) -> dict:
+    """
+    Walk the document once and return everything the listing scrapers need per link:
+
+        {
+            "favicon": <link rel=icon> Tag or None,
+            "feeds": [<link rel=alternate type=rss/atom> Tag, ...],
+            "anchors": [
+                {"tag": a, "href": str, "title": str,
+                 "paragraphs": [text, ...],   # first max_paragraphs <p> under the anchor's parent
+                 "img": Tag or None,          # first <img> under the anchor's parent
+                 "time": Tag or None},        # first <time> under the anchor's parent
+                ...
+            ],
+        }
+
+    This matches a.find_parent() + parent.find_all("p", limit=N) + parent.find("img")
+    (+ parent.find("time")) per anchor, but each subtree is summarised bottom-up once instead of being
+    rescanned for every link inside it. Anchors come back in document order.
+    """
+    summaries = {}   # id(tag) -> (first <p> tags, first <img> tag, first <time> tag)
+    anchors = []
+    favicon = None
+    feeds = []
+
+    stack = [(soup, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            # pre-order: document order for anchors, feed links and the first icon link
+            if node.name == "a" and node.has_attr("href"):
+                anchors.append(node)
+            elif node.name == "link":
+                if favicon is None and _is_icon_link(node):
+                    favicon = node
+                elif node.has_attr("href") and is_feed_link(node.get("rel"), node.get("type")):
+                    feeds.append(node)
+            stack.append((node, True))
+            for child in reversed(node.contents):
+                if isinstance(child, Tag):
+                    stack.append((child, False))
+            continue
+
+        # post-order: fold the children's summaries into this node's
+        paragraphs, img, time = [], None, None
+        for child in node.contents:
+            if not isinstance(child, Tag):
+                continue
+            child_paragraphs, child_img, child_time = summaries[id(child)]
+            if len(paragraphs) < max_paragraphs:
+                if child.name == "p":
+                    paragraphs.append(child)
+                paragraphs.extend(child_paragraphs[: max_paragraphs - len(paragraphs)])
+            if img is None:
+                img = child if child.name == "img" else child_img
+            if time is None:
+                time = child if child.name == "time" else child_time
+        summaries[id(node)] = (paragraphs, img, time)
+
+    paragraph_text = {}
+    results = []
+    for a in anchors:
+        parent = a.parent
+        texts, img, time = [], None, None
+        if parent is not None:
+            parent_paragraphs, img, time = summaries[id(parent)]
+            for p in parent_paragraphs:
+                key = id(p)
+                if key not in paragraph_text:
+                    paragraph_text[key] = p.get_text(strip=True)
+                texts.append(paragraph_text[key])
+        results.append({
+            "tag": a,
+            "href": a["href"],
+            "title": a.get_text(strip=True),
+            "paragraphs": texts,
+            "img": img,
+            "time": time,
+        })
+
+    return {"favicon": favicon, "feeds": feeds, "anchors": results}
+
+
+def boilerplate_mask(soup: BeautifulSoup, keywords: list[str] = BOILERPLATE_KEYWORDS) -> set:
+    """
+    Return the ids (id(tag)) of every tag that sits in a navigation/footer/sidebar-style
+    region, i.e. the tag itself or one of its ancestors has a class or id containing
+    one of the keywords. Built in one top-down pass, so checking a link afterwards is
+    just `id(a) in mask` instead of re-walking its ancestors.
+    """
+    mask = set()
+    stack = [(soup, False)]
+    while stack:
+        node, inside = stack.pop()
+        if not inside:
+            classes = " ".join(node.get("class", [])).lower()
+            node_id = (node.get("id") or "").lower()
+            inside = any(k in classes or k in node_id for k in keywords)
+        if inside:
+            mask.add(id(node))
+        for child in node.contents:
+            if isinstance(child, Tag):
+                stack.append((child, inside))
+    return mask
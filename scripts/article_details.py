@@ -0,0 +1,203 @@
+import os
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin
+
+from html_parsing import make_soup
+from parse_pool import ParsePool
+from seen_articles import SeenArticleIndex
+from url_classifier import UrlPatternModel, article_shape, looks_like_article
+from url_utils import canonical_url, prefer_canonical
+from pub_dates import html_published, parse_date, url_date, format_pubdate, is_stale
+
+# ----------------------------
+# Config
+# ----------------------------
+MAX_CONTENT_CHARS = 20000   # article text kept per page for keyword (re)matching
+
+THIN_LISTING_WORDS = int(os.getenv("DETAILS_THIN_WORDS", "12"))         # listing context words per headline below this → too thin to match on
+MAX_DETAILS_PER_SOURCE = int(os.getenv("MAX_DETAILS_PER_SOURCE", "15"))  # details fetches per source and run
+MAX_DETAILS_PER_PAGE = int(os.getenv("MAX_DETAILS_PER_PAGE", "80"))      # links of one homepage queued in details mode
+MIN_DETAILS_SCORE = 0.3      # links less likely than this to be an article are never fetched
+MIN_DETAILS_YIELD = 0.05     # keyword matches per details fetch below which the source goes back to headline depth
+DETAILS_RECHECK = timedelta(days=int(os.getenv("DETAILS_RECHECK_DAYS", "7")))   # a demoted source is measured again after this
+YIELD_WEIGHT = 0.3           # weight of the latest run in the moving average
+
+HEADLINE, DETAILS = "headline", "details"
+
+
+# ----------------------------
+# Extract Details (keyword-independent, stored in the seen index)
+# ----------------------------
+def extract_details(article_url: str, html: str) -> dict:
+    soup = make_soup(html)
+
+    title_tag = soup.find("title")
+    title = title_tag.get_text(strip=True) if title_tag else ""
+    paragraphs = [p.get_text(strip=True) for p in soup.find_all("p") if p.get_text(strip=True)]
+    content_text = " ".join(paragraphs)[:MAX_CONTENT_CHARS]
+
+    img_url = ""
+    og_img = soup.find("meta", property="og:image")
+    if og_img and og_img.get("content"):
+        img_url = urljoin(article_url, og_img["content"].strip())
+
+    author, pub_date = "", ""
+    author_tag = soup.find("meta", attrs={"name": "author"})
+    if author_tag and author_tag.get("content"):
+        author = author_tag["content"]
+    published = html_published(soup)   # meta tags, JSON-LD datePublished, <time>
+    pub_date = published.isoformat() if published else ""
+
+    canonical_tag = soup.find("link", rel="canonical", href=True)
+    canonical = canonical_tag["href"].strip() if canonical_tag else ""
+    og_type = soup.find("meta", property="og:type")
+
+    return {
+        "title": title,
+        "content_text": content_text,
+        "thumbnail_url": img_url,
+        "author": author,
+        "published_time": pub_date,
+        "canonical": canonical,
+        "og_type": og_type.get("content", "").strip() if og_type else "",
+    }
+
+
+def details_published(details: dict, article_url: str):
+    """Real publication time of a details page: its metadata, else the URL's date segment."""
+    return parse_date(details.get("published_time")) or url_date(article_url)
+
+
+# ----------------------------
+# Load Details (seen index → fetch only new links)
+# ----------------------------
+async def load_details(article_url: str, fetch, seen_index: SeenArticleIndex, url_model: UrlPatternModel = None, parse_pool: ParsePool = None):
+    """
+    Details of an article page, or None. Pages in the seen index are not fetched;
+    otherwise `fetch` (async url → response, None on network error / open
+    breaker) is awaited, the page parsed (in a parse_pool worker if given) and
+    the result recorded in the seen index and url_model.
+    """
+    seen, details = seen_index.get(article_url)
+    if seen:
+        return details
+
+    r = await fetch(article_url)
+    if not r:
+        return None   # network error / breaker: not recorded, retried next run
+    if r.status_code != 200:
+        seen_index.put(article_url, None)
+        return None
+
+    if parse_pool is not None:
+        details = await parse_pool.run(extract_details, article_url, r.text)
+    else:
+        details = extract_details(article_url, r.text)
+    seen_index.put(article_url, details)
+    if url_model is not None:
+        url_model.learn(article_url, looks_like_article(details))
+    return details
+
+
+def details_article(details: dict, article_url: str, creator: str, favicon_url: str, published) -> dict:
+    """Feed item for a matching details page (link switched to the page's canonical URL)."""
+    content_text = details["content_text"]
+    link = prefer_canonical(article_url, details.get("canonical"))   # 🔹 rows stored before canonicals have none
+    return {
+        "title": details["title"],
+        "description": content_text[:500],
+        "link": link,
+        "guid": {"isPermaLink": True, "value": canonical_url(link)},
+        "dc:creator": creator,
+        "pubDate": format_pubdate(published),
+        "thumbnails": favicon_url,
+        "thumbnail_url": details["thumbnail_url"],
+        "content_text": content_text[:2000],
+        "author": details["author"],
+        "published_time": details["published_time"],
+    }
+
+
+def merge_details(article: dict, details: dict, published) -> dict:
+    """A listing headline completed from its details page: body text as description, page image and date if missing."""
+    merged = dict(article)
+    merged["description"] = details["content_text"][:500] or article["description"]
+    merged["thumbnail_url"] = article.get("thumbnail_url") or details["thumbnail_url"]
+    if published:
+        merged["pubDate"] = format_pubdate(published)
+    link = prefer_canonical(article["link"], details.get("canonical"))
+    merged["link"], merged["guid"] = link, {"isPermaLink": True, "value": canonical_url(link)}
+    return merged
+
+
+# ----------------------------
+# Extraction depth (per source, from measured yield)
+# ----------------------------
+def listing_words(candidates: list[dict]) -> float:
+    """Mean number of words a headline's listing context offers to the keyword matcher."""
+    if not candidates:
+        return 0.0
+    return sum(len(c["context"].split()) for c in candidates) / len(candidates)
+
+
+def choose_depth(state, words: float) -> str:
+    """
+    HEADLINE when the listing text is rich enough to match on. Thin listings get
+    DETAILS while details fetches keep finding matches (MIN_DETAILS_YIELD);
+    a source demoted for low yield is measured again after DETAILS_RECHECK.
+    """
+    if words >= THIN_LISTING_WORDS:
+        return HEADLINE
+    if state is None or state.detailsYield is None or state.detailsYield >= MIN_DETAILS_YIELD:
+        return DETAILS
+    checked = state.detailsCheckedAt
+    return DETAILS if checked is None or checked <= datetime.now(timezone.utc) - DETAILS_RECHECK else HEADLINE
+
+
+def details_score(url_model: UrlPatternModel, candidate: dict) -> float:
+    """How likely a headline link is to be an article: the learned share for its URL shape, else a shape prior."""
+    link = candidate["article"]["link"]
+    share = url_model.article_share(link)
+    if share is None:
+        share = 0.6 if article_shape(link) else 0.2
+    return share + (0.2 if candidate.get("published") else 0.0)
+
+
+def link_score(url_model: UrlPatternModel, link: str, anchor_text: str, position: int, total: int, keyword_hit: bool) -> float:
+    """
+    Priority of a homepage link in details mode: article likelihood of its URL
+    shape, plus headline-length anchor text, anchor text already naming a keyword,
+    and position (lead stories come first in the document).
+    """
+    share = url_model.article_share(link)
+    if share is None:
+        share = 0.6 if article_shape(link) else 0.2
+    words = len(anchor_text.split())
+    text = 0.2 if 5 <= words <= 30 else (0.1 if words >= 3 else 0.0)
+    return share + text + (0.5 if keyword_hit else 0.0) + 0.2 * (1 - position / max(total, 1))
+
+
+def pick_details_links(url_model: UrlPatternModel, candidates: list[dict], matched: set, since, limit: int = MAX_DETAILS_PER_SOURCE) -> list[dict]:
+    """
+    Candidates worth a details fetch: not matched at headline depth already, not
+    dated before `since`, not a learned navigation shape (is_nav, with its
+    exploration), scored at least MIN_DETAILS_SCORE; best `limit` first.
+    """
+    scored = []
+    for candidate in candidates:
+        link = candidate["article"]["link"]
+        if canonical_url(link) in matched or is_stale(candidate.get("published"), since) or url_model.is_nav(link):
+            continue
+        score = details_score(url_model, candidate)
+        if score >= MIN_DETAILS_SCORE:
+            scored.append((score, candidate))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [candidate for _, candidate in scored[:limit]]
+
+
+def updated_yield(previous, matches: int, fetched: int):
+    """Moving average of keyword matches per details fetch; unchanged when nothing was fetched."""
+    if not fetched:
+        return previous
+    current = matches / fetched
+    return current if previous is None else previous * (1 - YIELD_WEIGHT) + current * YIELD_WEIGHT
@@ -0,0 +1,104 @@
+import os
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from prisma import Prisma
+
+from url_utils import canonical_url, url_hash
+
+# ----------------------------
+# Settings
+# ----------------------------
+META_TTL = timedelta(days=int(os.getenv("ARTICLE_META_TTL_DAYS", "30")))   # og:image etc. rarely change
+MISSING_TTL = timedelta(days=1)                                            # non-200 page: negative entry
+FAILED_TTL = timedelta(hours=1)                                            # timeout / network error: retry next run
+MAX_ENTRIES = int(os.getenv("ARTICLE_META_CACHE_SIZE", "50000"))           # in-memory LRU bound
+LOAD_CHUNK = 1000
+
+META_FIELDS = {"og_image": "ogImage", "published_time": "publishedTime", "author": "author", "canonical": "canonical"}
+
+OK, MISSING, FAILED = "ok", "missing", "failed"
+
+
+class ArticleMetaCache:
+    """
+    og:image / published time / author per article URL, kept across runs.
+
+    Keyed by a hash of the canonical URL. Entries expire after META_TTL; pages
+    that answered non-200 (MISSING) or did not answer at all (FAILED) are cached
+    as negative entries with shorter TTLs, so a dead page is not re-fetched on
+    every run. In memory the cache is an LRU bounded by MAX_ENTRIES.
+
+    Call load(db, urls) before enriching a batch of articles, get() before any
+    network call, put() after it, and save(db) / prune(db) before disconnecting.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple] = OrderedDict()   # url hash -> (status, meta, expires_at)
+        self.dirty: dict[str, tuple] = {}                       # url hash -> (url, status, meta, expires_at), kept if evicted
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, status: str, meta: dict, expires_at: datetime):
+        self.entries[key] = (status, meta, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, url: str):
+        """Return (hit, meta); meta is None for a negative entry."""
+        key = url_hash(url)
+        entry = self.entries.get(key)
+        if entry is None or entry[2] <= datetime.now(timezone.utc):
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, url: str, meta: dict, failed: bool = False):
+        """Store a fetch result: meta dict, or None for a non-200 page (failed=True for a network error)."""
+        if meta is not None:
+            status, ttl = OK, META_TTL
+        elif failed:
+            status, ttl = FAILED, FAILED_TTL
+        else:
+            status, ttl = MISSING, MISSING_TTL
+        key = url_hash(url)
+        expires_at = datetime.now(timezone.utc) + ttl
+        self._remember(key, status, meta, expires_at)
+        self.dirty[key] = (canonical_url(url), status, meta, expires_at)
+
+    async def load(self, db: Prisma, urls: list[str]):
+        keys = list({url_hash(u) for u in urls} - self.entries.keys())
+        now = datetime.now(timezone.utc)
+        for i in range(0, len(keys), LOAD_CHUNK):
+            rows = await db.articlemeta.find_many(
+                where={"urlHash": {"in": keys[i : i + LOAD_CHUNK]}, "expiresAt": {"gt": now}}
+            )
+            for row in rows:
+                meta = None
+                if row.status == OK:
+                    meta = {field: getattr(row, column) or "" for field, column in META_FIELDS.items()}
+                self._remember(row.urlHash, row.status, meta, row.expiresAt)
+
+    async def save(self, db: Prisma):
+        if not self.dirty:
+            return
+        async with db.batch_() as batcher:
+            for key, (url, status, meta, expires_at) in self.dirty.items():
+                values = {"url": url, "status": status, "expiresAt": expires_at}
+                for field, column in META_FIELDS.items():
+                    values[column] = (meta or {}).get(field) or None
+                batcher.articlemeta.upsert(
+                    where={"urlHash": key},
+                    data={"create": {"urlHash": key, **values}, "update": values},
+                )
+        logging.info(f"[META] saved {len(self.dirty)} entries ({self.hits} cache hits, {self.misses} misses this run)")
+        self.dirty.clear()
+
+    async def prune(self, db: Prisma):
+        removed = await db.articlemeta.delete_many(where={"expiresAt": {"lt": datetime.now(timezone.utc)}})
+        logging.info(f"[META] pruned {removed} expired entries")
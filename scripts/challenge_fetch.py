@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import cloudscraper
+
+# ----------------------------
+# Config
+# ----------------------------
+CHALLENGE_CACHE_DIR = os.getenv("CHALLENGE_CACHE_DIR", ".cache/challenge")
+CHALLENGE_WORKERS = int(os.getenv("CHALLENGE_WORKERS", "4"))
+SESSION_TTL_SECONDS = 30 * 60   # solved clearance cookies are usually valid ~30 min
+CHALLENGE_MARKERS = ("Just a moment...", "cf-chl", "challenge-platform", "cf_chl_opt")
+
+
+def looks_like_challenge(status_code: int, headers, body_start: str = "") -> bool:
+    """True if a response is a Cloudflare-style interstitial rather than the real page."""
+    if status_code not in (403, 429, 503):
+        return False
+    if (headers.get("cf-mitigated") or "").lower() == "challenge":
+        return True
+    server = (headers.get("server") or "").lower()
+    return "cloudflare" in server and any(m in body_start for m in CHALLENGE_MARKERS)
+
+
+class DomainSession:
+    def __init__(self, scraper, created_at: float):
+        self.scraper = scraper
+        self.created_at = created_at
+        self.lock = threading.Lock()   # cloudscraper sessions are not safe to share between threads
+
+
+# ----------------------------
+# Challenge Fetcher
+# ----------------------------
+class ChallengeFetcher:
+    """
+    cloudscraper behind a small thread pool, with one solved session per domain.
+
+    Clearance cookies (and the User-Agent they are bound to) are written to
+    CHALLENGE_CACHE_DIR, together with the set of domains that are known to need
+    a challenge, so the next run or the next scraper.py invocation skips the solve.
+    Callers should only route a domain here when needs_challenge() is True or a
+    plain response looked like a challenge.
+    """
+
+    def __init__(self, cache_dir: str = CHALLENGE_CACHE_DIR, workers: int = CHALLENGE_WORKERS, timeout: float = 15):
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="challenge")
+        self.sessions: dict[str, DomainSession] = {}
+        self.sessions_lock = threading.Lock()
+        self.known_domains = set(self._read_json("domains.json", []))
+
+    # ---- persistence ----
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _read_json(self, name: str, default):
+        try:
+            with open(self._path(name), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return default
+
+    def _write_json(self, name: str, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = self._path(name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.replace(tmp, self._path(name))
+        except OSError as e:
+            logging.warning(f"[CHALLENGE] could not write {name}: {e}")
+
+    # ---- known domains ----
+    def needs_challenge(self, domain: str) -> bool:
+        return domain.lower() in self.known_domains
+
+    def mark(self, domain: str):
+        domain = domain.lower()
+        if domain not in self.known_domains:
+            logging.info(f"[CHALLENGE] {domain} marked as challenge-protected")
+            self.known_domains.add(domain)
+            self._write_json("domains.json", sorted(self.known_domains))
+
+    # ---- sessions ----
+    def _session(self, domain: str) -> DomainSession:
+        with self.sessions_lock:
+            session = self.sessions.get(domain)
+            if session and time.time() - session.created_at < SESSION_TTL_SECONDS:
+                return session
+
+            scraper = cloudscraper.create_scraper()
+            created_at = time.time()
+            saved = self._read_json(f"{domain}.json", None)
+            if saved and time.time() - saved.get("saved_at", 0) < SESSION_TTL_SECONDS:
+                scraper.headers["User-Agent"] = saved["user_agent"]
+                scraper.cookies.update(saved["cookies"])
+                created_at = saved["saved_at"]
+            session = DomainSession(scraper, created_at)
+            self.sessions[domain] = session
+            return session
+
+    def get_sync(self, url: str, headers: dict = None):
+        """Blocking GET through the domain's cached session; returns a requests.Response."""
+        domain = urlparse(url).netloc.lower()
+        session = self._session(domain)
+        # the clearance cookie is bound to the session's own User-Agent
+        extra = {k: v for k, v in (headers or {}).items() if k.lower() != "user-agent"}
+        with session.lock:
+            had_clearance = "cf_clearance" in session.scraper.cookies
+            response = session.scraper.get(url, headers=extra, timeout=self.timeout)
+            if response.ok and not had_clearance and session.scraper.cookies:
+                self._write_json(f"{domain}.json", {
+                    "user_agent": session.scraper.headers.get("User-Agent"),
+                    "cookies": session.scraper.cookies.get_dict(),
+                    "saved_at": session.created_at,
+                })
+        return response
+
+    async def get(self, url: str, headers: dict = None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.get_sync, url, headers)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -7,6 +7,8 @@ from dotenv import load_dotenv
 from prisma import Prisma
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
+from thumbnail_store import ThumbnailStore
+
 # ----------------------------
 # Config
 # ----------------------------
@@ -38,6 +40,7 @@ async def save_feed_log(db: Prisma, feed_type: str, url: str, data: dict, status
 
 # Initialize once (global)
 analyzer = SentimentIntensityAnalyzer()
+thumbnail_store = ThumbnailStore()   # local copies of tweet media (when THUMBNAIL_BASE_URL is set); aclose() in main()
 
 async def get_tweets(db: Prisma, username: str, feed_type: str, limit: int = 10, mode: str = "self"):
     global API_HITS
@@ -185,4 +188,7 @@ async def get_tweets(db: Prisma, username: str, feed_type: str, limit: int = 10,
                 "thumbnails": profile_photo,  # avatar
                 "thumbnail_url": thumbnail_url  # main media
             })
+
+        # 🔹 Serve tweet media from our own origin (downloaded once, resized, deduplicated)
+        await thumbnail_store.apply_all(tweets_data)   # index flushed once per run by the caller's aclose()
         return tweets_data
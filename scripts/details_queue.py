@@ -0,0 +1,124 @@
+import os
+import asyncio
+import itertools
+import logging
+
+# ----------------------------
+# Config
+# ----------------------------
+DETAILS_WORKERS = int(os.getenv("DETAILS_WORKERS", "48"))            # details pages processed at once, all countries together
+MAX_QUEUED_JOBS = int(os.getenv("DETAILS_MAX_QUEUED", "2000"))       # submit() waits beyond this
+DETAILS_TARGET_ITEMS = int(os.getenv("DETAILS_TARGET_ITEMS", "40"))  # a country stops once it has this many items
+
+
+class DetailsBatch:
+    """
+    One country's share of the queue. submit() scored jobs, then await results().
+    Once `target` items are found the batch closes: queued jobs are skipped when
+    they come up and jobs in flight are cancelled.
+    """
+
+    def __init__(self, queue: "DetailsQueue", target: int, name: str = ""):
+        self.queue = queue
+        self.target = target
+        self.name = name
+        self.items = []
+        self.pending = 0
+        self.skipped = 0
+        self.closed = False
+        self.in_flight: set[asyncio.Task] = set()
+        self.done = asyncio.Event()
+        self.done.set()   # nothing submitted yet
+
+    async def submit(self, score: float, job, *args):
+        """Queue job(*args) (an async function returning an item dict, or a falsy value); higher scores run first."""
+        if self.closed:
+            return
+        self.pending += 1
+        self.done.clear()
+        await self.queue.put(score, self, job, args)
+
+    def record(self, item):
+        self.pending -= 1
+        if item and not self.closed:
+            self.items.append(item)
+            if self.target and len(self.items) >= self.target:
+                self.close()
+        if self.pending <= 0:
+            self.done.set()
+
+    def close(self):
+        """Stop early: leftover jobs are skipped, jobs in flight cancelled."""
+        if self.closed:
+            return
+        self.closed = True
+        for task in self.in_flight:
+            task.cancel()
+        self.done.set()   # 🔹 results are final; queued leftovers are dropped whenever a worker reaches them
+        logging.info(f"[DETAILS][{self.name}] target of {self.target} items reached → stopping early")
+
+    async def results(self) -> list:
+        await self.done.wait()
+        return self.items
+
+
+class DetailsQueue:
+    """
+    Bounded priority queue of details-page jobs with a fixed pool of workers
+    shared by every country.
+
+    Jobs are stored as (function, args) and only turned into coroutines when a
+    worker takes them, so a page with thousands of links costs thousands of
+    small tuples, not thousands of live tasks and sockets. The best-scored job
+    across all countries runs next; put() waits once MAX_QUEUED_JOBS are waiting.
+    Call start() inside the event loop and close() before it ends.
+    """
+
+    def __init__(self, workers: int = DETAILS_WORKERS, max_queued: int = MAX_QUEUED_JOBS):
+        self.workers = workers
+        self.jobs = asyncio.PriorityQueue(maxsize=max_queued)
+        self.order = itertools.count()   # FIFO among equal scores; jobs themselves are never compared
+        self.tasks: list[asyncio.Task] = []
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def batch(self, target: int = DETAILS_TARGET_ITEMS, name: str = "") -> DetailsBatch:
+        self.start()
+        return DetailsBatch(self, target, name)
+
+    async def put(self, score: float, batch: DetailsBatch, job, args: tuple):
+        await self.jobs.put((-score, next(self.order), batch, job, args))
+
+    async def _worker(self):
+        while True:
+            _, _, batch, job, args = await self.jobs.get()
+            item, task = None, None
+            try:
+                if batch.closed:
+                    batch.skipped += 1
+                    continue
+                task = asyncio.ensure_future(job(*args))
+                batch.in_flight.add(task)
+                # 🔹 wait() instead of await: a job cancelled by its batch must not stop the worker
+                await asyncio.wait({task})
+                batch.in_flight.discard(task)
+                if not task.cancelled():
+                    if task.exception():
+                        logging.error(f"[DETAILS][{batch.name}] job failed: {task.exception()}")
+                    else:
+                        item = task.result()
+            finally:
+                if task is not None and not task.done():
+                    task.cancel()   # worker cancelled by close(): its job goes too
+                    batch.in_flight.discard(task)
+                batch.record(item)
+                self.jobs.task_done()
+
+    async def close(self):
+        """Stop the workers and the jobs they are running (and, through RunCache, the fetches behind them)."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
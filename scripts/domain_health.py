@@ -0,0 +1,204 @@
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from prisma import Prisma
+
+# ----------------------------
+# Breaker settings
+# ----------------------------
+CONSECUTIVE_FAILURES_TO_OPEN = 3
+FAILURE_RATE_TO_OPEN = 0.6     # over the sample window
+MIN_SAMPLES_FOR_RATE = 10
+SAMPLE_WINDOW = 50             # most recent requests kept per domain
+BASE_COOLDOWN = timedelta(minutes=30)
+MAX_COOLDOWN = timedelta(hours=24)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class DomainOpenError(Exception):
+    """Raised instead of sending a request to a domain whose breaker is open."""
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+# ----------------------------
+# One domain
+# ----------------------------
+class DomainBreaker:
+    def __init__(self, domain: str, state: str = CLOSED, consecutive_failures: int = 0,
+                 open_count: int = 0, opened_until: datetime = None, samples: list = None,
+                 last_error: str = None):
+        self.domain = domain
+        self.state = state
+        self.consecutive_failures = consecutive_failures
+        self.open_count = open_count          # consecutive times the breaker opened, drives the backoff
+        self.opened_until = opened_until
+        self.samples = samples or []          # [[ok (0/1), latency_ms], ...]
+        self.last_error = last_error
+        self.probe_in_flight = False
+        self.dirty = False
+
+    @property
+    def failure_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for ok, _ in self.samples if not ok) / len(self.samples)
+
+    @property
+    def latency_p50(self) -> float:
+        return percentile([ms for ok, ms in self.samples if ok], 50)
+
+    @property
+    def latency_p95(self) -> float:
+        return percentile([ms for ok, ms in self.samples if ok], 95)
+
+    @property
+    def score(self) -> float:
+        """0 (dead) .. 1 (healthy): success rate, discounted for slow domains."""
+        if self.state == OPEN:
+            return 0.0
+        speed = 1.0 if self.latency_p95 <= 2000 else 2000 / self.latency_p95
+        return round((1 - self.failure_rate) * speed, 3)
+
+    def allow(self, now: datetime) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.opened_until and now >= self.opened_until:
+            self.state = HALF_OPEN
+            self.dirty = True
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True   # exactly one probe request decides the next state
+            return True
+        return False
+
+    def release_probe(self):
+        """The probe ended without an outcome (cancelled): the next request probes instead."""
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+
+    def _add_sample(self, ok: bool, latency_ms: float):
+        self.samples.append([1 if ok else 0, round(latency_ms)])
+        del self.samples[:-SAMPLE_WINDOW]
+        self.dirty = True
+
+    def record_success(self, latency_ms: float):
+        self._add_sample(True, latency_ms)
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        if self.state != CLOSED:
+            logging.info(f"[BREAKER] {self.domain} closed again")
+        self.state = CLOSED
+        self.open_count = 0
+        self.opened_until = None
+
+    def record_failure(self, latency_ms: float, error: str, now: datetime):
+        self._add_sample(False, latency_ms)
+        self.consecutive_failures += 1
+        self.last_error = (error or "")[:500]
+        self.probe_in_flight = False
+
+        too_many = self.consecutive_failures >= CONSECUTIVE_FAILURES_TO_OPEN
+        too_flaky = len(self.samples) >= MIN_SAMPLES_FOR_RATE and self.failure_rate >= FAILURE_RATE_TO_OPEN
+        if self.state == HALF_OPEN or too_many or too_flaky:
+            self.open_count += 1
+            cooldown = min(BASE_COOLDOWN * (2 ** (self.open_count - 1)), MAX_COOLDOWN)
+            self.state = OPEN
+            self.opened_until = now + cooldown
+            logging.warning(
+                f"[BREAKER] {self.domain} open for {cooldown} "
+                f"(fail rate {self.failure_rate:.0%}, last error: {self.last_error})"
+            )
+
+
+# ----------------------------
+# Registry (persisted in DomainHealth)
+# ----------------------------
+class DomainHealthRegistry:
+    """
+    Circuit breaker per domain that survives between runs.
+
+    Call load() after connecting to the DB and save() before disconnecting; in
+    between, fetchers ask allow() before spending a connection and report the
+    outcome with record_success() / record_failure(), or release() a request
+    that ended without one (cancelled) so a half-open probe is not held forever.
+    """
+
+    def __init__(self):
+        self.breakers: dict[str, DomainBreaker] = {}
+
+    def get(self, domain: str) -> DomainBreaker:
+        domain = domain.lower()
+        breaker = self.breakers.get(domain)
+        if breaker is None:
+            breaker = DomainBreaker(domain)
+            self.breakers[domain] = breaker
+        return breaker
+
+    def allow(self, domain: str) -> bool:
+        return self.get(domain).allow(datetime.now(timezone.utc))
+
+    def release(self, domain: str):
+        self.get(domain).release_probe()
+
+    def is_open(self, domain: str) -> bool:
+        """Read-only check (does not consume the half-open probe)."""
+        breaker = self.breakers.get(domain.lower())
+        if breaker is None or breaker.state == CLOSED:
+            return False
+        if breaker.state == OPEN:
+            return not breaker.opened_until or datetime.now(timezone.utc) < breaker.opened_until
+        return breaker.probe_in_flight
+
+    def record_success(self, domain: str, latency_ms: float):
+        self.get(domain).record_success(latency_ms)
+
+    def record_failure(self, domain: str, latency_ms: float, error: str):
+        self.get(domain).record_failure(latency_ms, error, datetime.now(timezone.utc))
+
+    async def load(self, db: Prisma):
+        rows = await db.domainhealth.find_many()
+        for row in rows:
+            self.breakers[row.domain] = DomainBreaker(
+                row.domain,
+                state=row.state,
+                consecutive_failures=row.consecutiveFailures,
+                open_count=row.openCount,
+                opened_until=row.openedUntil,
+                samples=json.loads(row.samples or "[]"),
+                last_error=row.lastError,
+            )
+        logging.info(f"[BREAKER] loaded {len(rows)} domains ({sum(1 for r in rows if r.state == OPEN)} open)")
+
+    async def save(self, db: Prisma):
+        dirty = [b for b in self.breakers.values() if b.dirty]
+        if not dirty:
+            return
+        async with db.batch_() as batcher:
+            for b in dirty:
+                data = {
+                    "state": b.state,
+                    "consecutiveFailures": b.consecutive_failures,
+                    "openCount": b.open_count,
+                    "openedUntil": b.opened_until,
+                    "samples": json.dumps(b.samples),
+                    "failureRate": b.failure_rate,
+                    "latencyP50": b.latency_p50,
+                    "latencyP95": b.latency_p95,
+                    "score": b.score,
+                    "lastError": b.last_error,
+                }
+                batcher.domainhealth.upsert(
+                    where={"domain": b.domain},
+                    data={"create": {"domain": b.domain, **data}, "update": data},
+                )
+        for b in dirty:
+            b.dirty = False
+        logging.info(f"[BREAKER] saved {len(dirty)} domains")
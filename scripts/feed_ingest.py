@@ -0,0 +1,311 @@
+import os
+import re
+import html
+import asyncio
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin
+
+from prisma import Prisma
+
+from fetch_scheduler import FetchScheduler
+from html_parsing import is_feed_link
+from url_utils import canonical_url, clean_url
+from pub_dates import parse_date, format_pubdate
+
+# ----------------------------
+# Config
+# ----------------------------
+FEED_SUFFIXES = ["/rss", "/rss.xml", "/feed", "/feed.xml", "/feeds", "/atom.xml", "/api/rss"]
+FEED_ACCEPT = "application/rss+xml, application/atom+xml, application/xml;q=0.9, text/xml;q=0.8, */*;q=0.5"
+FEED_RECHECK = timedelta(days=int(os.getenv("FEED_RECHECK_DAYS", "7")))   # re-probe sources without a feed after this
+FEED_BYTE_CAP = 5 * 1024 * 1024   # stop reading a feed after this many bytes
+PROBE_BYTE_CAP = 16 * 1024        # enough to see the root element
+MAX_FEED_ITEMS = 200
+
+FEED_ROOTS = {"rss": "rss", "feed": "atom", "RDF": "rdf"}
+ITEM_TAGS = {"item", "entry"}
+MEDIA_NS = "{http://search.yahoo.com/mrss/}"
+
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+_IMG_SRC = re.compile(r"""<img[^>]+src=["']([^"']+)["']""", re.IGNORECASE)
+
+
+def _local(tag) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _text(elem) -> str:
+    return "".join(elem.itertext()).strip()
+
+
+def _plain(markup: str) -> str:
+    """Feed descriptions are often escaped HTML: tags out, entities decoded, whitespace collapsed."""
+    return _SPACE.sub(" ", html.unescape(_TAG.sub(" ", markup or ""))).strip()
+
+
+def feed_links_in(soup, base_url: str) -> list[str]:
+    """Feed URLs a page advertises in its <head>, resolved against base_url, in document order."""
+    return [
+        urljoin(base_url, link["href"])
+        for link in soup.find_all("link", href=True)
+        if is_feed_link(link.get("rel"), link.get("type"))
+    ]
+
+
+# ----------------------------
+# Streaming parser
+# ----------------------------
+class FeedParser:
+    """
+    Incremental RSS 2.0 / RSS 1.0 (RDF) / Atom parser on top of XMLPullParser.
+
+    feed() raw bytes as they arrive (the XML declaration decides the encoding);
+    every finished <item>/<entry> is turned into a plain dict and detached from
+    the tree, so memory stays flat however long the feed is. `kind` is None
+    until the root element is seen, then "rss" / "atom" / "rdf", or "" when the
+    document is not a feed. `done` is set once there is nothing more to read.
+    """
+
+    def __init__(self, base_url: str, max_items: int = MAX_FEED_ITEMS):
+        self.parser = ET.XMLPullParser(events=("start", "end"))
+        self.base_url = base_url
+        self.max_items = max_items
+        self.stack = []
+        self.kind = None
+        self.image = ""   # channel <image> / Atom <logo> or <icon>
+        self.items = []
+        self.done = False
+
+    def feed(self, data: bytes):
+        self.parser.feed(data)
+        self._drain()
+
+    def close(self):
+        self.parser.close()
+        self._drain()
+
+    def _in_item(self) -> bool:
+        return any(_local(e.tag) in ITEM_TAGS for e in self.stack)
+
+    def _drain(self):
+        for event, elem in self.parser.read_events():
+            name = _local(elem.tag)
+            if event == "start":
+                if self.kind is None:
+                    self.kind = FEED_ROOTS.get(name, "")
+                    self.done = not self.kind
+                self.stack.append(elem)
+                continue
+
+            self.stack.pop()
+            if name in ITEM_TAGS:
+                item = self._item(elem)
+                if item:
+                    self.items.append(item)
+                if self.stack:
+                    self.stack[-1].remove(elem)   # 🔹 keep the tree (and memory) from growing
+                if len(self.items) >= self.max_items:
+                    self.done = True
+            elif not self.image and not self._in_item():
+                if name == "image" and self.kind != "atom":
+                    url = next((_text(c) for c in elem if _local(c.tag) == "url"), "")
+                    self.image = urljoin(self.base_url, url) if url else ""
+                elif name in ("logo", "icon") and self.kind == "atom" and _text(elem):
+                    self.image = urljoin(self.base_url, _text(elem))
+
+    def _item(self, elem) -> dict:
+        title = link = guid = description = content = author = image = ""
+        published = updated = ""
+        children = list(elem)
+        for child in children:
+            if child.tag == f"{MEDIA_NS}group":
+                children.extend(child)   # media:group wraps media:content / media:thumbnail
+
+        for child in children:
+            name = _local(child.tag)
+            if child.tag.startswith(MEDIA_NS):
+                url = child.get("url", "")
+                medium = child.get("medium", "") or child.get("type", "")
+                if url and not image and (name == "thumbnail" or (name == "content" and medium.startswith("image"))):
+                    image = url
+            elif name == "title" and not title:
+                title = _plain(_text(child))
+            elif name == "link":
+                href = child.get("href")
+                rel = child.get("rel", "alternate")
+                if href is None:
+                    link = link or _text(child)
+                elif rel == "alternate" and not link:
+                    link = href
+                elif rel == "enclosure" and child.get("type", "").startswith("image/") and not image:
+                    image = href
+            elif name == "guid" and child.get("isPermaLink", "true").lower() != "false":
+                guid = _text(child)
+            elif name == "enclosure" and child.get("type", "").startswith("image/") and not image:
+                image = child.get("url", "")
+            elif name in ("description", "summary") and not description:
+                description = _text(child)
+            elif name in ("encoded", "content") and not content:
+                content = _text(child)
+            elif name in ("pubDate", "published", "issued", "date") and not published:
+                published = _text(child)
+            elif name in ("updated", "modified") and not updated:
+                updated = _text(child)
+            elif name in ("creator", "author") and not author:
+                author = next((_text(c) for c in child if _local(c.tag) == "name"), "") or _text(child)
+
+        link = link or (guid if guid.startswith("http") else "")
+        if not title or not link:
+            return None
+        if not image:
+            match = _IMG_SRC.search(description) or _IMG_SRC.search(content)
+            image = html.unescape(match.group(1)) if match else ""
+        return {
+            "title": title,
+            "link": urljoin(self.base_url, link.strip()),
+            "description": _plain(description or content)[:500],
+            "published": parse_date(published or updated),
+            "author": _plain(author),
+            "image_url": urljoin(self.base_url, image) if image else "",
+        }
+
+
+def parse_feed(data: bytes, base_url: str) -> dict:
+    """Parse an already-downloaded feed the same way the streaming fetch does."""
+    parser = FeedParser(base_url)
+    parser.feed(data)
+    if not parser.done:
+        parser.close()
+    return {"kind": parser.kind, "image": parser.image, "items": parser.items}
+
+
+def feed_article(entry: dict, creator: str, thumbnails: str = "") -> dict:
+    """Feed item dict in the same shape the HTML listing scrapers produce."""
+    return {
+        "title": entry["title"],
+        "description": entry["description"] or entry["title"],
+        "link": clean_url(entry["link"]),
+        "guid": {"isPermaLink": True, "value": canonical_url(entry["link"])},
+        "dc:creator": creator,
+        "pubDate": format_pubdate(entry["published"]),
+        "thumbnails": thumbnails,
+        "thumbnail_url": entry["image_url"],
+    }
+
+
+# ----------------------------
+# Streaming fetch
+# ----------------------------
+async def fetch_feed(scheduler: FetchScheduler, url: str, saved_etag: str = None, saved_lastmod: str = None,
+                     byte_cap: int = FEED_BYTE_CAP, timeout: float = None) -> dict:
+    """
+    Stream and parse a feed: {"error", "status", "etag", "last_modified", "image", "items"}.
+    error is "not_modified" on a 304, "not a feed" when the document is something else.
+    """
+    result = {"error": None, "status": None, "etag": None, "last_modified": None, "image": "", "items": []}
+    headers = {"Accept": FEED_ACCEPT}
+    if saved_etag:
+        headers["If-None-Match"] = saved_etag
+    if saved_lastmod:
+        headers["If-Modified-Since"] = saved_lastmod
+
+    parser = None
+    try:
+        async with scheduler.stream(url, headers=headers, timeout=timeout) as r:
+            result["status"] = r.status_code
+            if r.status_code == 304:
+                result["error"] = "not_modified"
+                return result
+            if r.status_code != 200:
+                result["error"] = f"HTTP {r.status_code}"
+                return result
+            result["etag"], result["last_modified"] = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            parser = FeedParser(str(r.url))
+            read = 0
+            async for chunk in r.aiter_bytes():
+                read += len(chunk)
+                parser.feed(chunk)
+                if parser.done or read >= byte_cap:
+                    break
+            else:
+                parser.close()
+    except ET.ParseError as e:
+        if parser is None or not parser.items:
+            result["error"] = f"not a feed: {e}"
+            return result
+        # 🔹 malformed tail: keep the items parsed before it
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+        return result
+
+    if not parser.kind:
+        result["error"] = "not a feed"
+        return result
+    result.update(image=parser.image, items=parser.items)
+    return result
+
+
+# ----------------------------
+# Discovery
+# ----------------------------
+async def sniff_feed(scheduler: FetchScheduler, url: str, timeout: float = None) -> bool:
+    """True if url answers 200 with an RSS / Atom root element; reads only the first PROBE_BYTE_CAP bytes."""
+    try:
+        async with scheduler.stream(url, headers={"Accept": FEED_ACCEPT}, timeout=timeout) as r:
+            if r.status_code != 200:
+                return False
+            parser = FeedParser(str(r.url))
+            read = 0
+            async for chunk in r.aiter_bytes():
+                read += len(chunk)
+                parser.feed(chunk)
+                if parser.kind is not None or read >= PROBE_BYTE_CAP:
+                    break
+            return bool(parser.kind)
+    except Exception:
+        return False
+
+
+async def find_feed(scheduler: FetchScheduler, base_url: str, advertised: list[str] = (), timeout: float = None):
+    """
+    Feed URL for a site, or None. Links the page advertises (<link rel="alternate">)
+    are probed first, then the common FEED_SUFFIXES; each round is probed
+    concurrently and the first hit in list order wins.
+    """
+    seen = set()
+    rounds = [list(advertised), [base_url.rstrip("/") + suffix for suffix in FEED_SUFFIXES]]
+    for candidates in rounds:
+        urls = []
+        for url in candidates:
+            key = canonical_url(url)
+            if key and key not in seen:
+                seen.add(key)
+                urls.append(url)
+        if not urls:
+            continue
+        results = await asyncio.gather(*(sniff_feed(scheduler, url, timeout) for url in urls))
+        for url, ok in zip(urls, results):
+            if ok:
+                return url
+    return None
+
+
+def feed_check_due(state) -> bool:
+    """A source without a known feed is re-probed once FEED_RECHECK has passed since the last probe."""
+    if state is None:
+        return True
+    if state.feedUrl:
+        return False
+    checked = state.feedCheckedAt
+    return checked is None or checked <= datetime.now(timezone.utc) - FEED_RECHECK
+
+
+async def save_feed_url(db: Prisma, source_id: str, feed_url: str):
+    """Remember a source's feed (None = probed, no feed) on its NewsSourceFetchState."""
+    data = {"feedUrl": feed_url, "feedCheckedAt": datetime.now(timezone.utc)}
+    await db.newssourcefetchstate.upsert(
+        where={"newsSourceId": source_id},
+        data={"create": {"newsSourceId": source_id, **data}, "update": data},
+    )
@@ -0,0 +1,227 @@
+import time
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import httpx
+
+from domain_health import DomainHealthRegistry, DomainOpenError, HALF_OPEN
+from challenge_fetch import ChallengeFetcher, looks_like_challenge
+
+# ----------------------------
+# Defaults
+# ----------------------------
+DEFAULT_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/117.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Chrome/116.0 Safari/605.1.15",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:116.0) "
+    "Gecko/20100101 Firefox/116.0",
+]
+
+MAX_IN_FLIGHT = 50        # requests open at the same time, across all hosts
+MAX_PER_HOST = 4          # requests open at the same time against one host
+HOST_RATE = 2.0           # sustained requests per second per host
+HOST_BURST = 4            # token bucket size per host
+BREAKER_STATUSES = {403, 429}  # besides 5xx, responses that count against a domain's health
+
+
+# ----------------------------
+# Token bucket (one per host)
+# ----------------------------
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostSlot:
+    def __init__(self, concurrency: int, rate: float, burst: int, user_agent: str):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.user_agent = user_agent
+
+
+# ----------------------------
+# Fetch Scheduler
+# ----------------------------
+class FetchScheduler:
+    """
+    Shared HTTP client that paces requests per host.
+
+    Every request waits for (1) a free slot for its host, (2) a token from the
+    host's bucket and (3) a free global in-flight slot, in that order, so a page
+    with hundreds of links to one site is crawled at HOST_RATE instead of all at once.
+    Each host keeps one User-Agent for the whole run.
+
+    With a DomainHealthRegistry attached, requests to domains whose breaker is
+    open fail fast with DomainOpenError and every outcome is recorded.
+
+    With a ChallengeFetcher attached, domains known to sit behind a Cloudflare
+    challenge are fetched through its cached sessions, and a plain response that
+    turns out to be a challenge marks the domain and is retried that way once.
+    """
+
+    def __init__(
+        self,
+        user_agents: list[str] = None,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_per_host: int = MAX_PER_HOST,
+        host_rate: float = HOST_RATE,
+        host_burst: int = HOST_BURST,
+        timeout: float = 8,
+        health: DomainHealthRegistry = None,
+        challenge: ChallengeFetcher = None,
+        **client_kwargs,
+    ):
+        self.health = health
+        self.challenge = challenge
+        self.user_agents = user_agents or DEFAULT_USER_AGENTS
+        self.max_per_host = max_per_host
+        self.host_rate = host_rate
+        self.host_burst = host_burst
+        self.global_semaphore = asyncio.Semaphore(max_in_flight)
+        self.hosts: dict[str, HostSlot] = {}
+        client_kwargs.setdefault(
+            "limits",
+            httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+        )
+        self.client = httpx.AsyncClient(timeout=timeout, follow_redirects=True, **client_kwargs)
+
+    def host_slot(self, url: str) -> HostSlot:
+        host = urlparse(url).netloc.lower()
+        slot = self.hosts.get(host)
+        if slot is None:
+            slot = HostSlot(self.max_per_host, self.host_rate, self.host_burst, random.choice(self.user_agents))
+            self.hosts[host] = slot
+        return slot
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Hold a host slot, a host token and a global slot for the duration of one request."""
+        host = self.host_slot(url)
+        async with host.semaphore:
+            domain = urlparse(url).netloc.lower()
+            if self.health and not self.health.allow(domain):
+                raise DomainOpenError(f"circuit open for {domain}")
+            # 🔹 allow() in half-open state hands out the single probe; it must be given back if
+            #    the request is cancelled before an outcome is recorded
+            probe = bool(self.health) and self.health.get(domain).state == HALF_OPEN
+            try:
+                await host.bucket.acquire()
+                async with self.global_semaphore:
+                    yield host
+            finally:
+                if probe:
+                    self.health.release(domain)
+
+    def _record(self, url: str, started: float, status: int = None, error: str = None):
+        if not self.health:
+            return
+        domain = urlparse(url).netloc.lower()
+        latency_ms = (time.monotonic() - started) * 1000
+        if error is None and status is not None and (status >= 500 or status in BREAKER_STATUSES):
+            error = f"HTTP {status}"
+        if error is None:
+            self.health.record_success(domain, latency_ms)
+        else:
+            self.health.record_failure(domain, latency_ms, error)
+
+    def _headers(self, host: HostSlot, headers: dict = None) -> dict:
+        merged = {"User-Agent": host.user_agent}
+        if headers:
+            merged.update(headers)
+        return merged
+
+    async def _challenge_get(self, url: str, headers: dict = None) -> httpx.Response:
+        """Fetch through the challenge backend and hand back an httpx.Response like every other path."""
+        started = time.monotonic()
+        try:
+            r = await self.challenge.get(url, headers=headers)
+        except Exception as e:
+            self._record(url, started, error=str(e) or type(e).__name__)
+            raise
+        self._record(url, started, status=r.status_code)
+        # requests already decoded the body, so drop the encoding headers
+        resp_headers = {
+            k: v for k, v in r.headers.items() if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        }
+        return httpx.Response(
+            r.status_code,
+            headers=resp_headers,
+            content=r.content,
+            request=httpx.Request("GET", r.url or url),
+        )
+
+    def _needs_challenge(self, url: str) -> bool:
+        return bool(self.challenge) and self.challenge.needs_challenge(urlparse(url).netloc)
+
+    async def get(self, url: str, headers: dict = None, timeout: float = None) -> httpx.Response:
+        async with self.slot(url) as host:
+            if self._needs_challenge(url):
+                return await self._challenge_get(url, headers)
+
+            kwargs = {"headers": self._headers(host, headers)}
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            started = time.monotonic()
+            try:
+                response = await self.client.get(url, **kwargs)
+            except Exception as e:
+                self._record(url, started, error=str(e) or type(e).__name__)
+                raise
+
+            if self.challenge and looks_like_challenge(response.status_code, response.headers, response.text[:4096]):
+                self.challenge.mark(urlparse(url).netloc)
+                return await self._challenge_get(url, headers)
+
+            self._record(url, started, status=response.status_code)
+            return response
+
+    @asynccontextmanager
+    async def stream(self, url: str, headers: dict = None, timeout: float = None):
+        """Streaming GET; the host and global slots are held until the body is closed."""
+        async with self.slot(url) as host:
+            if self._needs_challenge(url):
+                # no streaming through cloudscraper; the whole body is already read
+                yield await self._challenge_get(url, headers)
+                return
+
+            kwargs = {"headers": self._headers(host, headers)}
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            started = time.monotonic()
+            try:
+                ctx = self.client.stream("GET", url, **kwargs)
+                response = await ctx.__aenter__()
+            except Exception as e:
+                self._record(url, started, error=str(e) or type(e).__name__)
+                raise
+            self._record(url, started, status=response.status_code)
+            try:
+                yield response
+            finally:
+                await ctx.__aexit__(None, None, None)
+
+    async def aclose(self):
+        await self.client.aclose()
+        if self.challenge:
+            self.challenge.close()
@@ -0,0 +1,99 @@
+import codecs
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from fetch_scheduler import FetchScheduler
+
+# ----------------------------
+# Config
+# ----------------------------
+HEAD_BYTE_CAP = 96 * 1024   # stop reading even if </head> never shows up
+
+META_KEYS = {
+    "og:image": "og_image",
+    "og:image:url": "og_image",
+    "og:image:secure_url": "og_image",
+    "article:published_time": "published_time",
+    "og:published_time": "published_time",
+    "datepublished": "published_time",
+    "author": "author",
+    "article:author": "author",
+    "og:title": "title",
+    "og:description": "description",
+}
+
+
+# ----------------------------
+# Lightweight <head> tokenizer
+# ----------------------------
+class HeadMetaParser(HTMLParser):
+    """Collects the few <meta>/<link> values we need and flags when the <head> is over."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta = {}
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "body":
+            self.done = True
+            return
+        attrs = {k.lower(): (v or "").strip() for k, v in attrs if k}
+        if tag == "meta":
+            key = (attrs.get("property") or attrs.get("name") or attrs.get("itemprop") or "").lower()
+            field = META_KEYS.get(key)
+            if field and attrs.get("content") and field not in self.meta:
+                self.meta[field] = attrs["content"]
+        elif tag == "link":
+            rel = attrs.get("rel", "").lower().split()
+            if "canonical" in rel and attrs.get("href") and "canonical" not in self.meta:
+                self.meta["canonical"] = attrs["href"]
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.done = True
+
+
+def parse_head_meta(html: str, base_url: str) -> dict:
+    """Parse already-downloaded HTML the same way the streaming fetch does."""
+    parser = HeadMetaParser()
+    parser.feed(html[:HEAD_BYTE_CAP])
+    return _resolve(parser.meta, base_url)
+
+
+def _resolve(meta: dict, base_url: str) -> dict:
+    for field in ("og_image", "canonical"):
+        if meta.get(field):
+            meta[field] = urljoin(base_url, meta[field])
+    return meta
+
+
+# ----------------------------
+# Streaming fetch
+# ----------------------------
+async def fetch_head_meta(scheduler: FetchScheduler, url: str, byte_cap: int = HEAD_BYTE_CAP, timeout: float = 8) -> dict:
+    """
+    Read an article page only up to </head> (or byte_cap) and return
+    {og_image, published_time, author, canonical, title, description} (missing keys omitted).
+    Returns None when the page could not be fetched.
+    """
+    async with scheduler.stream(url, timeout=timeout) as r:
+        if r.status_code != 200:
+            return None
+        parser = HeadMetaParser()
+        try:
+            decoder = codecs.getincrementaldecoder(r.charset_encoding or "utf-8")(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        read = 0
+        async for chunk in r.aiter_bytes():
+            read += len(chunk)
+            parser.feed(decoder.decode(chunk))
+            if parser.done or read >= byte_cap:
+                break
+        return _resolve(parser.meta, str(r.url))
@@ -0,0 +1,60 @@
+import os
+import logging
+
+from bs4 import BeautifulSoup
+
+# ----------------------------
+# Parser backend
+# ----------------------------
+# html.parser stays the default: it is what every extractor was written against.
+# "lxml" (C parser, several times faster on large homepages) or "auto" (lxml when
+# installed) are opt-in; check them with parser_parity.py on recorded pages first.
+HTML_PARSER = os.getenv("SCRAPER_HTML_PARSER", "html.parser")
+BACKENDS = ("lxml", "html.parser")
+
+
+def _lxml_available() -> bool:
+    try:
+        import lxml  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_backend(name: str = None) -> str:
+    name = (name or HTML_PARSER).strip().lower()
+    if name == "auto":
+        return "lxml" if _lxml_available() else "html.parser"
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown HTML parser backend: {name} (expected one of {BACKENDS} or 'auto')")
+    if name == "lxml" and not _lxml_available():
+        logging.warning("SCRAPER_HTML_PARSER=lxml but lxml is not installed, using html.parser")
+        return "html.parser"
+    return name
+
+
+DEFAULT_BACKEND = resolve_backend()
+
+
+def make_soup(html, backend: str = None, encoding: str = None) -> BeautifulSoup:
+    """
+    Parse an HTML document (str, or raw bytes plus the charset from the HTTP
+    headers if known) with the configured backend or an explicit one.
+    """
+    parser = resolve_backend(backend) if backend else DEFAULT_BACKEND
+    if encoding and isinstance(html, bytes):
+        return BeautifulSoup(html, parser, from_encoding=encoding)
+    return BeautifulSoup(html, parser)
+
+
+# ----------------------------
+# Feed links (shared by the listing extractor and feed discovery)
+# ----------------------------
+FEED_TYPES = {"application/rss+xml", "application/atom+xml", "application/rdf+xml", "application/xml", "text/xml"}
+
+
+def is_feed_link(rel, link_type: str) -> bool:
+    """<link rel="alternate" type="application/rss+xml" ...> and friends."""
+    if isinstance(rel, str):
+        rel = rel.split()
+    return "alternate" in [r.lower() for r in rel or []] and (link_type or "").split(";")[0].strip().lower() in FEED_TYPES
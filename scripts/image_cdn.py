@@ -0,0 +1,183 @@
+import os
+import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# ----------------------------
+# Renditions per output
+# ----------------------------
+# "name=width,..." — CTV thumbnail slots are small, the web feed can take more.
+IMAGE_RENDITIONS = os.getenv("IMAGE_RENDITIONS", "ctv=640,web=1200")
+DEFAULT_OUTPUT = os.getenv("IMAGE_DEFAULT_OUTPUT", "ctv")   # rendition written to thumbnail_url
+
+
+def parse_renditions(spec: str) -> dict[str, int]:
+    renditions = {}
+    for part in spec.split(","):
+        name, _, width = part.partition("=")
+        if name.strip() and width.strip().isdigit():
+            renditions[name.strip()] = int(width)
+    return renditions
+
+
+RENDITIONS = parse_renditions(IMAGE_RENDITIONS)
+
+SIGNATURE_PARAMS = {"s", "sig", "signature", "token"}   # signed URLs break if their params change
+WIDTH_PARAMS = ("w", "width", "imwidth")
+HEIGHT_PARAMS = ("h", "height")
+
+# res.cloudinary.com plus any CNAMEs a publisher serves Cloudinary images from ("img.site.com,media.site.com");
+# other hosts are still recognised by a transformation segment after /image/upload/ (images.jpost.com)
+CLOUDINARY_HOSTS = {"res.cloudinary.com"} | {
+    h.strip().lower() for h in os.getenv("CLOUDINARY_HOSTS", "").split(",") if h.strip()
+}
+# transformation parameters a path segment may consist of ("c_fill,w_800,q_auto"); anything else is a folder
+CLOUDINARY_PARAMS = {
+    "a", "ar", "b", "bo", "c", "co", "d", "dpr", "e", "f", "fl", "g", "h", "l", "o", "pg", "q", "r", "t", "w", "x", "y", "z",
+}
+_CLOUDINARY_VERSION = re.compile(r"^v\d+$")
+
+
+def _int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _scaled_height(query: dict, width_key: str, width: int):
+    """Keep the aspect ratio of an explicit width x height request when only the width changes."""
+    old_width = _int(query.get(width_key))
+    for key in HEIGHT_PARAMS:
+        if key in query and old_width:
+            query[key] = str(max(1, round(_int(query[key]) * width / old_width)))
+
+
+# ----------------------------
+# Rules: (parts, query, width) → new (path, query) or None if the rule does not apply
+# ----------------------------
+def _is_cloudinary_transform(segment: str) -> bool:
+    """True for "c_fill,w_800,q_auto"; False for a public-id folder such as "news_2024"."""
+    items = segment.split(",")
+    return all(key in CLOUDINARY_PARAMS and value for key, _, value in (item.partition("_") for item in items))
+
+
+def cloudinary_rule(parts, query: dict, width: int):
+    """
+    .../image/upload/<transforms>/<v123>/<public id> → .../image/upload/c_limit,w_<W>,q_auto/<v123>/<public id>
+    On hosts outside CLOUDINARY_HOSTS only when the URL already carries a transformation segment.
+    """
+    segments = parts.path.split("/")
+    try:
+        idx = next(i for i in range(1, len(segments)) if segments[i] == "upload" and segments[i - 1] == "image")
+    except StopIteration:
+        return None
+    rest = segments[idx + 1 :]
+    transforms = []
+    while len(rest) > 1 and _is_cloudinary_transform(rest[0]) and not _CLOUDINARY_VERSION.match(rest[0]):
+        transforms.append(rest.pop(0))
+    if not rest or not rest[-1]:
+        return None
+    if not transforms and (parts.hostname or "").lower() not in CLOUDINARY_HOSTS:
+        return None   # /image/upload/ alone is not enough to call an unknown host Cloudinary
+    current = 0
+    for t in transforms:
+        for item in t.split(","):
+            if item.startswith("w_"):
+                current = _int(item[2:])
+    target = min(width, current) if current else width
+    path = "/".join(segments[: idx + 1] + [f"c_limit,w_{target},q_auto"] + rest)
+    return path, query
+
+
+def imgix_rule(parts, query: dict, width: int):
+    host = (parts.hostname or "").lower()
+    if not (host.endswith(".imgix.net") or "ixlib" in query):
+        return None
+    current = _int(query.get("w"))
+    if current and current <= width:
+        return parts.path, query
+    _scaled_height(query, "w", width)
+    query["w"] = str(width)
+    query.setdefault("auto", "format,compress")
+    return parts.path, query
+
+
+def wordpress_rule(parts, query: dict, width: int):
+    """
+    WordPress.com / Jetpack (Photon) images take ?w=. Self-hosted "-1024x576.jpg"
+    files are pre-generated sizes, so those are left as they are: another size
+    may not exist on the server.
+    """
+    host = (parts.hostname or "").lower()
+    if not (host.endswith(".wp.com") or host.endswith(".files.wordpress.com")):
+        return None
+    for key in ("resize", "fit"):
+        if key in query:
+            current = _int(query.pop(key).split(",")[0])
+            query.setdefault("w", str(current) if current else "")
+    current = _int(query.get("w"))
+    if current and current <= width:
+        return parts.path, query
+    query.pop("h", None)
+    query["w"] = str(width)
+    return parts.path, query
+
+
+def query_width_rule(parts, query: dict, width: int):
+    """Any other CDN sizing by query string (?w=, ?width=, ?imwidth=)."""
+    key = next((k for k in WIDTH_PARAMS if _int(query.get(k))), None)
+    if key is None:
+        return None
+    if _int(query[key]) <= width:
+        return parts.path, query
+    _scaled_height(query, key, width)
+    query[key] = str(width)
+    return parts.path, query
+
+
+RULES = [cloudinary_rule, imgix_rule, wordpress_rule, query_width_rule]
+
+
+# ----------------------------
+# Rewrite
+# ----------------------------
+def rewrite_image_url(url: str, width: int) -> str:
+    """Ask the image's CDN for a rendition at most `width` px wide; unknown URLs come back unchanged."""
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    pairs = parse_qsl(parts.query, keep_blank_values=True)
+    query = dict(pairs)
+    if len(query) != len(pairs) or SIGNATURE_PARAMS & query.keys():
+        return url   # repeated or signed params: rewriting would change what the URL means
+    for rule in RULES:
+        result = rule(parts, dict(query), width)
+        if result is not None:
+            path, new_query = result
+            return urlunsplit((parts.scheme, parts.netloc, path, urlencode(new_query, safe=",/:"), parts.fragment))
+    return url
+
+
+def image_renditions(url: str) -> dict[str, str]:
+    """{"source": url, "<output>": rewritten url, ...} for every configured output."""
+    renditions = {"source": url}
+    for name, width in RENDITIONS.items():
+        renditions[name] = rewrite_image_url(url, width)
+    return renditions
+
+
+def apply_renditions(article: dict) -> dict:
+    """
+    Set article["thumbnail_renditions"] and point thumbnail_url at the default
+    output's rendition. Idempotent: always derived from the original source URL.
+    """
+    source = (article.get("thumbnail_renditions") or {}).get("source") or article.get("thumbnail_url") or ""
+    if not source:
+        return article
+    renditions = image_renditions(source)
+    article["thumbnail_renditions"] = renditions
+    article["thumbnail_url"] = renditions.get(DEFAULT_OUTPUT, source)
+    return article
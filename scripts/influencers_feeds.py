@@ -1,6 +1,6 @@
 import asyncio, datetime, json, traceback
 from prisma import Prisma
-from common_feeds import get_tweets, save_feed_log, API_HITS
+from common_feeds import get_tweets, save_feed_log, API_HITS, thumbnail_store
 
 TARGET_COUNTRIES = [
     "India", 
@@ -92,7 +92,7 @@ async def main():
     finally:
         # Always cleanup even if an error happens
         await db.disconnect()
-        await client.aclose()
+        await thumbnail_store.aclose()   # flush the thumbnail index once per run
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+import re
+from functools import lru_cache
+
+CURRENCY_SUFFIXES = "$€"   # "US$" / "US€" are amounts, not mentions of the US
+
+
+# ----------------------------
+# Trie → regex
+# ----------------------------
+def _trie_pattern(words: list[str]) -> str:
+    """
+    One alternation for all words with shared prefixes factored out
+    ("united states|united kingdom" → "united\\ (?:states|kingdom)"), so the regex
+    engine follows a single branch per character instead of trying every keyword.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        ends_here = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            body = "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+# ----------------------------
+# Matcher
+# ----------------------------
+class KeywordMatcher:
+    """
+    All of a country's keywords compiled into one case-insensitive regex.
+
+    whole_word=True mirrors the old per-keyword r"\\b<kw>\\b" loop, including
+    skipping hits directly followed by $ or € (US$ / US€). whole_word=False is
+    plain substring matching, like `any(kw in text for kw in keywords)`.
+    """
+
+    def __init__(self, keywords, whole_word: bool = True):
+        words = sorted({k.strip().lower() for k in keywords if k and k.strip()})
+        self.keywords = words
+        self.whole_word = whole_word
+        if not words:
+            self.regex = None
+            return
+        body = _trie_pattern(words)
+        if whole_word:
+            pattern = r"\b" + body + r"\b(?![" + re.escape(CURRENCY_SUFFIXES) + "])"
+        else:
+            pattern = body
+        self.regex = re.compile(pattern, re.IGNORECASE)
+
+    def search(self, text: str) -> bool:
+        return bool(self.regex and self.regex.search(text))
+
+
+@lru_cache(maxsize=1024)
+def _cached_matcher(keywords: tuple, whole_word: bool) -> KeywordMatcher:
+    return KeywordMatcher(keywords, whole_word)
+
+
+def get_matcher(keywords, whole_word: bool = True) -> KeywordMatcher:
+    """
+    Compiled matcher for a keyword set, built once per process and reused until
+    the set changes (each country's list is its own cache entry; parse workers
+    keep their own copy).
+    """
+    key = tuple(sorted({k.strip().lower() for k in keywords if k and k.strip()}))
+    return _cached_matcher(key, whole_word)
+
+
+# ----------------------------
+# Keyword → group index (many keyword sets, one scan)
+# ----------------------------
+class KeywordIndex:
+    """
+    Several keyword sets (e.g. one per country) behind a single regex, so a text
+    is scanned once and groups(text) returns every group with at least one
+    matching keyword. Same matching rules as KeywordMatcher.
+
+    The pattern is a zero-width lookahead tried at every position, which yields
+    the longest keyword starting there; shorter keywords that are prefixes of it
+    are then looked up in the keyword → groups map, so overlapping and nested
+    keywords ("india" / "indian") are all reported.
+    """
+
+    def __init__(self, keywords_by_group: dict, whole_word: bool = False):
+        self.whole_word = whole_word
+        self.groups_by_keyword = {}
+        for group, keywords in keywords_by_group.items():
+            for k in keywords:
+                if k and k.strip():
+                    self.groups_by_keyword.setdefault(k.strip().lower(), set()).add(group)
+        if not self.groups_by_keyword:
+            self.regex = None
+            return
+        body = _trie_pattern(sorted(self.groups_by_keyword))
+        prefix = r"\b" if whole_word else ""
+        self.regex = re.compile(prefix + "(?=(" + body + "))", re.IGNORECASE)
+
+    @staticmethod
+    def _ends_word(text: str, end: int) -> bool:
+        """Same test as r"\b(?![$€])" at position end."""
+        def is_word(i):
+            return 0 <= i < len(text) and (text[i].isalnum() or text[i] == "_")
+        if end < len(text) and text[end] in CURRENCY_SUFFIXES:
+            return False
+        return is_word(end - 1) != is_word(end)
+
+    def groups(self, text: str) -> set:
+        found = set()
+        if self.regex is None:
+            return found
+        lowered = text.lower()
+        for m in self.regex.finditer(lowered):
+            start, longest = m.start(), m.group(1)
+            for end in range(len(longest), 0, -1):
+                groups = self.groups_by_keyword.get(longest[:end])
+                if groups is None or groups <= found:
+                    continue
+                if self.whole_word and not self._ends_word(lowered, start + end):
+                    continue
+                found |= groups
+        return found
@@ -0,0 +1,107 @@
+from urllib.parse import urljoin, urlparse
+
+from html_parsing import make_soup
+from anchor_context import collect_anchor_contexts
+from keyword_matcher import get_matcher
+from thumbnails import listing_image_url
+from pub_dates import listing_published, format_pubdate, is_stale
+from url_utils import canonical_url, resolve_link
+
+# ----------------------------
+# Extract Candidates (homepage → every headline link, no keyword filter, no network)
+# ----------------------------
+def extract_candidates(url: str, html, backend: str = None, encoding: str = None) -> dict:
+    """
+    Parse a source homepage (str, or raw bytes + charset) and return
+    {"favicon_url": str, "feed_urls": [str, ...],
+     "candidates": [{"article": {...}, "context": str, "published": datetime or None}, ...]}
+    with one feed item per headline link plus the lower-cased text it is matched on.
+    thumbnail_url is the image next to the link on the listing page, "" if none;
+    published comes from the card's <time> or the link's date segment (pubDate is
+    now when neither exists); feed_urls are the RSS / Atom feeds the page advertises.
+
+    Keyword-independent, so one parse can be shared by every country (and feed
+    type) that scrapes the same page. Pure and picklable in/out, so it can run in
+    a ParsePool worker process.
+    """
+    candidates = []
+    seen_links = set()
+    soup = make_soup(html, backend, encoding)
+    page = collect_anchor_contexts(soup)
+
+    favicon_url = ""
+    icon_link = page["favicon"]
+    if icon_link and icon_link.has_attr("href"):
+        favicon_url = urljoin(url, icon_link["href"])
+    feed_urls = [urljoin(url, link["href"]) for link in page["feeds"]]
+
+    parsed_domain = urlparse(url).netloc
+
+    for anchor in page["anchors"]:
+        title = anchor["title"]
+        link = anchor["href"]
+
+        if not title or len(title.split()) <= 3:
+            continue
+        link = resolve_link(url, link)   # ../ and non-root sources resolved, tracking params / AMP stripped
+        if not link:
+            continue
+
+        key = canonical_url(link)
+        if key in seen_links:
+            continue
+        seen_links.add(key)
+
+        context_parts = [title]
+        context_parts.extend(text for text in anchor["paragraphs"] if text)
+        img = anchor["img"]
+        if img and img.has_attr("alt") and img["alt"].strip():
+            context_parts.append(img["alt"].strip())
+
+        published = listing_published(anchor["time"], link)
+
+        candidates.append({
+            "article": {
+                "title": title,
+                "description": " ".join(context_parts)[:500],
+                "link": link,
+                "guid": {"isPermaLink": True, "value": canonical_url(link)},
+                "dc:creator": parsed_domain,
+                "pubDate": format_pubdate(published),
+                "thumbnails": favicon_url,
+                "thumbnail_url": listing_image_url(img, url),
+            },
+            "context": " ".join(context_parts).lower(),
+            "published": published,
+        })
+
+    return {"favicon_url": favicon_url, "feed_urls": feed_urls, "candidates": candidates}
+
+
+# ----------------------------
+# Match Candidates (one country's keywords)
+# ----------------------------
+def match_candidates(candidates: list[dict], keywords: list[str], since=None) -> list[dict]:
+    """
+    Copies of the candidate articles whose context matches the keywords (whole words,
+    skips US$ / US€). With `since`, candidates dated before it are dropped first.
+    """
+    matcher = get_matcher(keywords)
+    return [
+        dict(c["article"])
+        for c in candidates
+        if not (since and is_stale(c.get("published"), since)) and matcher.search(c["context"])
+    ]
+
+
+# ----------------------------
+# Extract Listing (homepage → matching articles, no network)
+# ----------------------------
+def extract_listing(url: str, html, keywords: list[str], backend: str = None, encoding: str = None) -> dict:
+    """
+    Parse a source homepage and return {"favicon_url": str, "articles": [...]}
+    with one feed item per keyword-matching headline link. thumbnail_url comes from
+    the listing page when it has one; the caller enriches the rest.
+    """
+    page = extract_candidates(url, html, backend, encoding)
+    return {"favicon_url": page["favicon_url"], "articles": match_candidates(page["candidates"], keywords)}
@@ -0,0 +1,120 @@
+import os
+import re
+import random
+import hashlib
+
+# ----------------------------
+# Config
+# ----------------------------
+SIMILARITY = float(os.getenv("NEAR_DUP_SIMILARITY", "0.7"))   # Jaccard of word shingles counted as the same story
+NUM_HASHES = 32
+BAND_ROWS = 4                # 8 bands of 4: pairs around 0.8 almost always meet in a bucket, pairs below 0.4 rarely
+MIN_FEATURES = 4             # fewer shingles than this is too little text to compare
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(2024)   # 🔹 fixed seed: signatures are stable across runs and processes
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SITE_SUFFIX = re.compile(r"\s+[|–—-]\s+[^|–—-]{1,40}$")   # "Headline - Reuters", "Headline | Site Name"
+
+
+# ----------------------------
+# MinHash
+# ----------------------------
+def shingles(text: str) -> set:
+    """Word unigrams and bigrams of the lower-cased text."""
+    tokens = _WORD.findall((text or "").lower())
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def _feature_hash(feature: str) -> int:
+    # 🔹 blake2b, not hash(): signatures must not depend on PYTHONHASHSEED
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(features: set) -> tuple:
+    hashes = [_feature_hash(f) for f in features]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _bands(signature: tuple):
+    return [(i, signature[i:i + BAND_ROWS]) for i in range(0, NUM_HASHES, BAND_ROWS)]
+
+
+def _texts(article: dict) -> list:
+    """Title alone and title + description: listing headlines and feed items of the same story meet on the title."""
+    title = _SITE_SUFFIX.sub("", article.get("title") or "")
+    description = article.get("description") or ""
+    texts = [title]
+    if description and description != article.get("title"):
+        texts.append(f"{title} {description}")
+    return texts
+
+
+# ----------------------------
+# Clustering
+# ----------------------------
+def _representative_key(article: dict, position: int):
+    """Best copy of a story: one with a thumbnail, then the longest description, then the first seen."""
+    return (not article.get("thumbnail_url"), -len(article.get("description") or ""), position)
+
+
+def _alternate(article: dict) -> dict:
+    return {
+        "title": article["title"],
+        "link": article["link"],
+        "dc:creator": article.get("dc:creator"),
+        "pubDate": article.get("pubDate"),
+    }
+
+
+def cluster_articles(articles: list[dict]) -> list[dict]:
+    """
+    Collapse near-duplicate articles (the same wire story on several sources).
+
+    Each article gets up to two shingle sets (title; title + description) and a
+    MinHash signature per set; LSH bands bucket the signatures so only articles
+    sharing a band are compared, and a pair is merged (union-find) when the
+    exact Jaccard of its shingle sets reaches SIMILARITY. One representative per
+    cluster is returned, in input order, with the other copies under
+    "alternates". Any "alternates" from an earlier run are replaced.
+    """
+    parent = list(range(len(articles)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets = {}
+    for i, article in enumerate(articles):
+        for kind, text in enumerate(_texts(article)):
+            features = shingles(text)
+            if len(features) < MIN_FEATURES:
+                continue
+            for band in _bands(minhash(features)):
+                for j, other in buckets.get((kind, band), ()):
+                    if find(i) != find(j) and jaccard(features, other) >= SIMILARITY:
+                        parent[find(i)] = find(j)
+                buckets.setdefault((kind, band), []).append((i, features))
+
+    clusters = {}
+    for i in range(len(articles)):
+        clusters.setdefault(find(i), []).append(i)
+
+    representatives = []
+    for members in clusters.values():
+        best = min(members, key=lambda i: _representative_key(articles[i], i))
+        article = articles[best]
+        article.pop("alternates", None)
+        alternates = [_alternate(articles[i]) for i in members if i != best]
+        if alternates:
+            article["alternates"] = alternates
+        representatives.append((best, article))
+    return [article for _, article in sorted(representatives, key=lambda pair: pair[0])]
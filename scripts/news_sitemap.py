@@ -0,0 +1,333 @@
+import os
+import zlib
+import asyncio
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urljoin, urlsplit
+
+from prisma import Prisma
+
+from fetch_scheduler import FetchScheduler
+from pub_dates import parse_date
+from url_utils import canonical_url
+
+# ----------------------------
+# Config
+# ----------------------------
+NEWS_WINDOW = timedelta(hours=int(os.getenv("NEWS_SITEMAP_HOURS", "48")))          # Google News sitemaps cover 2 days
+SITEMAP_RECHECK = timedelta(days=int(os.getenv("SITEMAP_RECHECK_DAYS", "7")))      # re-probe sources without one after this
+NEWS_SITEMAP_PATHS = ["/news-sitemap.xml", "/sitemap-news.xml", "/sitemap_news.xml", "/news_sitemap.xml"]
+SITEMAP_BYTE_CAP = 20 * 1024 * 1024   # decompressed bytes read per sitemap
+INDEX_BYTE_CAP = 1024 * 1024          # sitemap indexes are small; stop early on huge ones
+ROBOTS_BYTE_CAP = 256 * 1024
+MAX_CHILD_SITEMAPS = 5                # children of a news sitemap index read per run
+SITEMAP_ACCEPT = "application/xml, text/xml;q=0.9, */*;q=0.5"
+
+NEWS_NS = "{http://www.google.com/schemas/sitemap-news/0.9}"
+IMAGE_NS = "{http://www.google.com/schemas/sitemap-image/1.1}"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _local(tag) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def _child_text(elem, tag: str) -> str:
+    child = elem.find(tag)
+    return (child.text or "").strip() if child is not None else ""
+
+
+# ----------------------------
+# Streaming parser
+# ----------------------------
+class SitemapParser:
+    """
+    Incremental <urlset> / <sitemapindex> parser on top of XMLPullParser.
+
+    For a urlset, every <url> with a <news:news> block published after `since`
+    becomes an entry shaped like feed_ingest.FeedParser items ({"title", "link",
+    "description", "published", "author", "image_url"}); older ones are only
+    counted. For an index, `sitemaps` collects (loc, lastmod). Finished elements
+    are detached from the tree, so memory stays flat on 50k-URL files.
+    `kind` is None until the root is seen, then "urlset" / "index", or "" when
+    the document is not a sitemap.
+    """
+
+    def __init__(self, since: datetime = None):
+        self.parser = ET.XMLPullParser(events=("start", "end"))
+        self.since = since
+        self.stack = []
+        self.kind = None
+        self.is_news = False   # saw a <news:news> block
+        self.url_count = 0
+        self.old_count = 0
+        self.items = []
+        self.sitemaps = []
+        self.done = False
+
+    def feed(self, data: bytes):
+        self.parser.feed(data)
+        self._drain()
+
+    def close(self):
+        self.parser.close()
+        self._drain()
+
+    def _drain(self):
+        for event, elem in self.parser.read_events():
+            name = _local(elem.tag)
+            if event == "start":
+                if self.kind is None:
+                    self.kind = {"urlset": "urlset", "sitemapindex": "index"}.get(name, "")
+                    self.done = not self.kind
+                self.stack.append(elem)
+                continue
+
+            self.stack.pop()
+            if name == "url" and self.kind == "urlset":
+                self.url_count += 1
+                self._url(elem)
+            elif name == "sitemap" and self.kind == "index":
+                loc = next((c.text or "" for c in elem if _local(c.tag) == "loc"), "").strip()
+                lastmod = next((c.text or "" for c in elem if _local(c.tag) == "lastmod"), "")
+                if loc:
+                    self.sitemaps.append((loc, parse_date(lastmod)))
+            else:
+                continue
+            if self.stack:
+                self.stack[-1].remove(elem)   # 🔹 keep the tree (and memory) from growing
+
+    def _url(self, elem):
+        news = elem.find(f"{NEWS_NS}news")
+        if news is None:
+            return
+        self.is_news = True
+        loc = next((c.text or "" for c in elem if _local(c.tag) == "loc"), "").strip()
+        title = _child_text(news, f"{NEWS_NS}title")
+        published = parse_date(_child_text(news, f"{NEWS_NS}publication_date")) \
+            or parse_date(next((c.text or "" for c in elem if _local(c.tag) == "lastmod"), ""))
+        if not loc or not title:
+            return
+        if self.since and (published is None or published < self.since):
+            self.old_count += 1
+            return
+        publication = news.find(f"{NEWS_NS}publication")
+        image = elem.find(f"{IMAGE_NS}image/{IMAGE_NS}loc")
+        self.items.append({
+            "title": title,
+            "link": loc,
+            "description": _child_text(news, f"{NEWS_NS}keywords"),
+            "published": published,
+            "author": _child_text(publication, f"{NEWS_NS}name") if publication is not None else "",
+            "image_url": (image.text or "").strip() if image is not None else "",
+        })
+
+
+# ----------------------------
+# Streaming fetch
+# ----------------------------
+async def _read(scheduler: FetchScheduler, url: str, parser: SitemapParser, byte_cap: int, stop=None,
+                headers: dict = None, timeout: float = None) -> dict:
+    """
+    Stream url into parser, un-gzipping .xml.gz bodies on the fly. Stops at
+    byte_cap, when parser.done, or when stop(parser) is true.
+    Returns {"status", "etag", "last_modified"}.
+    """
+    headers = {"Accept": SITEMAP_ACCEPT, **(headers or {})}
+    async with scheduler.stream(url, headers=headers, timeout=timeout) as r:
+        meta = {"status": r.status_code, "etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+        if r.status_code != 200:
+            return meta
+        inflate = None
+        read = 0
+        async for chunk in r.aiter_bytes():
+            if read == 0 and chunk[:2] == GZIP_MAGIC:
+                inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)   # served as a .gz file, not Content-Encoding
+            if inflate is not None:
+                chunk = inflate.decompress(chunk, max(1, byte_cap - read))
+            read += len(chunk)
+            parser.feed(chunk)
+            if parser.done or read >= byte_cap or (stop and stop(parser)):
+                break
+        else:
+            parser.close()
+        return meta
+
+
+async def _read_urlset(scheduler: FetchScheduler, url: str, since: datetime, timeout: float = None):
+    parser = SitemapParser(since)
+    try:
+        await _read(scheduler, url, parser, SITEMAP_BYTE_CAP, timeout=timeout)
+    except ET.ParseError:
+        pass   # 🔹 truncated / malformed tail: keep what was parsed
+    return parser.items
+
+
+async def fetch_news_sitemap(scheduler: FetchScheduler, url: str, saved_etag: str = None, saved_lastmod: str = None,
+                             window: timedelta = NEWS_WINDOW, timeout: float = None) -> dict:
+    """
+    Stream a news sitemap (or a news sitemap index and its newest children) and
+    return {"error", "etag", "last_modified", "items"} with the articles published
+    within `window`. error is "not_modified" on a 304 and "not a news sitemap"
+    when the document has URLs but no <news:news> blocks.
+    """
+    result = {"error": None, "etag": None, "last_modified": None, "items": []}
+    headers = {}
+    if saved_etag:
+        headers["If-None-Match"] = saved_etag
+    if saved_lastmod:
+        headers["If-Modified-Since"] = saved_lastmod
+    since = datetime.now(timezone.utc) - window
+
+    parser = SitemapParser(since)
+    try:
+        meta = await _read(scheduler, url, parser, SITEMAP_BYTE_CAP, headers=headers, timeout=timeout)
+    except ET.ParseError as e:
+        if not parser.kind:
+            result["error"] = f"not a sitemap: {e}"
+            return result
+        meta = {"status": 200, "etag": None, "last_modified": None}
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+        return result
+
+    if meta["status"] == 304:
+        result["error"] = "not_modified"
+        return result
+    if meta["status"] != 200:
+        result["error"] = f"HTTP {meta['status']}"
+        return result
+    if not parser.kind:
+        result["error"] = "not a sitemap"
+        return result
+
+    if parser.kind == "index":
+        # 🔹 newest children first; their contents change without the index changing, so no validators
+        children = [(loc, lastmod) for loc, lastmod in parser.sitemaps if lastmod is None or lastmod >= since]
+        children.sort(key=lambda c: c[1] or since, reverse=True)
+        batches = await asyncio.gather(
+            *(_read_urlset(scheduler, urljoin(url, loc), since, timeout) for loc, _ in children[:MAX_CHILD_SITEMAPS]),
+            return_exceptions=True,
+        )
+        seen = set()
+        for batch in batches:
+            if isinstance(batch, Exception):
+                continue
+            for item in batch:
+                key = canonical_url(item["link"])
+                if key not in seen:
+                    seen.add(key)
+                    result["items"].append(item)
+        return result
+
+    if parser.url_count and not parser.is_news:
+        result["error"] = "not a news sitemap"
+        return result
+    result.update(etag=meta["etag"], last_modified=meta["last_modified"], items=parser.items)
+    return result
+
+
+# ----------------------------
+# Discovery
+# ----------------------------
+async def robots_sitemaps(scheduler: FetchScheduler, base_url: str, timeout: float = None) -> list[str]:
+    """Sitemap: lines from the site's robots.txt, in file order."""
+    parts = urlsplit(base_url)
+    robots_url = f"{parts.scheme or 'https'}://{parts.netloc}/robots.txt"
+    try:
+        async with scheduler.stream(robots_url, headers={"Accept": "text/plain"}, timeout=timeout) as r:
+            if r.status_code != 200:
+                return []
+            body, read = [], 0
+            async for chunk in r.aiter_bytes():
+                body.append(chunk)
+                read += len(chunk)
+                if read >= ROBOTS_BYTE_CAP:
+                    break
+    except Exception:
+        return []
+    sitemaps = []
+    for line in b"".join(body).decode("utf-8", errors="replace").splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "sitemap" and value.strip():
+            sitemaps.append(urljoin(robots_url, value.strip()))
+    return sitemaps
+
+
+async def sniff_sitemap(scheduler: FetchScheduler, url: str, timeout: float = None) -> dict:
+    """
+    Read just enough of a sitemap to classify it: {"kind", "is_news", "children"}.
+    A urlset is read up to its first <url>; an index up to INDEX_BYTE_CAP.
+    """
+    parser = SitemapParser()
+    try:
+        meta = await _read(scheduler, url, parser, INDEX_BYTE_CAP, stop=lambda p: p.url_count > 0, timeout=timeout)
+        ok = meta["status"] == 200
+    except Exception:
+        ok = bool(parser.kind)
+    if not ok or not parser.kind:
+        return {"kind": "", "is_news": False, "children": []}
+    return {"kind": parser.kind, "is_news": parser.is_news, "children": [urljoin(url, loc) for loc, _ in parser.sitemaps]}
+
+
+def _looks_news(url: str) -> bool:
+    return "news" in urlsplit(url).path.lower()
+
+
+async def find_news_sitemap(scheduler: FetchScheduler, base_url: str, timeout: float = None):
+    """
+    News sitemap URL for a site, or None. robots.txt Sitemap: entries come first
+    (news-looking ones, then the news children of the indexes it lists), then the
+    common NEWS_SITEMAP_PATHS; each round is probed concurrently and the first hit
+    in list order wins. A news sitemap index counts as a hit.
+    """
+    listed = await robots_sitemaps(scheduler, base_url, timeout)
+    parts = urlsplit(base_url)
+    origin = f"{parts.scheme or 'https'}://{parts.netloc}"
+    seen = set()
+
+    async def probe(candidates: list[str]) -> list[tuple]:
+        urls = []
+        for url in candidates:
+            key = canonical_url(url)
+            if key and key not in seen:
+                seen.add(key)
+                urls.append(url)
+        results = await asyncio.gather(*(sniff_sitemap(scheduler, url, timeout) for url in urls))
+        return list(zip(urls, results))
+
+    def first_hit(probed: list[tuple]):
+        return next((url for url, info in probed if info["is_news"] or (info["kind"] == "index" and _looks_news(url))), None)
+
+    found = first_hit(await probe([url for url in listed if _looks_news(url)]))
+    if found:
+        return found
+
+    # 🔹 generic indexes from robots.txt (sitemap_index.xml, ...) often list the news sitemap
+    indexes = await probe([url for url in listed if not _looks_news(url)])
+    found = first_hit(indexes) or first_hit(await probe(
+        [child for _, info in indexes if info["kind"] == "index" for child in info["children"] if _looks_news(child)]
+    ))
+    if found:
+        return found
+
+    return first_hit(await probe([origin + path for path in NEWS_SITEMAP_PATHS]))
+
+
+def sitemap_check_due(state) -> bool:
+    """A source without a known news sitemap is re-probed once SITEMAP_RECHECK has passed since the last probe."""
+    if state is None:
+        return True
+    if state.sitemapUrl:
+        return False
+    checked = state.sitemapCheckedAt
+    return checked is None or checked <= datetime.now(timezone.utc) - SITEMAP_RECHECK
+
+
+async def save_sitemap_url(db: Prisma, source_id: str, sitemap_url: str):
+    """Remember a source's news sitemap (None = probed, none found) on its NewsSourceFetchState."""
+    data = {"sitemapUrl": sitemap_url, "sitemapCheckedAt": datetime.now(timezone.utc)}
+    await db.newssourcefetchstate.upsert(
+        where={"newsSourceId": source_id},
+        data={"create": {"newsSourceId": source_id, **data}, "update": data},
+    )
@@ -2,15 +2,33 @@ import sys
 import json
 import asyncio
 import logging
-import random
-import re
-from datetime import datetime
+import hashlib
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import urlparse
 from dotenv import load_dotenv
-import httpx
-from bs4 import BeautifulSoup
 from prisma import Prisma
 from tqdm.asyncio import tqdm_asyncio
-from urllib.parse import urljoin, urlparse
+
+from fetch_scheduler import FetchScheduler
+from head_meta import fetch_head_meta
+from listing_extract import extract_candidates, match_candidates
+from parse_pool import ParsePool
+from challenge_fetch import ChallengeFetcher
+from domain_health import DomainHealthRegistry, DomainOpenError
+from article_meta import ArticleMetaCache
+from image_cdn import apply_renditions
+from thumbnail_store import ThumbnailStore
+from run_cache import RunCache
+from url_utils import canonical_url, prefer_canonical
+from near_dupes import cluster_articles
+from url_classifier import UrlPatternModel
+from seen_articles import SeenArticleIndex
+from keyword_matcher import get_matcher
+from article_details import DETAILS, load_details, details_published, merge_details, listing_words, choose_depth, pick_details_links, updated_yield
+from pub_dates import parse_date, format_pubdate, fresh_articles, lookback_cutoff, is_stale
+from feed_ingest import fetch_feed, feed_article, find_feed, feed_check_due
+from news_sitemap import fetch_news_sitemap, find_news_sitemap, sitemap_check_due
 
 load_dotenv()
 # ----------------------------
@@ -53,81 +71,50 @@ logging.basicConfig(
 # Concurrency
 # ----------------------------
 MAX_COUNTRY_CONCURRENCY = 5
-MAX_URL_CONCURRENCY = 20
+MAX_URL_CONCURRENCY = 20   # global in-flight HTTP requests
+MAX_HOST_CONCURRENCY = 4   # in-flight HTTP requests per host
+HOST_RATE = 2.0            # requests per second per host
 MAX_DB_CONCURRENCY = 2  # 🔹 limit DB connections
 
 country_semaphore = asyncio.Semaphore(MAX_COUNTRY_CONCURRENCY)
-url_semaphore = asyncio.Semaphore(MAX_URL_CONCURRENCY)
 db_semaphore = asyncio.Semaphore(MAX_DB_CONCURRENCY)
 
 # ----------------------------
-# Safe DB wrapper
+# Parse workers (HTML parsing off the event loop, bounded)
 # ----------------------------
-async def safe_db_call(func, *args, **kwargs):
-    async with db_semaphore:
-        return await func(*args, **kwargs)
+parse_pool = ParsePool()
 
 # ----------------------------
-# HTTP Client
+# Run cache (a page / og:image shared by several countries is fetched + parsed once)
 # ----------------------------
-client = httpx.AsyncClient(
-    timeout=8, follow_redirects=True, headers={"User-Agent": random.choice(USER_AGENTS)}
-)
+run_cache = RunCache()
+meta_cache = ArticleMetaCache()   # persisted og:image / published time / author per article
+thumbnail_stats = Counter()       # which cascade step resolved each article's thumbnail
+THUMB_ORIGIN = "_thumb_origin"    # run-only article key: where this run extracted its thumbnail (never saved)
+url_model = UrlPatternModel()        # navigation URL shapes per domain, learned from details fetches (details depth only)
+seen_index = SeenArticleIndex()      # details pages fetched in earlier runs (details depth only)
 
 # ----------------------------
-# Retry wrapper
-# ----------------------------
-async def with_retries(coro_func, *args, retries=3, **kwargs):
-    for attempt in range(1, retries + 1):
-        try:
-            return await coro_func(*args, **kwargs)
-        except Exception as e:
-            if attempt == retries:
-                logging.error(f"Failed after {retries} retries: {e}")
-                return None
-            await asyncio.sleep(1 * attempt)
-
-# ----------------------------
-# Image cleaner
+# Safe DB wrapper
 # ----------------------------
-def clean_image_url(img_url: str) -> str:
-    if not img_url:
-        return ""
-    try:
-        parsed = urlparse(img_url)
-        path_parts = parsed.path.split("/")
-        if "upload" in path_parts:
-            idx = path_parts.index("upload")
-            after_upload = path_parts[idx + 1 :]
-            if len(after_upload) >= 2:
-                transforms = ",".join(after_upload[:-1])
-                image_id = after_upload[-1]
-                width_transform = None
-                for part in transforms.split(","):
-                    if part.strip().startswith("w_"):
-                        width_transform = part.strip()
-                if width_transform:
-                    return f"{parsed.scheme}://{parsed.netloc}/image/upload/{width_transform}/{image_id}"
-        return img_url
-    except Exception:
-        return img_url
+async def safe_db_call(func, *args, **kwargs):
+    async with db_semaphore:
+        return await func(*args, **kwargs)
 
 # ----------------------------
-# Keyword Matcher
+# HTTP Scheduler (per-host pacing, persisted circuit breaker, cached Cloudflare sessions)
 # ----------------------------
-def keyword_match(full_context: str, keywords: list[str]) -> bool:
-    """
-    Return True if a keyword is found in the context as a proper word,
-    but skip cases like US$ / US€ (currencies).
-    """
-    for word in keywords:
-        pattern = r"\b" + re.escape(word) + r"\b"
-        for match in re.finditer(pattern, full_context, flags=re.IGNORECASE):
-            after = full_context[match.end():match.end()+1]
-            if after in ["$", "€"]:
-                continue
-            return True
-    return False
+domain_health = DomainHealthRegistry()
+scheduler = FetchScheduler(
+    user_agents=USER_AGENTS,
+    max_in_flight=MAX_URL_CONCURRENCY,
+    max_per_host=MAX_HOST_CONCURRENCY,
+    host_rate=HOST_RATE,
+    timeout=8,
+    health=domain_health,
+    challenge=ChallengeFetcher(),  # only used for domains known to need it
+)
+thumbnail_store = ThumbnailStore(scheduler)   # local resized copies under public/ (when THUMBNAIL_BASE_URL is set)
 
 # ----------------------------
 # Fetch Page
@@ -140,139 +127,365 @@ async def fetch_page(url: str, saved_etag: str = None, saved_lastmod: str = None
         headers["If-Modified-Since"] = saved_lastmod
 
     try:
-        r = await client.get(url, headers=headers)
+        r = await scheduler.get(url, headers=headers)
         if r.status_code == 304:
             logging.info(f"[SKIP] {url} → Not Modified (304)")
-            return None, "not_modified", None, None
+            return None, "not_modified", None, None, None
         if r.status_code != 200:
             logging.error(f"[HTTP ERROR] {url} → {r.status_code} {r.reason_phrase}")
         r.raise_for_status()
-        return r.text, None, r.headers.get("ETag"), r.headers.get("Last-Modified")
+        # raw bytes + charset: decoding happens in the parse worker, not on the event loop
+        return r.content, None, r.headers.get("ETag"), r.headers.get("Last-Modified"), r.charset_encoding
     except Exception as e:
         logging.error(f"[REQUEST FAILED] {url} → {e}")
-        return None, str(e), None, None
+        return None, str(e), None, None, None
 
 # ----------------------------
-# OG Image
+# Article metadata (cache first, then the article's <head>)
 # ----------------------------
-async def get_og_image(article_url: str) -> str:
+async def get_article_meta(article_url: str):
+    """og:image / published time / author for an article: from meta_cache if known, else streamed and cached."""
+    hit, meta = meta_cache.get(article_url)
+    if hit:
+        return meta
     try:
-        r = await client.get(article_url, timeout=8)
-        if r.status_code == 200:
-            soup = BeautifulSoup(r.text, "html.parser")
-            og_tag = soup.find("meta", property="og:image")
-            if og_tag and og_tag.get("content"):
-                raw_url = urljoin(article_url, og_tag["content"].strip())
-                return clean_image_url(raw_url)
+        meta = await fetch_head_meta(scheduler, article_url, timeout=8)
+    except DomainOpenError:
+        return None   # not attempted, nothing to cache
     except Exception:
-        return ""
-    return ""
+        meta_cache.put(article_url, None, failed=True)
+        return None
+    meta_cache.put(article_url, meta)
+    return meta
 
 # ----------------------------
-# Scrape Articles
+# Enrich Articles (thumbnail cascade: listing <img> → metadata cache → <head> fetch)
 # ----------------------------
-async def scrape_articles(url: str, html: str, keywords: list[str], country_name: str):
-    articles = []
-    seen_links = set()
-    soup = BeautifulSoup(html, "html.parser")
+def apply_meta(article: dict, meta: dict, step: str):
+    """Copy a metadata hit onto an article: og:image if it still has no thumbnail, the real publication time and its canonical URL."""
+    if meta and meta.get("og_image") and not article["thumbnail_url"]:
+        article["thumbnail_url"] = meta["og_image"]
+        thumbnail_stats[step] += 1
+    published = parse_date((meta or {}).get("published_time"))
+    if published:
+        article["pubDate"] = format_pubdate(published)
+    if meta and meta.get("canonical"):
+        article["link"] = prefer_canonical(article["link"], meta["canonical"])
+        article["guid"] = {"isPermaLink": True, "value": canonical_url(article["link"])}
+
+async def enrich_articles(db: Prisma, articles: list[dict], since) -> list[dict]:
+    # 1. listing image / feed media / details og:image extracted this run; anything else
+    #    came with the articles reused on a 304 (resolved in an earlier run)
+    missing = []
+    for article in articles:
+        origin = article.pop(THUMB_ORIGIN, None)
+        if article["thumbnail_url"]:
+            thumbnail_stats[origin or "reused"] += 1
+        else:
+            missing.append(article)
+
+    # 2. metadata cache (one query for the batch; negative entries count as resolved)
+    to_fetch = []
+    if missing:
+        await safe_db_call(meta_cache.load, db, [article["link"] for article in missing])
+    for article in missing:
+        hit, meta = meta_cache.get(article["link"])
+        if not hit:
+            to_fetch.append(article)
+            continue
+        apply_meta(article, meta, "meta_cache")
+        if not article["thumbnail_url"]:
+            thumbnail_stats["none"] += 1
 
-    favicon_url = ""
-    icon_link = soup.find("link", rel=lambda v: v and "icon" in v.lower())
-    if icon_link and icon_link.has_attr("href"):
-        favicon_url = urljoin(url, icon_link["href"])
+    # 3. last resort: the article's <head> (single-flight per URL within the run)
+    tasks = [run_cache.get(("meta", canonical_url(article["link"])), get_article_meta, article["link"]) for article in to_fetch]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
 
-    parsed_domain = urlparse(url).netloc
+    for article, meta in zip(to_fetch, results):
+        apply_meta(article, meta if isinstance(meta, dict) else None, "head_fetch")
+        if not article["thumbnail_url"]:
+            thumbnail_stats["none"] += 1
 
-    tasks = []
-    temp_articles = []
+    # 🔹 the article's own metadata may date it before the lookback window
+    return fresh_articles(articles, since)
 
-    for a in soup.find_all("a", href=True):
-        title = a.get_text(strip=True)
-        link = a["href"]
+# ----------------------------
+# Per-source validator store
+# ----------------------------
+def keywords_fingerprint(keywords: list[str]) -> str:
+    """Stable hash of a keyword list, so cached articles are only reused for the same keywords."""
+    return hashlib.sha1("\n".join(sorted(k.lower() for k in keywords)).encode("utf-8")).hexdigest()
+
+async def load_fetch_states(db: Prisma, sources) -> dict:
+    """Return {news_source_id: NewsSourceFetchState} for the given sources."""
+    if not sources:
+        return {}
+    rows = await safe_db_call(
+        db.newssourcefetchstate.find_many,
+        where={"newsSourceId": {"in": [s.id for s in sources]}},
+    )
+    return {row.newsSourceId: row for row in rows}
+
+async def save_fetch_state(db: Prisma, source_id: str, etag, last_modified, keywords_hash: str, articles: list, **extra):
+    data = {
+        "etag": etag,
+        "lastModified": last_modified,
+        "keywordsHash": keywords_hash,
+        "articles": json.dumps(articles, ensure_ascii=False),
+        **extra,
+    }
+    await safe_db_call(
+        db.newssourcefetchstate.upsert,
+        where={"newsSourceId": source_id},
+        data={"create": {"newsSourceId": source_id, **data}, "update": data},
+    )
 
-        if not title or len(title.split()) <= 3:
-            continue
-        if not link.startswith("http"):
-            link = url.rstrip("/") + "/" + link.lstrip("/")
+# ----------------------------
+# Load Listing (fetch → parse in worker, shared through run_cache)
+# ----------------------------
+async def load_listing(url: str, saved_etag: str = None, saved_lastmod: str = None) -> dict:
+    """
+    Fetch a homepage and parse it into keyword-independent candidates:
+    {"error", "etag", "last_modified", "favicon_url", "candidates"}.
+    """
+    listing = {"error": None, "etag": None, "last_modified": None, "favicon_url": "", "candidates": []}
 
-        if link in seen_links:
-            continue
-        seen_links.add(link)
-
-        context_parts = [title]
-
-        parent = a.find_parent()
-        if parent:
-            for p in parent.find_all("p", limit=3):
-                text = p.get_text(strip=True)
-                if text:
-                    context_parts.append(text)
-            img = parent.find("img")
-            if img and img.has_attr("alt") and img["alt"].strip():
-                context_parts.append(img["alt"].strip())
-
-        full_context = " ".join(context_parts).lower()
-        if not keyword_match(full_context, keywords):
-            continue
+    html, error_reason, new_etag, new_lastmod, encoding = await fetch_page(url, saved_etag, saved_lastmod)
+    if error_reason or not html:
+        listing["error"] = error_reason
+        return listing
 
-        pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
-
-        article = {
-            "title": title,
-            "description": " ".join(context_parts)[:500],
-            "link": link,
-            "guid": {"isPermaLink": True, "value": link},
-            "dc:creator": parsed_domain,
-            "pubDate": pub_time,
-            "thumbnails": favicon_url,
-            "thumbnail_url": "",
-        }
+    # 🔹 Only the parse waits for the pool: downloads (bounded by the scheduler) overlap with parsing
+    try:
+        async with parse_pool.slot():
+            page = await parse_pool.run(extract_candidates, url, html, None, encoding)
+    except Exception as e:
+        logging.error(f"parsing failed for {url}: {e}")
+        listing["error"] = f"parse failed: {e}"
+        return listing
 
-        temp_articles.append(article)
-        tasks.append(with_retries(get_og_image, link))
+    listing.update(etag=new_etag, last_modified=new_lastmod, **page)
+    return listing
 
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+# ----------------------------
+# Load Feed / News Sitemap (in place of the homepage, shared through run_cache)
+# ----------------------------
+GONE_ERRORS = ("HTTP 404", "HTTP 410", "not a feed", "not a sitemap", "not a news sitemap")   # moved or removed: probe again
+
+def entries_listing(result: dict, entries: list[dict], source_url: str, image: str = "") -> dict:
+    """Feed / sitemap entries → the same shape load_listing() returns, with the entries' own pubDates."""
+    listing = {"error": result["error"], "etag": result["etag"], "last_modified": result["last_modified"],
+               "favicon_url": image, "feed_urls": [], "candidates": []}
+    if not listing["error"] and not entries:
+        listing["error"] = "no entries"
+    if listing["error"]:
+        return listing
+
+    creator = urlparse(source_url).netloc
+    for entry in entries:
+        listing["candidates"].append({
+            "article": feed_article(entry, creator, image),
+            "context": f"{entry['title']} {entry['description']}".lower(),
+            "published": entry["published"],
+        })
+    return listing
+
+async def load_feed(feed_url: str, source_url: str, saved_etag: str = None, saved_lastmod: str = None) -> dict:
+    feed = await fetch_feed(scheduler, feed_url, saved_etag, saved_lastmod, timeout=8)
+    return entries_listing(feed, feed["items"], source_url, feed["image"])
+
+async def load_sitemap(sitemap_url: str, source_url: str, saved_etag: str = None, saved_lastmod: str = None) -> dict:
+    """Articles a news sitemap lists for the last NEWS_SITEMAP_HOURS; no homepage crawl at all."""
+    sitemap = await fetch_news_sitemap(scheduler, sitemap_url, saved_etag, saved_lastmod, timeout=8)
+    return entries_listing(sitemap, sitemap["items"], source_url)
 
-    for article, og_img in zip(temp_articles, results):
-        if isinstance(og_img, str) and og_img:
-            article["thumbnail_url"] = og_img
-        articles.append(article)
+# ----------------------------
+# Details depth (thin listings: best-scoring headlines matched on their article body)
+# ----------------------------
+async def fetch_article(article_url: str):
+    try:
+        return await scheduler.get(article_url)
+    except Exception:
+        return None   # open breaker / network error: not recorded, retried next run
 
-    return articles
+async def scrape_details(db: Prisma, candidates: list[dict], matched_articles: list[dict], keywords: list[str], since, origin: str = "listing") -> tuple:
+    """
+    Fetch the most article-like headlines not matched at headline depth (seen
+    index first, at most MAX_DETAILS_PER_SOURCE) and match their body text.
+    Returns (articles found, pages looked at).
+    """
+    matched = {canonical_url(a["link"]) for a in matched_articles}
+    picks = pick_details_links(url_model, candidates, matched, since)
+    if not picks:
+        return [], 0
+    links = [c["article"]["link"] for c in picks]
+    await safe_db_call(seen_index.load, db, links)
+    results = await asyncio.gather(
+        *(run_cache.get(("details", canonical_url(link)), load_details, link, fetch_article, seen_index, url_model, parse_pool) for link in links),
+        return_exceptions=True,
+    )
+
+    matcher = get_matcher(keywords)
+    found = []
+    for candidate, link, details in zip(picks, links, results):
+        if not isinstance(details, dict):
+            continue
+        published = details_published(details, link)
+        if is_stale(published, since) or not matcher.search(f"{details['title']} {details['content_text']}".lower()):
+            continue
+        article = merge_details(candidate["article"], details, published)
+        if article["thumbnail_url"]:
+            article[THUMB_ORIGIN] = origin if candidate["article"]["thumbnail_url"] else "details"
+        found.append(article)
+    return found, len(picks)
+
+# ----------------------------
+# Scrape Single Source (shared listing → this country's matches; enriched per country)
+# ----------------------------
+async def scrape_source(db: Prisma, source, state, keywords: list[str], keywords_hash: str, country_name: str) -> dict:
+    """
+    This country's articles from one source: {"articles", "state"}. Fresh matches
+    are not enriched yet; "state" is the validators / discovery to save once they
+    are (None when nothing is to be saved, e.g. on 304 or error).
+    """
+    url = source.url
+
+    # 🔹 Only send validators when the cached articles were built with the current keywords,
+    #    and only to the document that sent them (a feed must not get the homepage's Last-Modified)
+    use_validators = state is not None and state.keywordsHash == keywords_hash
+    validators_url = canonical_url(state.validatorsUrl) if use_validators and state.validatorsUrl else None
+
+    def validators(doc_url: str) -> tuple:
+        if validators_url and canonical_url(doc_url) == validators_url:
+            return state.etag, state.lastModified
+        return None, None
+
+    # 🔹 Cheapest complete source first: news sitemap → feed → homepage
+    listing, used, read_url, gone = None, "html", url, set()
+    modes = [
+        ("sitemap", state.sitemapUrl if state is not None else None, load_sitemap),
+        ("feed", state.feedUrl if state is not None else None, load_feed),
+    ]
+    for mode, doc_url, loader in modes:
+        if not doc_url:
+            continue
+        saved_etag, saved_lastmod = validators(doc_url)
+        result = await run_cache.get(
+            (mode, canonical_url(doc_url), saved_etag, saved_lastmod), loader, doc_url, url, saved_etag, saved_lastmod
+        )
+        if result["error"] and result["error"] != "not_modified":
+            logging.warning(f"[{country_name}] {mode} {doc_url} failed ({result['error']}) → falling back")
+            if result["error"].startswith(GONE_ERRORS):
+                gone.add(mode)
+            continue
+        listing, used, read_url = result, mode, doc_url
+        break
+
+    # 🔹 Same page + same validators → one fetch + parse per run, whichever country asks first
+    if listing is None:
+        saved_etag, saved_lastmod = validators(url)
+        listing = await run_cache.get(
+            ("listing", canonical_url(url), saved_etag, saved_lastmod), load_listing, url, saved_etag, saved_lastmod
+        )
+    since = lookback_cutoff()
+    if listing["error"] == "not_modified":
+        cached = fresh_articles(json.loads(state.articles or "[]"), since)
+        logging.info(f"[{country_name}] {url} not modified → reusing {len(cached)} cached articles")
+        return {"articles": cached, "state": None}
+    if listing["error"]:
+        logging.error(f"[{country_name}] ERROR from {url}: {listing['error']}")
+        return {"articles": [], "state": None}
+
+    # 🔹 Stale (dated before the lookback window) candidates never reach enrichment
+    articles = match_candidates(listing["candidates"], keywords, since)
+    origin = "listing" if used == "html" else used
+    for article in articles:
+        if article["thumbnail_url"]:
+            article[THUMB_ORIGIN] = origin
+    etag, last_modified = listing["etag"], listing["last_modified"]
+    now = datetime.now(timezone.utc)
+
+    # 🔹 Depth per source: a listing too thin to match on gets details fetches for its
+    #    most article-like unmatched links, for as long as they keep finding matches
+    depth = choose_depth(state, listing_words(listing["candidates"]))
+    extra = {"depth": depth, "validatorsUrl": read_url}
+    if depth == DETAILS:
+        found, fetched = await scrape_details(db, listing["candidates"], articles, keywords, since, origin)
+        articles.extend(found)
+        previous = state.detailsYield if state is not None else None
+        extra.update(detailsYield=updated_yield(previous, len(found), fetched), detailsCheckedAt=now)
+        logging.info(f"[{country_name}] {url} details depth → {len(found)} more from {fetched} pages")
+
+    # 🔹 Discovery of anything better than what was read: robots.txt news sitemaps, then
+    #    advertised <link rel="alternate"> feeds / common paths; used from the next run on
+    probes = {}
+    if used != "sitemap" and ("sitemap" in gone or sitemap_check_due(state)):
+        probes["sitemap"] = run_cache.get(("sitemap_probe", canonical_url(url)), find_news_sitemap, scheduler, url, 8)
+    if used == "html" and ("feed" in gone or feed_check_due(state)):
+        probes["feed"] = run_cache.get(("feed_probe", canonical_url(url)), find_feed, scheduler, url, listing.get("feed_urls", []), 8)
+    found = dict(zip(probes, await asyncio.gather(*probes.values(), return_exceptions=True)))
+    for mode, result in found.items():
+        if isinstance(result, Exception):
+            continue
+        extra.update({f"{mode}Url": result, f"{mode}CheckedAt": now})
+        if result:
+            logging.info(f"[{country_name}] {url} → {mode} {result}")
+            etag = last_modified = None   # validators of what was read mean nothing to the new document
+
+    return {"articles": articles, "state": (etag, last_modified, extra)}
 
 # ----------------------------
 # Scrape Single Country
 # ----------------------------
 async def scrape_country(db: Prisma, country, sources_by_country, keywords_by_country):
     async with country_semaphore:
-        urls = sources_by_country.get(country.id, [])
+        sources = sources_by_country.get(country.id, [])
         keywords = keywords_by_country.get(country.id, [])
 
-        if not urls or not keywords:
+        if not sources or not keywords:
             return 0
 
-        all_articles = []
+        keywords_hash = keywords_fingerprint(keywords)
+        states = await load_fetch_states(db, sources)
 
-        tasks = [fetch_page(url) for url in urls]
+        tasks = [
+            scrape_source(db, source, states.get(source.id), keywords, keywords_hash, country.name)
+            for source in sources
+        ]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
-        for i, result in enumerate(results):
-            url = urls[i]
+        merged, seen_links = [], set()
+        for source, result in zip(sources, results):
             if isinstance(result, Exception):
-                logging.error(f"[{country.name}] {url} failed: {result}")
+                logging.error(f"[{country.name}] {source.url} failed: {result}")
                 continue
-
-            html, error_reason, _, _ = result
-            if error_reason:
-                logging.error(f"[{country.name}] ERROR from {url}: {error_reason}")
+            # 🔹 the same story linked from several sources (or via its AMP / tracking variants) is kept once
+            for article in result["articles"]:
+                key = canonical_url(article["link"])
+                if key not in seen_links:
+                    seen_links.add(key)
+                    merged.append(article)
+
+        # 🔹 Near-duplicates (one wire story on several sources) collapse to one item before
+        #    enrichment, so each story costs one og:image / <head> lookup
+        all_articles = cluster_articles(merged)
+        if len(all_articles) < len(merged):
+            logging.info(f"[{country.name}] {len(merged)} articles → {len(all_articles)} after near-duplicate clustering")
+        all_articles = await enrich_articles(db, all_articles, lookback_cutoff())
+        for article in all_articles:
+            apply_renditions(article)   # CDN-sized thumbnail per output (CTV / web)
+        await thumbnail_store.apply_all(all_articles)
+
+        # 🔹 Each source keeps its own matches (clustering is redone from them on a 304)
+        for source, result in zip(sources, results):
+            if isinstance(result, Exception) or result["state"] is None:
                 continue
-
-            if html:
-                try:
-                    articles = await scrape_articles(url, html, keywords, country.name)
-                    all_articles.extend(articles)
-                except Exception as e:
-                    logging.error(f"[{country.name}] scrape_articles failed for {url}: {e}")
+            etag, last_modified, extra = result["state"]
+            own = [{k: v for k, v in a.items() if k not in ("alternates", THUMB_ORIGIN)} for a in result["articles"]]
+            try:
+                await save_fetch_state(db, source.id, etag, last_modified, keywords_hash, own, **extra)
+            except Exception as e:
+                logging.error(f"[{country.name}] saving fetch state failed for {source.url}: {e}")
 
         status = "success" if all_articles else "empty"
         rss_json = {
@@ -309,17 +522,20 @@ async def scrape_country(db: Prisma, country, sources_by_country, keywords_by_co
 # Main Runner
 # ----------------------------
 async def main():
+    parse_pool.start()   # 🔹 fork the parse workers before any thread (DB engine, HTTP, resolver) exists
     db = Prisma()
     try:
         await db.connect()
+        await safe_db_call(domain_health.load, db)
 
         countries = await safe_db_call(db.country.find_many)
         sources = await safe_db_call(db.newssource.find_many)
         keywords = await safe_db_call(db.keyword.find_many)
+        await safe_db_call(url_model.load, db, [urlparse(s.url).netloc for s in sources])
 
         sources_by_country = {}
         for s in sources:
-            sources_by_country.setdefault(s.countryId, []).append(s.url)
+            sources_by_country.setdefault(s.countryId, []).append(s)
 
         keywords_by_country = {}
         for k in keywords:
@@ -335,10 +551,30 @@ async def main():
 
         total = sum(r for r in results if isinstance(r, int))
         logging.info(f"SUMMARY: Total {total} articles saved across {len(countries)} countries")
+        logging.info(f"Run cache: {run_cache.summary()}")
+        logging.info("Thumbnails: " + ", ".join(f"{step}={thumbnail_stats[step]}" for step in ("listing", "feed", "sitemap", "details", "reused", "meta_cache", "head_fetch", "none")))
 
     finally:
+        try:
+            await safe_db_call(domain_health.save, db)
+        except Exception as e:
+            logging.error(f"Saving domain health failed: {e}")
+        try:
+            await safe_db_call(meta_cache.save, db)
+            await safe_db_call(meta_cache.prune, db)
+        except Exception as e:
+            logging.error(f"Saving article metadata cache failed: {e}")
+        try:
+            await safe_db_call(seen_index.save, db)
+            await safe_db_call(seen_index.prune, db)
+            await safe_db_call(url_model.save, db)
+            await safe_db_call(url_model.prune, db)
+        except Exception as e:
+            logging.error(f"Saving seen articles / URL patterns failed: {e}")
         await db.disconnect()
-        await client.aclose()
+        await scheduler.aclose()
+        await thumbnail_store.aclose()
+        parse_pool.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -2,17 +2,28 @@ import sys
 import json
 import asyncio
 import logging
-import random
 from datetime import datetime
-from collections import defaultdict
 from urllib.parse import urljoin, urlparse
 
-import httpx
-from bs4 import BeautifulSoup
 from prisma import Prisma
 from tqdm.asyncio import tqdm_asyncio
 from tqdm import tqdm
 
+from fetch_scheduler import FetchScheduler
+from html_parsing import make_soup
+from anchor_context import boilerplate_mask
+from keyword_matcher import get_matcher
+from image_cdn import apply_renditions
+from challenge_fetch import ChallengeFetcher
+from domain_health import DomainHealthRegistry, DomainOpenError
+from seen_articles import SeenArticleIndex
+from url_classifier import UrlPatternModel
+from article_details import load_details, details_article, details_published, link_score, MIN_DETAILS_SCORE, MAX_DETAILS_PER_PAGE
+from details_queue import DetailsQueue, DetailsBatch
+from run_cache import RunCache
+from url_utils import canonical_url, resolve_link
+from pub_dates import url_date, is_stale, lookback_cutoff
+
 # ----------------------------
 # User Agents
 # ----------------------------
@@ -53,25 +64,35 @@ logging.basicConfig(
 # Concurrency
 # ----------------------------
 MAX_COUNTRY_CONCURRENCY = 5
-MAX_URL_CONCURRENCY = 100  # raised for speed
+MAX_URL_CONCURRENCY = 100  # global in-flight HTTP requests
+MAX_HOST_CONCURRENCY = 4   # in-flight HTTP requests per host
+HOST_RATE = 2.0            # requests per second per host
 
 country_semaphore = asyncio.Semaphore(MAX_COUNTRY_CONCURRENCY)
-url_semaphore = asyncio.Semaphore(MAX_URL_CONCURRENCY)
 
 # ----------------------------
-# HTTP Client with Pool Limits
+# HTTP Scheduler (per-host pacing, persisted circuit breaker, cached Cloudflare sessions)
 # ----------------------------
-client = httpx.AsyncClient(
-    timeout=httpx.Timeout(6.0),  # ⏳ faster fail
-    follow_redirects=True,
-    headers={"User-Agent": random.choice(USER_AGENTS)},
-    limits=httpx.Limits(
-        max_connections=300,
-        max_keepalive_connections=100,
-        keepalive_expiry=30.0,
-    ),
+domain_health = DomainHealthRegistry()
+scheduler = FetchScheduler(
+    user_agents=USER_AGENTS,
+    max_in_flight=MAX_URL_CONCURRENCY,
+    max_per_host=MAX_HOST_CONCURRENCY,
+    host_rate=HOST_RATE,
+    timeout=6.0,  # ⏳ faster fail
+    health=domain_health,
+    challenge=ChallengeFetcher(),  # only used for domains known to need it
 )
 
+# ----------------------------
+# Seen articles (cross-run) + run cache (same link from several countries in one run)
+# + URL shapes learned per domain (navigation links rejected before any fetch)
+# ----------------------------
+seen_index = SeenArticleIndex()
+run_cache = RunCache()
+url_model = UrlPatternModel()
+details_queue = DetailsQueue()   # bounded, prioritized details fetches for all countries
+
 # ----------------------------
 # Retry Wrapper
 # ----------------------------
@@ -79,41 +100,19 @@ async def fetch_with_retry(url, retries=1):
     """Simple wrapper for GET with 1 retry"""
     for attempt in range(retries + 1):
         try:
-            return await client.get(url)
+            return await scheduler.get(url)
+        except DomainOpenError:
+            return None
         except Exception as e:
             if attempt == retries:
                 logging.error(f"[FAILED] {url} → {e}")
                 return None
             await asyncio.sleep(1)
 
-# ----------------------------
-# Clean Image URLs
-# ----------------------------
-def clean_image_url(img_url: str) -> str:
-    if not img_url:
-        return ""
-    try:
-        parsed = urlparse(img_url)
-        path_parts = parsed.path.split("/")
-        if "upload" in path_parts:
-            idx = path_parts.index("upload")
-            after_upload = path_parts[idx + 1 :]
-            if len(after_upload) >= 2:
-                image_id = after_upload[-1]
-                width_transform = None
-                for part in after_upload[:-1]:
-                    if part.startswith("w_"):
-                        width_transform = part
-                if width_transform:
-                    return f"{parsed.scheme}://{parsed.netloc}/image/upload/{width_transform}/{image_id}"
-        return img_url
-    except Exception:
-        return img_url
-
 # ----------------------------
 # Skip Menu & Social Links
 # ----------------------------
-def should_skip_link(link: str, tag=None) -> bool:
+def should_skip_link(link: str, tag=None, boilerplate: set = frozenset()) -> bool:
     skip_patterns = [
         "about", "contact", "privacy", "terms", "advertise", "sitemap", "category",
         "facebook.com", "twitter.com", "instagram.com", "youtube.com", "linkedin.com",
@@ -128,111 +127,51 @@ def should_skip_link(link: str, tag=None) -> bool:
     if len(link.split("/")) <= 3:
         return True
 
-    if tag:
-        # 3. Look at the tag itself
-        parent_classes = " ".join(tag.get("class", [])).lower()
-        parent_id = (tag.get("id") or "").lower()
-
-        block_keywords = ["nav", "menu", "header", "footer", "sidebar", "widget", "trending", "related"]
-        if any(x in parent_classes for x in block_keywords):
-            return True
-        if any(x in parent_id for x in block_keywords):
-            return True
-
-        # 4. Walk up the DOM tree → skip if inside nav/footer/sidebar/etc.
-        for parent in tag.parents:
-            if not getattr(parent, "get", None):
-                continue
-            classes = " ".join(parent.get("class", [])).lower()
-            pid = (parent.get("id") or "").lower()
-            if any(x in classes for x in block_keywords):
-                return True
-            if any(x in pid for x in block_keywords):
-                return True
+    # 3. Inside nav/footer/sidebar/etc. (mask precomputed once per page by boilerplate_mask)
+    if tag is not None and id(tag) in boilerplate:
+        return True
 
     return False
 
 
-# ----------------------------
-# Domain Failure Tracker
-# ----------------------------
-domain_failures = defaultdict(int)
-FAIL_THRESHOLD = 1  # stop after 3 failures
-
-def is_domain_blocked(domain: str) -> bool:
-    return domain_failures[domain] >= FAIL_THRESHOLD
-
 # ----------------------------
 # Scrape Details Page
 # ----------------------------
 async def scrape_details_page(article_url: str, keywords: list[str], favicon_url: str, parsed_domain: str, country_name: str) -> dict:
-    domain = urlparse(article_url).netloc
+    try:
+        domain = urlparse(article_url).netloc
+        if article_url not in seen_index and domain_health.is_open(domain):
+            logging.warning(f"[{country_name}][{domain}] Circuit open → skipping {article_url}")
+            return {}
 
-    if is_domain_blocked(domain):
-        logging.warning(f"[{country_name}][{domain}] Blocked → skipping {article_url}")
-        return {}
+        details = await run_cache.get(
+            ("details", canonical_url(article_url)), load_details, article_url, fetch_with_retry, seen_index, url_model
+        )
+        if not details:
+            return {}
 
-    async with url_semaphore:
-        try:
-            r = await fetch_with_retry(article_url)
-            if not r or r.status_code != 200:
-                domain_failures[domain] += 1
-                if is_domain_blocked(domain):
-                    logging.error(f"[{country_name}][{domain}] Blocked after {FAIL_THRESHOLD} failures")
-                return {}
-
-            soup = BeautifulSoup(r.text, "html.parser")
-
-            title_tag = soup.find("title")
-            title = title_tag.get_text(strip=True) if title_tag else ""
-            paragraphs = [p.get_text(strip=True) for p in soup.find_all("p") if p.get_text(strip=True)]
-            content_text = " ".join(paragraphs)
-
-            full_context = f"{title} {content_text}".lower()
-            if not any(word.lower() in full_context for word in keywords):
-                return {}
-
-            img_url = ""
-            og_img = soup.find("meta", property="og:image")
-            if og_img and og_img.get("content"):
-                img_url = clean_image_url(urljoin(article_url, og_img["content"].strip()))
-
-            author, pub_date = "", ""
-            author_tag = soup.find("meta", attrs={"name": "author"})
-            if author_tag and author_tag.get("content"):
-                author = author_tag["content"]
-            pub_tag = soup.find("meta", property="article:published_time")
-            if pub_tag and pub_tag.get("content"):
-                pub_date = pub_tag["content"]
-
-            pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
-
-            return {
-                "title": title,
-                "description": content_text[:500],
-                "link": article_url,
-                "guid": {"isPermaLink": True, "value": article_url},
-                "dc:creator": parsed_domain,
-                "pubDate": pub_time,
-                "thumbnails": favicon_url,
-                "thumbnail_url": img_url,
-                "content_text": content_text[:2000],
-                "author": author,
-                "published_time": pub_date,
-            }
-        except Exception as e:
-            domain_failures[domain] += 1
-            logging.error(f"[{country_name}] [DETAILS FAILED] {article_url} → {e} (fail {domain_failures[domain]}/{FAIL_THRESHOLD})")
-            if is_domain_blocked(domain):
-                logging.error(f"[{country_name}][{domain}] Blocked after {FAIL_THRESHOLD} failures")
+        # 🔹 real publication time (page metadata, else URL date); stale articles are dropped
+        published = details_published(details, article_url)
+        if is_stale(published, lookback_cutoff()):
             return {}
 
+        full_context = f"{details['title']} {details['content_text']}".lower()
+        if not get_matcher(keywords, whole_word=False).search(full_context):
+            return {}
+
+        article = details_article(details, article_url, parsed_domain, favicon_url, published)
+        return apply_renditions(article)   # CDN-sized thumbnail per output (CTV / web)
+    except Exception as e:
+        logging.error(f"[{country_name}] [DETAILS FAILED] {article_url} → {e}")
+        return {}
+
 # ----------------------------
-# Scrape Articles (Homepage → Details)
+# Queue Articles (Homepage → scored details jobs on the country's batch)
 # ----------------------------
-async def scrape_articles(url: str, html: str, keywords: list[str], country_name: str):
-    articles, seen_links = [], set()
-    soup = BeautifulSoup(html, "html.parser")
+async def scrape_articles(db: Prisma, url: str, html: str, keywords: list[str], country_name: str, batch: DetailsBatch) -> int:
+    """Queue a homepage's most promising links on the country's details batch; returns how many were queued."""
+    seen_links = set()
+    soup = make_soup(html)
 
     favicon_url = ""
     icon_link = soup.find("link", rel=lambda v: v and "icon" in v.lower())
@@ -241,31 +180,39 @@ async def scrape_articles(url: str, html: str, keywords: list[str], country_name
 
     parsed_domain = urlparse(url).netloc
 
-    links = []
+    boilerplate = boilerplate_mask(soup)
+    await url_model.load(db, [parsed_domain])
+
+    anchors = []
     for a in soup.find_all("a", href=True):
-        link = a["href"]
-        if not link.startswith("http"):
-            link = url.rstrip("/") + "/" + link.lstrip("/")
-        if link not in seen_links and not should_skip_link(link, a):
-            seen_links.add(link)
-            links.append(link)
-
-    # 🔹 Skip blocked domains
-    filtered_links = [l for l in links if not is_domain_blocked(urlparse(l).netloc)]
-
-    with tqdm(total=len(filtered_links), desc=f"{country_name} details", leave=False) as pbar:
-        detail_tasks = [scrape_details_page(link, keywords, favicon_url, parsed_domain, country_name) for link in filtered_links]
-        for coro in asyncio.as_completed(detail_tasks):
-            try:
-                result = await coro
-                if isinstance(result, dict) and result:
-                    articles.append(result)
-            except Exception as e:
-                logging.error(f"[{country_name}] detail scrape error: {e}")
-            finally:
-                pbar.update(1)
-
-    return articles
+        link = resolve_link(url, a["href"])
+        # 🔹 URL shapes that were never articles on this domain are dropped before anything else
+        if link and canonical_url(link) not in seen_links and not url_model.is_nav(link) and not should_skip_link(link, a, boilerplate):
+            seen_links.add(canonical_url(link))
+            anchors.append((link, a.get_text(" ", strip=True)))
+
+    # 🔹 Links whose URL dates them before the lookback window are never fetched
+    since = lookback_cutoff()
+    anchors = [(link, text) for link, text in anchors if not is_stale(url_date(link), since)]
+
+    # 🔹 Links fetched in an earlier run are re-matched from the seen index, not re-fetched
+    await seen_index.load(db, [link for link, _ in anchors])
+
+    # 🔹 Score by URL shape, anchor text and position; skip domains whose circuit breaker is open
+    #    (unless the link is already in the index) and queue only the best MAX_DETAILS_PER_PAGE
+    matcher = get_matcher(keywords, whole_word=False)
+    scored = []
+    for position, (link, text) in enumerate(anchors):
+        if link not in seen_index and domain_health.is_open(urlparse(link).netloc):
+            continue
+        score = link_score(url_model, link, text, position, len(anchors), bool(matcher.search(text.lower())))
+        if score >= MIN_DETAILS_SCORE:
+            scored.append((score, link))
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+
+    for score, link in scored[:MAX_DETAILS_PER_PAGE]:
+        await batch.submit(score, scrape_details_page, link, keywords, favicon_url, parsed_domain, country_name)
+    return min(len(scored), MAX_DETAILS_PER_PAGE)
 
 # ----------------------------
 # Scrape Country
@@ -277,17 +224,23 @@ async def scrape_country(db: Prisma, country, sources_by_country, keywords_by_co
         if not urls or not keywords:
             return 0
 
-        all_articles = []
-        tasks = [client.get(url) for url in urls]
+        tasks = [scheduler.get(url) for url in urls]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
+        # 🔹 One batch per country on the shared queue: stops at DETAILS_TARGET_ITEMS items
+        batch = details_queue.batch(name=country.name)
+        queued = 0
         for i, result in enumerate(results):
             url = urls[i]
             if isinstance(result, Exception) or not result or result.status_code != 200:
                 logging.error(f"[{country.name}] {url} failed")
                 continue
-            articles = await scrape_articles(url, result.text, keywords, country.name)
-            all_articles.extend(articles)
+            if batch.closed:
+                break
+            queued += await scrape_articles(db, url, result.text, keywords, country.name, batch)
+
+        all_articles = await batch.results()
+        logging.info(f"[{country.name}] details: {queued} links queued, {len(all_articles)} items")
 
         status = "success" if all_articles else "empty"
         rss_json = {
@@ -325,36 +278,45 @@ async def scrape_country(db: Prisma, country, sources_by_country, keywords_by_co
 async def main():
     db = Prisma()
     await db.connect()
-
-    countries = await db.country.find_many()
-    sources = await db.newssource.find_many()
-    keywords = await db.keyword.find_many()
-
-    sources_by_country, keywords_by_country = {}, {}
-    for s in sources:
-        sources_by_country.setdefault(s.countryId, []).append(s.url)
-    for k in keywords:
-        parts = [kw.strip() for kw in k.keyword.split(",") if kw.strip()]
-        keywords_by_country.setdefault(k.countryId, []).extend(parts)
-
-    results = []
-    # 🔹 Add country-level progress bar
-    with tqdm(total=len(countries), desc="Scraping countries") as country_bar:
-        tasks = [scrape_country(db, country, sources_by_country, keywords_by_country) for country in countries]
-        for coro in asyncio.as_completed(tasks):
-            try:
-                result = await coro
-                results.append(result)
-            except Exception as e:
-                logging.error(f"Country scrape error: {e}")
-            finally:
-                country_bar.update(1)
-
-    total = sum(r for r in results if isinstance(r, int))
-    logging.info(f"SUMMARY: Total {total} articles saved across {len(countries)} countries")
-
-    await db.disconnect()
-    await client.aclose()
+    try:
+        await domain_health.load(db)
+
+        countries = await db.country.find_many()
+        sources = await db.newssource.find_many()
+        keywords = await db.keyword.find_many()
+
+        sources_by_country, keywords_by_country = {}, {}
+        for s in sources:
+            sources_by_country.setdefault(s.countryId, []).append(s.url)
+        for k in keywords:
+            parts = [kw.strip() for kw in k.keyword.split(",") if kw.strip()]
+            keywords_by_country.setdefault(k.countryId, []).extend(parts)
+
+        results = []
+        # 🔹 Add country-level progress bar
+        with tqdm(total=len(countries), desc="Scraping countries") as country_bar:
+            tasks = [scrape_country(db, country, sources_by_country, keywords_by_country) for country in countries]
+            for coro in asyncio.as_completed(tasks):
+                try:
+                    result = await coro
+                    results.append(result)
+                except Exception as e:
+                    logging.error(f"Country scrape error: {e}")
+                finally:
+                    country_bar.update(1)
+
+        total = sum(r for r in results if isinstance(r, int))
+        logging.info(f"SUMMARY: Total {total} articles saved across {len(countries)} countries")
+    finally:
+        # 🔹 stop the details workers first: nothing may still record into the caches being saved
+        await details_queue.close()
+        await domain_health.save(db)
+        await seen_index.save(db)
+        await seen_index.prune(db)
+        await url_model.save(db)
+        await url_model.prune(db)
+        await db.disconnect()
+        await scheduler.aclose()
 
 
 if __name__ == "__main__":
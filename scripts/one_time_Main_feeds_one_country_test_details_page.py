@@ -3,181 +3,21 @@ import json
 import asyncio
 import logging
 import traceback
-import random
 from datetime import datetime
 
-import httpx
 from bs4 import BeautifulSoup
 from prisma import Prisma
 from tqdm.asyncio import tqdm_asyncio
 from urllib.parse import urljoin, urlparse
 
-# ----------------------------
-# User Agents
-# ----------------------------
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/117.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-    "AppleWebKit/605.1.15 (KHTML, like Gecko) "
-    "Chrome/116.0 Safari/605.1.15",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:116.0) "
-    "Gecko/20100101 Firefox/116.0",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/117.0 Safari/537.36 Edg/117.0",
-    "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) "
-    "AppleWebKit/605.1.15 (KHTML, like Gecko) "
-    "Version/16.0 Mobile/15E148 Safari/604.1",
-    "Mozilla/5.0 (Linux; Android 13; Pixel 6 Pro) "
-    "AppleWebKit/537.36 (KHTML, like Gecko) "
-    "Chrome/117.0 Mobile Safari/537.36",
-]
-
-# ----------------------------
-# Logging
-# ----------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-#   handlers=[logging.FileHandler("scraper.log"), logging.StreamHandler(sys.stdout)],
-    handlers=[
-        logging.FileHandler("scraper.log", mode="w", encoding="utf-8"),  # 🔹 overwrite each run
-        logging.StreamHandler(sys.stdout),
-    ],
-)
-
-# ----------------------------
-# Concurrency
-# ----------------------------
-MAX_COUNTRY_CONCURRENCY = 5
-MAX_URL_CONCURRENCY = 20
-
-country_semaphore = asyncio.Semaphore(MAX_COUNTRY_CONCURRENCY)
-url_semaphore = asyncio.Semaphore(MAX_URL_CONCURRENCY)
-
-# ----------------------------
-# HTTP Client
-# ----------------------------
-client = httpx.AsyncClient(
-    timeout=8, follow_redirects=True, headers={"User-Agent": random.choice(USER_AGENTS)}
-)
-
-
-# ----------------------------
-# Fetch Page
-# ----------------------------
-async def fetch_page(url: str, saved_etag: str = None, saved_lastmod: str = None):
-    headers = {}
-    if saved_etag:
-        headers["If-None-Match"] = saved_etag
-    if saved_lastmod:
-        headers["If-Modified-Since"] = saved_lastmod
-
-    try:
-        r = await client.get(url, headers=headers)
-        if r.status_code == 304:
-            logging.info(f"[SKIP] {url} → Not Modified (304)")
-            return None, "not_modified", None, None
-        if r.status_code != 200:
-            logging.error(f"[HTTP ERROR] {url} → {r.status_code} {r.reason_phrase}")
-        r.raise_for_status()
-        return r.text, None, r.headers.get("ETag"), r.headers.get("Last-Modified")
-    except Exception as e:
-        logging.error(f"[REQUEST FAILED] {url} → {e}")
-        return None, str(e), None, None
-
-
-# ----------------------------
-# Scrape Articles
-# ----------------------------
-
-# def scrape_articles(url: str, html: str, keywords: list[str], country_name: str):
-#     articles = []
-#     seen_links = set()   # track duplicates
-#     soup = BeautifulSoup(html, "html.parser")
-
-#     # 🔹 Find site favicon/logo once per page
-#     favicon_url = ''
-#     icon_link = soup.find("link", rel=lambda v: v and "icon" in v.lower())
-#     if icon_link and icon_link.has_attr("href"):
-#         favicon_url = urljoin(url, icon_link["href"])
-
-#     parsed_domain = urlparse(url).netloc  # extract domain (e.g., "www.thehindu.com")    
-
-#     for a in soup.find_all("a", href=True):
-#         title = a.get_text(strip=True)
-#         link = a["href"]
-
-#         if not title or len(title.split()) <= 3:
-#             continue
-#         if not link.startswith("http"):
-#             link = url.rstrip("/") + "/" + link.lstrip("/")
-
-#         # skip duplicates
-#         if link in seen_links:
-#             continue
-#         seen_links.add(link)    
-
-#         # --- Collect context ---
-#         context_parts = [title]
-#         thumbnail_url = ''  # initialize empty for per-article image
-
-#         parent = a.find_parent()
-#         if parent:
-#             # Add surrounding <p> texts
-#             for p in parent.find_all("p", limit=3):
-#                 text = p.get_text(strip=True)
-#                 if text:
-#                     context_parts.append(text)
-
-#             # Add image alt text + pick article image
-#             img = parent.find("img")
-#             if img:
-#                 if img.has_attr("alt") and img["alt"].strip():
-#                     context_parts.append(img["alt"].strip())
-#                 if img.has_attr("src") and img["src"].strip():
-#                     thumbnail_url = urljoin(url, img["src"].strip())
-
-#         # Combine context
-#         full_context = " ".join(context_parts).lower()
-
-#         # --- Match keywords against title OR surrounding context ---
-#         if not any(word.lower() in full_context for word in keywords):
-#             continue
-
-#         pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
-
-#         articles.append(
-#             {
-#                 "title": title,
-#                 "description": " ".join(context_parts)[:500],  # context used as description
-#                 "link": link,
-#                 "guid": {"isPermaLink": True, "value": link},
-#                 "dc:creator": parsed_domain,
-#                 "pubDate": pub_time,
-#                 "thumbnails": favicon_url, 
-#                 "thumbnail_url": thumbnail_url,
-#             }
-#         )
-
-#     return articles
-
-import sys
-import json
-import asyncio
-import logging
-import traceback
-import random
-from datetime import datetime
-
-import httpx
-from bs4 import BeautifulSoup
-from prisma import Prisma
-from tqdm.asyncio import tqdm_asyncio
-from urllib.parse import urljoin, urlparse
+from seen_articles import SeenArticleIndex
+from pub_dates import url_date, format_pubdate, is_stale, lookback_cutoff
+from article_details import extract_details, details_published
+from fetch_scheduler import FetchScheduler
+from domain_health import DomainHealthRegistry
+from challenge_fetch import ChallengeFetcher
+from url_utils import canonical_url, prefer_canonical, resolve_link
+from url_classifier import UrlPatternModel, looks_like_article
 
 # ----------------------------
 # User Agents
@@ -221,15 +61,23 @@ logging.basicConfig(
 # ----------------------------
 MAX_COUNTRY_CONCURRENCY = 5
 MAX_URL_CONCURRENCY = 20
+MAX_HOST_CONCURRENCY = 4   # in-flight HTTP requests per host
+HOST_RATE = 2.0            # requests per second per host
 
 country_semaphore = asyncio.Semaphore(MAX_COUNTRY_CONCURRENCY)
-url_semaphore = asyncio.Semaphore(MAX_URL_CONCURRENCY)
 
 # ----------------------------
-# HTTP Client
+# HTTP Scheduler (per-host pacing, circuit breaker for this run only, cached Cloudflare sessions)
 # ----------------------------
-client = httpx.AsyncClient(
-    timeout=8, follow_redirects=True, headers={"User-Agent": random.choice(USER_AGENTS)}
+domain_health = DomainHealthRegistry()
+scheduler = FetchScheduler(
+    user_agents=USER_AGENTS,
+    max_in_flight=MAX_URL_CONCURRENCY,
+    max_per_host=MAX_HOST_CONCURRENCY,
+    host_rate=HOST_RATE,
+    timeout=8,
+    health=domain_health,
+    challenge=ChallengeFetcher(),  # only used for domains known to need it
 )
 
 
@@ -244,7 +92,7 @@ async def fetch_page(url: str, saved_etag: str = None, saved_lastmod: str = None
         headers["If-Modified-Since"] = saved_lastmod
 
     try:
-        r = await client.get(url, headers=headers)
+        r = await scheduler.get(url, headers=headers)
         if r.status_code == 304:
             logging.info(f"[SKIP] {url} → Not Modified (304)")
             return None, "not_modified", None, None
@@ -369,65 +217,56 @@ def clean_image_url(img_url: str) -> str:
     except Exception:
         return img_url
 
+# ----------------------------
+# Seen articles (cross-run index: only new links are fetched) + URL shapes learned per domain
+# ----------------------------
+seen_index = SeenArticleIndex()
+url_model = UrlPatternModel()
+
 # ----------------------------
 # Scrape Article Details (details page)
 # ----------------------------
 async def scrape_details_page(article_url: str, keywords: list[str], favicon_url: str, parsed_domain: str) -> dict:
     """
-    Visit an article details page, check keywords, and extract main content, image, author, etc.
+    Check keywords against an article details page and build its feed item.
+    The page is only fetched if it is not in the seen index yet.
     """
     try:
-        r = await client.get(article_url, timeout=10)
-        if r.status_code != 200:
+        seen, details = seen_index.get(article_url)
+        if not seen:
+            r = await scheduler.get(article_url, timeout=10)
+            details = extract_details(article_url, r.text) if r.status_code == 200 else None
+            seen_index.put(article_url, details)
+            if details is not None:
+                url_model.learn(article_url, looks_like_article(details))
+        if not details:
             return {}
 
-        soup = BeautifulSoup(r.text, "html.parser")
-
-        # Title
-        title_tag = soup.find("title")
-        title = title_tag.get_text(strip=True) if title_tag else ""
-
-        # Main content
-        paragraphs = [p.get_text(strip=True) for p in soup.find_all("p") if p.get_text(strip=True)]
-        content_text = " ".join(paragraphs)
+        # 🔹 real publication time (page metadata, else URL date); stale articles are dropped
+        published = details_published(details, article_url)
+        if is_stale(published, lookback_cutoff()):
+            return {}
 
         # Full context for keyword matching
-        full_context = f"{title} {content_text}".lower()
+        full_context = f"{details['title']} {details['content_text']}".lower()
         if not any(word.lower() in full_context for word in keywords):
             return {}  # 🔹 skip if no keyword match
 
-        # og:image
-        img_url = ""
-        og_img = soup.find("meta", property="og:image")
-        if og_img and og_img.get("content"):
-            img_url = clean_image_url(urljoin(article_url, og_img["content"].strip()))
-
-        # Author
-        author = ""
-        author_tag = soup.find("meta", attrs={"name": "author"})
-        if author_tag and author_tag.get("content"):
-            author = author_tag["content"]
-
-        # Published date
-        pub_date = ""
-        pub_tag = soup.find("meta", property="article:published_time")
-        if pub_tag and pub_tag.get("content"):
-            pub_date = pub_tag["content"]
-
-        pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
+        content_text = details["content_text"]
+        link = prefer_canonical(article_url, details.get("canonical"))   # 🔹 rows stored before canonicals have none
 
         return {
-            "title": title,
+            "title": details["title"],
             "description": content_text[:500],
-            "link": article_url,
-            "guid": {"isPermaLink": True, "value": article_url},
+            "link": link,
+            "guid": {"isPermaLink": True, "value": canonical_url(link)},
             "dc:creator": parsed_domain,
-            "pubDate": pub_time,
+            "pubDate": format_pubdate(published),
             "thumbnails": favicon_url,
-            "thumbnail_url": img_url,
+            "thumbnail_url": clean_image_url(details["thumbnail_url"]),
             "content_text": content_text[:2000],
-            "author": author,
-            "published_time": pub_date,
+            "author": details["author"],
+            "published_time": details["published_time"],
         }
 
     except Exception as e:
@@ -438,7 +277,7 @@ async def scrape_details_page(article_url: str, keywords: list[str], favicon_url
 async def get_og_image(article_url: str) -> str:
     """Fetch og:image from an article page (if available)."""
     try:
-        r = await client.get(article_url, timeout=8)
+        r = await scheduler.get(article_url, timeout=8)
         if r.status_code == 200:
             soup = BeautifulSoup(r.text, "html.parser")
             og_tag = soup.find("meta", property="og:image")
@@ -450,7 +289,7 @@ async def get_og_image(article_url: str) -> str:
     return ""
 
 
-async def scrape_articles(url: str, html: str, keywords: list[str], country_name: str):
+async def scrape_articles(db: Prisma, url: str, html: str, keywords: list[str], country_name: str):
     articles = []
     seen_links = set()
     soup = BeautifulSoup(html, "html.parser")
@@ -461,16 +300,23 @@ async def scrape_articles(url: str, html: str, keywords: list[str], country_name
         favicon_url = urljoin(url, icon_link["href"])
 
     parsed_domain = urlparse(url).netloc
+    await url_model.load(db, [parsed_domain])
 
     links = []
     for a in soup.find_all("a", href=True):
-        link = a["href"]
-        if not link.startswith("http"):
-            link = url.rstrip("/") + "/" + link.lstrip("/")
-        if link not in seen_links:
-            seen_links.add(link)
+        link = resolve_link(url, a["href"])
+        # 🔹 URL shapes that were never articles on this domain are dropped before any fetch
+        if link and canonical_url(link) not in seen_links and not url_model.is_nav(link):
+            seen_links.add(canonical_url(link))
             links.append(link)
 
+    # 🔹 Links whose URL dates them before the lookback window are never fetched
+    since = lookback_cutoff()
+    links = [link for link in links if not is_stale(url_date(link), since)]
+
+    # 🔹 Links fetched in an earlier run are re-matched from the seen index
+    await seen_index.load(db, links)
+
     # 🔹 Fetch details pages concurrently
     detail_tasks = [scrape_details_page(link, keywords, favicon_url, parsed_domain) for link in links]
     detail_results = await asyncio.gather(*detail_tasks, return_exceptions=True)
@@ -588,7 +434,7 @@ async def scrape_country(db: Prisma, country, sources_by_country, keywords_by_co
 
             html, error_reason, _, _ = result
             if html:
-                articles = await scrape_articles(url, html, keywords, country.name)
+                articles = await scrape_articles(db, url, html, keywords, country.name)
                 all_articles.extend(articles)
 
         # build one combined feed JSON
@@ -645,7 +491,7 @@ async def main():
     if not countries:
         logging.warning("No country found with name Afghanistan")
         await db.disconnect()
-        await client.aclose()
+        await scheduler.aclose()
         return
 
     sources = await db.newssource.find_many()
@@ -670,8 +516,12 @@ async def main():
     total = sum(r for r in results if isinstance(r, int))
     logging.info(f"SUMMARY: Total {total} articles saved for Afghanistan")
 
+    await seen_index.save(db)
+    await seen_index.prune(db)
+    await url_model.save(db)
+    await url_model.prune(db)
     await db.disconnect()
-    await client.aclose()
+    await scheduler.aclose()
 
 
 if __name__ == "__main__":
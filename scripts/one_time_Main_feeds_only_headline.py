@@ -2,15 +2,21 @@ import sys
 import json
 import asyncio
 import logging
-import random
 from datetime import datetime
 
-import httpx
 from bs4 import BeautifulSoup
 from prisma import Prisma
 from tqdm.asyncio import tqdm_asyncio
 from urllib.parse import urljoin, urlparse
 
+from article_meta import ArticleMetaCache
+from head_meta import parse_head_meta
+from pub_dates import listing_published, format_pubdate, is_stale, lookback_cutoff
+from fetch_scheduler import FetchScheduler
+from domain_health import DomainHealthRegistry, DomainOpenError
+from challenge_fetch import ChallengeFetcher
+from url_utils import canonical_url, resolve_link
+
 # ----------------------------
 # User Agents
 # ----------------------------
@@ -52,29 +58,29 @@ logging.basicConfig(
 # ----------------------------
 MAX_COUNTRY_CONCURRENCY = 5
 MAX_URL_CONCURRENCY = 20
+MAX_HOST_CONCURRENCY = 4   # in-flight HTTP requests per host
+HOST_RATE = 2.0            # requests per second per host
 
 country_semaphore = asyncio.Semaphore(MAX_COUNTRY_CONCURRENCY)
-url_semaphore = asyncio.Semaphore(MAX_URL_CONCURRENCY)
 
 # ----------------------------
-# HTTP Client
+# Article metadata cache (og:image per article URL, persisted across runs)
 # ----------------------------
-client = httpx.AsyncClient(
-    timeout=8, follow_redirects=True, headers={"User-Agent": random.choice(USER_AGENTS)}
-)
+meta_cache = ArticleMetaCache()
 
 # ----------------------------
-# Retry wrapper
+# HTTP Scheduler (per-host pacing, persisted circuit breaker, cached Cloudflare sessions)
 # ----------------------------
-async def with_retries(coro_func, *args, retries=3, **kwargs):
-    for attempt in range(1, retries + 1):
-        try:
-            return await coro_func(*args, **kwargs)
-        except Exception as e:
-            if attempt == retries:
-                logging.error(f"Failed after {retries} retries: {e}")
-                return None
-            await asyncio.sleep(1 * attempt)  # exponential-ish backoff
+domain_health = DomainHealthRegistry()
+scheduler = FetchScheduler(
+    user_agents=USER_AGENTS,
+    max_in_flight=MAX_URL_CONCURRENCY,
+    max_per_host=MAX_HOST_CONCURRENCY,
+    host_rate=HOST_RATE,
+    timeout=8,
+    health=domain_health,
+    challenge=ChallengeFetcher(),  # only used for domains known to need it
+)
 
 # ----------------------------
 # Image cleaner
@@ -117,7 +123,7 @@ async def fetch_page(url: str, saved_etag: str = None, saved_lastmod: str = None
         headers["If-Modified-Since"] = saved_lastmod
 
     try:
-        r = await client.get(url, headers=headers)
+        r = await scheduler.get(url, headers=headers)
         if r.status_code == 304:
             logging.info(f"[SKIP] {url} → Not Modified (304)")
             return None, "not_modified", None, None
@@ -133,22 +139,30 @@ async def fetch_page(url: str, saved_etag: str = None, saved_lastmod: str = None
 # OG Image
 # ----------------------------
 async def get_og_image(article_url: str) -> str:
+    # 🔹 Cached (incl. dead pages) → no network call
+    hit, meta = meta_cache.get(article_url)
+    if hit:
+        return clean_image_url(meta["og_image"]) if meta and meta.get("og_image") else ""
     try:
-        r = await client.get(article_url, timeout=8)
-        if r.status_code == 200:
-            soup = BeautifulSoup(r.text, "html.parser")
-            og_tag = soup.find("meta", property="og:image")
-            if og_tag and og_tag.get("content"):
-                raw_url = urljoin(article_url, og_tag["content"].strip())
-                return clean_image_url(raw_url)
+        r = await scheduler.get(article_url, timeout=8)
+        if r.status_code != 200:
+            meta_cache.put(article_url, None)
+            return ""
+        # 🔹 the full head meta (same shape Main caches), not just og:image, so the row is complete for every reader
+        meta = parse_head_meta(r.text, str(r.url))
+        meta_cache.put(article_url, meta)
+        raw_url = meta.get("og_image", "")
+        return clean_image_url(raw_url) if raw_url else ""
+    except DomainOpenError:
+        return ""   # not attempted, nothing to cache
     except Exception:
+        meta_cache.put(article_url, None, failed=True)
         return ""
-    return ""
 
 # ----------------------------
 # Scrape Articles
 # ----------------------------
-async def scrape_articles(url: str, html: str, keywords: list[str], country_name: str):
+async def scrape_articles(db: Prisma, url: str, html: str, keywords: list[str], country_name: str):
     articles = []
     seen_links = set()
     soup = BeautifulSoup(html, "html.parser")
@@ -159,6 +173,7 @@ async def scrape_articles(url: str, html: str, keywords: list[str], country_name
         favicon_url = urljoin(url, icon_link["href"])
 
     parsed_domain = urlparse(url).netloc
+    since = lookback_cutoff()
 
     tasks = []
     temp_articles = []
@@ -169,12 +184,14 @@ async def scrape_articles(url: str, html: str, keywords: list[str], country_name
 
         if not title or len(title.split()) <= 3:
             continue
-        if not link.startswith("http"):
-            link = url.rstrip("/") + "/" + link.lstrip("/")
+        link = resolve_link(url, link)   # ../ and non-root sources resolved, tracking params / AMP stripped
+        if not link:
+            continue
 
-        if link in seen_links:
+        key = canonical_url(link)
+        if key in seen_links:
             continue
-        seen_links.add(link)
+        seen_links.add(key)
 
         context_parts = [title]
 
@@ -192,22 +209,27 @@ async def scrape_articles(url: str, html: str, keywords: list[str], country_name
         if not any(word.lower() in full_context for word in keywords):
             continue
 
-        pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
+        # 🔹 real date from the card's <time> or the URL; stale headlines never reach the og:image fetch
+        published = listing_published(parent.find("time") if parent else None, link)
+        if is_stale(published, since):
+            continue
 
         article = {
             "title": title,
             "description": " ".join(context_parts)[:500],
             "link": link,
-            "guid": {"isPermaLink": True, "value": link},
+            "guid": {"isPermaLink": True, "value": canonical_url(link)},
             "dc:creator": parsed_domain,
-            "pubDate": pub_time,
+            "pubDate": format_pubdate(published),
             "thumbnails": favicon_url,
             "thumbnail_url": "",
         }
 
         temp_articles.append(article)
-        tasks.append(with_retries(get_og_image, link))
+        tasks.append(get_og_image(link))
 
+    # 🔹 One cache query per page before any og:image fetch
+    await meta_cache.load(db, [a["link"] for a in temp_articles])
     results = await asyncio.gather(*tasks, return_exceptions=True)
 
     for article, og_img in zip(temp_articles, results):
@@ -246,7 +268,7 @@ async def scrape_country(db: Prisma, country, sources_by_country, keywords_by_co
 
             if html:
                 try:
-                    articles = await scrape_articles(url, html, keywords, country.name)
+                    articles = await scrape_articles(db, url, html, keywords, country.name)
                     all_articles.extend(articles)
                 except Exception as e:
                     logging.error(f"[{country.name}] scrape_articles failed for {url}: {e}")
@@ -285,6 +307,7 @@ async def scrape_country(db: Prisma, country, sources_by_country, keywords_by_co
 async def main():
     db = Prisma()
     await db.connect()
+    await domain_health.load(db)
 
     countries = await db.country.find_many()
     sources = await db.newssource.find_many()
@@ -310,8 +333,11 @@ async def main():
     total = sum(r for r in results if isinstance(r, int))
     logging.info(f"SUMMARY: Total {total} articles saved across {len(countries)} countries")
 
+    await meta_cache.save(db)
+    await meta_cache.prune(db)
+    await domain_health.save(db)
     await db.disconnect()
-    await client.aclose()
+    await scheduler.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -4,15 +4,23 @@ import json
 import asyncio
 import logging
 import traceback
-import random
 from datetime import datetime
 from dotenv import load_dotenv
-import httpx
-from bs4 import BeautifulSoup
 from prisma import Prisma
 from tqdm.asyncio import tqdm_asyncio
 from urllib.parse import urljoin, urlparse
 
+from fetch_scheduler import FetchScheduler
+from html_parsing import make_soup
+from anchor_context import collect_anchor_contexts
+from keyword_matcher import KeywordIndex
+from thumbnails import listing_image_url
+from image_cdn import apply_renditions
+from challenge_fetch import ChallengeFetcher
+from domain_health import DomainHealthRegistry
+from pub_dates import listing_published, format_pubdate, is_stale, lookback_cutoff
+from url_utils import canonical_url, resolve_link
+
 load_dotenv()
 # ----------------------------
 # User Agents
@@ -45,13 +53,10 @@ logging.basicConfig(
 )
 
 # ----------------------------
-# HTTP Client
+# HTTP Scheduler (per-host pacing, persisted circuit breaker, cached Cloudflare sessions)
 # ----------------------------
-client = httpx.AsyncClient(
-    timeout=8,
-    follow_redirects=True,
-    headers={"User-Agent": random.choice(USER_AGENTS)},
-)
+domain_health = DomainHealthRegistry()
+scheduler = FetchScheduler(user_agents=USER_AGENTS, timeout=8, health=domain_health, challenge=ChallengeFetcher())
 
 # ----------------------------
 # DB Concurrency limiter
@@ -69,23 +74,30 @@ async def safe_db_call(func, *args, **kwargs):
 # ----------------------------
 async def fetch_page(url: str):
     try:
-        r = await client.get(url)
+        r = await scheduler.get(url)
         r.raise_for_status()
         return r.text, None
     except Exception as e:
         return None, str(e)
 
 # ----------------------------
-# Scrape Articles
+# Extract Candidates (one parse per source, shared by every country)
 # ----------------------------
-def scrape_articles(url: str, html: str, keywords: list[str], country_name: str):
-    articles = []
+def extract_candidates(url: str, html: str):
+    """
+    Parse a source page once and return ([(article, full_context), ...], site_logo)
+    for every headline link, before any keyword filtering. Countries then pick
+    their matches from the same list instead of re-fetching and re-parsing.
+    Headlines dated (card <time> / URL date) before the lookback window are left out.
+    """
+    candidates = []
     seen_links = set()
-    soup = BeautifulSoup(html, "html.parser")
+    soup = make_soup(html)
+    page = collect_anchor_contexts(soup)
 
     # --- Find site logo ---
     site_logo = None
-    icon = soup.find("link", rel=lambda v: v and "icon" in v.lower())
+    icon = page["favicon"]
     if icon and icon.get("href"):
         site_logo = icon["href"]
     if not site_logo:
@@ -98,85 +110,76 @@ def scrape_articles(url: str, html: str, keywords: list[str], country_name: str)
             logo_img = soup.find("img", {"id": lambda v: v and "logo" in v.lower()})
         if logo_img and logo_img.get("src"):
             site_logo = logo_img["src"]
-    if site_logo and not site_logo.startswith("http"):
-        site_logo = url.rstrip("/") + "/" + site_logo.lstrip("/")
+    if site_logo:
+        site_logo = urljoin(url, site_logo)
 
     parsed_domain = urlparse(url).netloc
+    since = lookback_cutoff()
 
     # --- Collect articles ---
-    for a in soup.find_all("a", href=True):
-        title = a.get_text(strip=True)
-        link = a["href"]
+    for anchor in page["anchors"]:
+        title = anchor["title"]
+        link = anchor["href"]
 
         if not title or len(title.split()) <= 3:
             continue
-        if not link.startswith("http"):
-            link = url.rstrip("/") + "/" + link.lstrip("/")
+        link = resolve_link(url, link)   # ../ and non-root sources resolved, tracking params / AMP stripped
+        if not link:
+            continue
 
-        if link in seen_links:
+        key = canonical_url(link)
+        if key in seen_links:
+            continue
+        seen_links.add(key)
+
+        published = listing_published(anchor["time"], link)
+        if is_stale(published, since):
             continue
-        seen_links.add(link)
 
         context_parts = [title]
-        thumbnail_url = ""
-
-        parent = a.find_parent()
-        if parent:
-            for p in parent.find_all("p", limit=3):
-                context_parts.append(p.get_text(strip=True))
-            img = parent.find("img")
-            if img:
-                if img.has_attr("alt") and img["alt"].strip():
-                    context_parts.append(img["alt"].strip())
-                if img.has_attr("src") and img["src"].strip():
-                    thumbnail_url = urljoin(url, img["src"].strip())
+        context_parts.extend(anchor["paragraphs"])
+        img = anchor["img"]
+        if img and img.has_attr("alt") and img["alt"].strip():
+            context_parts.append(img["alt"].strip())
+        # srcset / lazy-load attributes before src, placeholders skipped
+        thumbnail_url = listing_image_url(img, url)
 
         full_context = " ".join(context_parts).lower()
-        if not (
-            any(word.lower() in full_context for word in keywords)
-            or country_name.lower() in full_context
-        ):
-            continue
-
-        pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
         article = {
             "title": title,
             "description": " ".join(context_parts)[:500],
             "link": link,
-            "guid": {"isPermaLink": True, "value": link},
+            "guid": {"isPermaLink": True, "value": canonical_url(link)},
             "dc:creator": parsed_domain,
-            "pubDate": pub_time,
+            "pubDate": format_pubdate(published),
             "thumbnails": site_logo,
             "thumbnail_url": thumbnail_url,
         }
-        articles.append(article)
+        apply_renditions(article)   # CDN-sized thumbnail per output (CTV / web)
+        candidates.append((article, full_context))
 
-    return articles, site_logo
+    return candidates, site_logo
 
 # ----------------------------
-# Scrape All Sources for One Country (US Mentions)
+# Scrape One Source (fetched + parsed once per run)
 # ----------------------------
-async def scrape_us_mentions_country(db: Prisma, country, sources, keywords: list[str]):
-    all_articles = []
-    site_logo = None
-
-    for source in sources:
-        url = source.url
-        try:
-            html, error = await fetch_page(url)
-            if not html:
-                logging.warning(f"[US_MENTIONS][{country.name}] {url} failed: {error}")
-                continue
-
-            articles, logo = scrape_articles(url, html, keywords, country.name)
-            all_articles.extend(articles)
-            if logo and not site_logo:
-                site_logo = logo
-
-        except Exception as e:
-            logging.error(f"[US_MENTIONS][{country.name}] {url} exception: {e}")
-            traceback.print_exc()
+async def scrape_source(source):
+    url = source.url
+    try:
+        html, error = await fetch_page(url)
+        if not html:
+            logging.warning(f"[US_MENTIONS] {url} failed: {error}")
+            return [], None
+        return extract_candidates(url, html)
+    except Exception as e:
+        logging.error(f"[US_MENTIONS] {url} exception: {e}")
+        traceback.print_exc()
+        return [], None
 
+# ----------------------------
+# Save One Country's Feed
+# ----------------------------
+async def save_country_feed(db: Prisma, country, sources, all_articles: list, site_logo):
     status = "success" if all_articles else "empty"
     rss_json = {
         "channel": {
@@ -230,6 +233,7 @@ async def main():
     db = Prisma()
     try:
         await db.connect()
+        await safe_db_call(domain_health.load, db)
 
         countries = await safe_db_call(db.country.find_many)
         us_sources = await safe_db_call(db.usmentionssource.find_many)
@@ -239,21 +243,45 @@ async def main():
         for k in us_keywords:
             keywords_by_country.setdefault(k.countryId, []).append(k.keyword)
 
-        tasks = []
-        for country in countries:
-            keywords = keywords_by_country.get(country.id, [])
-            if not keywords:
-                continue
-            tasks.append(scrape_us_mentions_country(db, country, us_sources, keywords))
+        countries = [c for c in countries if keywords_by_country.get(c.id)]
 
-        results = await tqdm_asyncio.gather(*tasks, total=len(tasks), desc="Scraping US Mentions")
+        # 🔹 Fetch + parse every source once, in parallel (the scheduler paces per host)
+        scraped = await tqdm_asyncio.gather(
+            *(scrape_source(src) for src in us_sources), total=len(us_sources), desc="Scraping US Mentions sources"
+        )
+
+        # 🔹 One scan per candidate for all countries: a country matches on any of
+        # its keywords or its own name (substring, case-insensitive)
+        index = KeywordIndex({c.id: keywords_by_country[c.id] + [c.name] for c in countries})
+        articles_by_country = {c.id: [] for c in countries}
+        site_logo = None
+        seen_links = set()   # canonical guid: an article linked from several sources is matched once
+        for candidates, logo in scraped:
+            if logo and not site_logo:
+                site_logo = logo
+            for article, full_context in candidates:
+                if article["guid"]["value"] in seen_links:
+                    continue
+                seen_links.add(article["guid"]["value"])
+                for country_id in index.groups(full_context):
+                    articles_by_country[country_id].append(dict(article))
+
+        tasks = [
+            save_country_feed(db, country, us_sources, articles_by_country[country.id], site_logo)
+            for country in countries
+        ]
+        results = await tqdm_asyncio.gather(*tasks, total=len(tasks), desc="Saving US Mentions feeds")
 
         total = sum(r for r in results if isinstance(r, int))
         logging.info(f"SUMMARY: US_MENTIONS={total}")
 
     finally:
+        try:
+            await safe_db_call(domain_health.save, db)
+        except Exception as e:
+            logging.error(f"Saving domain health failed: {e}")
         await db.disconnect()
-        await client.aclose()
+        await scheduler.aclose()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,19 @@
 import sys
 import json
-import cloudscraper
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
 from prisma import Prisma
 import asyncio
 import logging
 import traceback
-import random
-import xml.etree.ElementTree as ET
+
+from fetch_scheduler import FetchScheduler
+from html_parsing import make_soup
+from keyword_matcher import get_matcher
+from challenge_fetch import ChallengeFetcher
+from feed_ingest import fetch_feed, feed_article, feed_links_in, find_feed, feed_check_due, save_feed_url
+from news_sitemap import fetch_news_sitemap, find_news_sitemap, sitemap_check_due, save_sitemap_url
+from pub_dates import listing_published, format_pubdate, is_stale, lookback_cutoff
+from url_utils import canonical_url, resolve_link
 
 # ----------------------------
 # User Agents
@@ -36,121 +40,103 @@ logging.basicConfig(
     ]
 )
 
+# ----------------------------
+# HTTP Scheduler (Cloudflare challenge only for domains known to need it)
+# ----------------------------
+scheduler = FetchScheduler(user_agents=USER_AGENTS, timeout=15, challenge=ChallengeFetcher())
+
 # ----------------------------
 # Helpers
 # ----------------------------
 def get_browser_headers():
+    # User-Agent is chosen per host by the scheduler
     return {
-        "User-Agent": random.choice(USER_AGENTS),
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
         "Accept-Language": "en-US,en;q=0.9",
     }
 
 
-def fetch_page(url: str):
+async def fetch_page(url: str):
     """Fetch page content, retry HTTPS if HTTP fails"""
     headers = get_browser_headers()
 
-    def try_request(u: str):
+    async def try_request(u: str):
         try:
-            scraper = cloudscraper.create_scraper()
-            response = scraper.get(u, headers=headers, timeout=15)
+            response = await scheduler.get(u, headers=headers)
             response.raise_for_status()
             return response.text, None
-        except Exception as e1:
-            logging.warning(f"cloudscraper failed for {u}: {e1} (falling back to requests)")
-            try:
-                response = requests.get(u, headers=headers, timeout=15)
-                response.raise_for_status()
-                return response.text, None
-            except Exception as e2:
-                logging.error(f"requests failed for {u}: {e2}")
-                return None, str(e2)
+        except Exception as e:
+            logging.error(f"request failed for {u}: {e}")
+            return None, str(e)
 
-    html, error = try_request(url)
+    html, error = await try_request(url)
 
     if not html and url.startswith("http://"):
         https_url = url.replace("http://", "https://", 1)
         logging.info(f"Retrying with HTTPS: {https_url}")
-        html, error = try_request(https_url)
+        html, error = await try_request(https_url)
 
     return html, error
 
 
-def try_rss_feed(url: str):
-    """Try fetching RSS/Atom feed endpoints"""
-    feed_endpoints = [
-        "/rss",
-        "/rss.xml",
-        "/feed",
-        "/feed.xml",
-        "/feeds",
-        "/atom.xml",
-        "/api/rss",
+def match_entries(entries: list[dict], keywords: list[str], creator: str, image: str = "") -> list[dict]:
+    """Feed / sitemap entries within the lookback window whose title or summary matches the keywords, as feed items."""
+    matcher = get_matcher(keywords, whole_word=False)
+    since = lookback_cutoff()
+    return [
+        feed_article(entry, creator, image)
+        for entry in entries
+        if not is_stale(entry["published"], since) and matcher.search(f"{entry['title']} {entry['description']}")
     ]
 
-    for suffix in feed_endpoints:
-        feed_url = url.rstrip("/") + suffix
-        html, error = fetch_page(feed_url)
-        if not html:
-            continue
 
-        try:
-            root = ET.fromstring(html)
-            items = []
-
-            # RSS 2.0 <item>
-            for item in root.findall(".//item"):
-                title = item.findtext("title")
-                link = item.findtext("link")
-                pub_date = item.findtext("pubDate") or datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
-                if title and link:
-                    items.append({
-                        "title": title,
-                        "description": item.findtext("description") or title,
-                        "link": link,
-                        "guid": {"isPermaLink": True, "value": link},
-                        "dc:creator": "rss",
-                        "pubDate": pub_date,
-                    })
-
-            # Atom <entry>
-            for entry in root.findall(".//{http://www.w3.org/2005/Atom}entry"):
-                title = entry.findtext("{http://www.w3.org/2005/Atom}title")
-                link_elem = entry.find("{http://www.w3.org/2005/Atom}link")
-                link = link_elem.attrib.get("href") if link_elem is not None else None
-                pub_date = entry.findtext("{http://www.w3.org/2005/Atom}updated") or datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
-                if title and link:
-                    items.append({
-                        "title": title,
-                        "description": title,
-                        "link": link,
-                        "guid": {"isPermaLink": True, "value": link},
-                        "dc:creator": "atom",
-                        "pubDate": pub_date,
-                    })
-
-            if items:
-                logging.info(f"✅ Found RSS feed at {feed_url} ({len(items)} items)")
-                return items, None
-        except Exception:
-            continue
-
-    return None, "No valid RSS feed"
-
-
-def scrape_articles(url: str, keywords: list[str]):
+async def read_feed(feed_url: str, keywords: list[str]):
+    """Stream an RSS / Atom feed and keep the matching items."""
+    feed = await fetch_feed(scheduler, feed_url)
+    if feed["error"]:
+        logging.error(f"feed failed for {feed_url}: {feed['error']}")
+        return None, feed["error"]
+    articles = match_entries(feed["items"], keywords, "rss", feed["image"])
+    logging.info(f"✅ Read feed {feed_url} ({len(feed['items'])} items, {len(articles)} matched)")
+    return articles, None
+
+
+async def read_sitemap(sitemap_url: str, keywords: list[str]):
+    """Stream a news sitemap and keep the matching articles of the last NEWS_SITEMAP_HOURS."""
+    sitemap = await fetch_news_sitemap(scheduler, sitemap_url)
+    if sitemap["error"] or not sitemap["items"]:
+        logging.error(f"news sitemap failed for {sitemap_url}: {sitemap['error'] or 'no recent articles'}")
+        return None, sitemap["error"] or "no recent articles"
+    articles = match_entries(sitemap["items"], keywords, "sitemap")
+    logging.info(f"✅ Read news sitemap {sitemap_url} ({len(sitemap['items'])} recent, {len(articles)} matched)")
+    return articles, None
+
+
+async def scrape_articles(db: Prisma, source, state, keywords: list[str]):
     """Scrape and filter articles by keywords.
-    - Try HTML first.
-    - If HTML fails (error) → try RSS.
-    - If HTML works but finds no matches → return empty (skip RSS).
+    - A news sitemap, then a feed, already found for the source is read first.
+    - Otherwise HTML; while there, look for a sitemap / feed to use from the next run.
+    - If HTML fails → look for a feed (concurrent probes) and read it.
     """
-
-    # --- 1. Try HTML first ---
-    html, error = fetch_page(url)
+    url = source.url
+
+    # --- 1. Known news sitemap / feed first ---
+    sitemap_url = state.sitemapUrl if state else None
+    feed_url = state.feedUrl if state else None
+    for doc_url, reader in ((sitemap_url, read_sitemap), (feed_url, read_feed)):
+        if doc_url:
+            articles, error = await reader(doc_url, keywords)
+            if articles is not None:
+                return articles, None
+
+    # --- 2. HTML ---
+    html, error = await fetch_page(url)
     if html:
-        soup = BeautifulSoup(html, "html.parser")
+        soup = make_soup(html)
         articles = []
+        matcher = get_matcher(keywords, whole_word=False)
+        since = lookback_cutoff()
+        seen_links = set()
 
         for a in soup.find_all("a", href=True):
             title = a.get_text(strip=True)
@@ -159,33 +145,56 @@ def scrape_articles(url: str, keywords: list[str]):
             if not title or len(title.split()) <= 3:
                 continue
 
-            if not link.startswith("http"):
-                link = url.rstrip("/") + "/" + link.lstrip("/")
+            link = resolve_link(url, link)
+            if not link or canonical_url(link) in seen_links:
+                continue
 
-            pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
+            if not matcher.search(title):
+                continue
 
-            if not any(word.lower() in title.lower() for word in keywords):
+            # 🔹 real date from the card's <time> or the URL; stale headlines are dropped
+            published = listing_published(a.parent.find("time") if a.parent else None, link)
+            if is_stale(published, since):
                 continue
 
+            seen_links.add(canonical_url(link))
             articles.append({
                 "title": title,
                 "description": title,
                 "link": link,
-                "guid": {"isPermaLink": True, "value": link},
+                "guid": {"isPermaLink": True, "value": canonical_url(link)},
                 "dc:creator": "scraper",
-                "pubDate": pub_time,
+                "pubDate": format_pubdate(published),
             })
 
-        # ✅ Return results (even if empty) → DO NOT try RSS if HTML worked
+        # 🔹 robots.txt news sitemaps; advertised <link rel="alternate"> feeds, then the common paths
+        try:
+            if not sitemap_url and sitemap_check_due(state):
+                found = await find_news_sitemap(scheduler, url)
+                await save_sitemap_url(db, source.id, found)
+                if found:
+                    logging.info(f"Found news sitemap for {url}: {found} (used from the next run)")
+            if not feed_url and feed_check_due(state):
+                found = await find_feed(scheduler, url, feed_links_in(soup, url))
+                await save_feed_url(db, source.id, found)
+                if found:
+                    logging.info(f"Found feed for {url}: {found} (used from the next run)")
+        except Exception as e:
+            logging.error(f"feed discovery failed for {url}: {e}")
+
+        # ✅ Return results (even if empty)
         return articles, None
 
-    # --- 2. If HTML failed → fallback to RSS ---
+    # --- 3. If HTML failed → look for a feed ---
     try:
-        rss_items, rss_error = try_rss_feed(url)
-        if rss_items:
-            return rss_items, None
-        else:
-            return [], rss_error or error or "No valid RSS fields found"
+        found = await find_feed(scheduler, url)
+        await save_feed_url(db, source.id, found)
+        if not found:
+            return [], error or "No valid RSS feed"
+        articles, rss_error = await read_feed(found, keywords)
+        if articles is not None:
+            return articles, None
+        return [], rss_error or error
     except Exception as rss_ex:
         return [], f"RSS error: {rss_ex} | HTML error: {error}"
 
@@ -195,9 +204,8 @@ def scrape_articles(url: str, keywords: list[str]):
 async def scrape_country(db: Prisma, country_id: str, country_name: str):
     try:
         sources = await db.newssource.find_many(where={"countryId": country_id})
-        urls = [s.url for s in sources]
 
-        if not urls:
+        if not sources:
             logging.warning(f"No sources for {country_name} ({country_id})")
             return 0
 
@@ -208,13 +216,17 @@ async def scrape_country(db: Prisma, country_id: str, country_name: str):
             logging.warning(f"No keywords for {country_name} ({country_id})")
             return 0
 
+        states = await db.newssourcefetchstate.find_many(where={"newsSourceId": {"in": [s.id for s in sources]}})
+        states = {state.newsSourceId: state for state in states}
+
         total_articles = 0
 
-        for url in urls:
+        for source in sources:
+            url = source.url
             articles = []
             error_reason = None
             try:
-                articles, error_reason = scrape_articles(url, keyword_list)
+                articles, error_reason = await scrape_articles(db, source, states.get(source.id), keyword_list)
             except Exception as e:
                 error_reason = str(e)
                 logging.error(f"Scraping failed for {url} in {country_name}: {e}")
@@ -283,6 +295,7 @@ async def main():
             total_articles += count
 
     await db.disconnect()
+    await scheduler.aclose()
     logging.info(f"SUMMARY: Total {total_articles} articles saved across {len(countries)} countries")
 
 
@@ -3,14 +3,20 @@ import json
 import asyncio
 import logging
 import traceback
-import random
 from datetime import datetime
 
-import httpx
-from bs4 import BeautifulSoup
 from prisma import Prisma
 from tqdm.asyncio import tqdm_asyncio
 
+from html_parsing import make_soup
+from keyword_matcher import get_matcher
+from run_cache import RunCache
+from fetch_scheduler import FetchScheduler
+from domain_health import DomainHealthRegistry
+from challenge_fetch import ChallengeFetcher
+from url_utils import canonical_url, resolve_link
+from pub_dates import listing_published, format_pubdate, is_stale, lookback_cutoff
+
 # ----------------------------
 # User Agents
 # ----------------------------
@@ -66,17 +72,31 @@ for logger, file_handler in [(main_feed_logger, main_feed_file), (us_mentions_lo
 # ----------------------------
 MAX_COUNTRY_CONCURRENCY = 5
 MAX_URL_CONCURRENCY = 20
+MAX_HOST_CONCURRENCY = 4   # in-flight HTTP requests per host
+HOST_RATE = 2.0            # requests per second per host
 
 country_semaphore = asyncio.Semaphore(MAX_COUNTRY_CONCURRENCY)
 url_semaphore = asyncio.Semaphore(MAX_URL_CONCURRENCY)
 
 # ----------------------------
-# HTTP Client
+# HTTP Scheduler (per-host pacing, persisted circuit breaker, cached Cloudflare sessions)
 # ----------------------------
-client = httpx.AsyncClient(
-    timeout=8, follow_redirects=True, headers={"User-Agent": random.choice(USER_AGENTS)}
+domain_health = DomainHealthRegistry()
+scheduler = FetchScheduler(
+    user_agents=USER_AGENTS,
+    max_in_flight=MAX_URL_CONCURRENCY,
+    max_per_host=MAX_HOST_CONCURRENCY,
+    host_rate=HOST_RATE,
+    timeout=8,
+    health=domain_health,
+    challenge=ChallengeFetcher(),  # only used for domains known to need it
 )
 
+# ----------------------------
+# Run cache (MAIN_FEED and US_MENTIONS share overlapping pages: fetch + parse each once)
+# ----------------------------
+run_cache = RunCache()
+
 # ----------------------------
 # Fetch Page
 # ----------------------------
@@ -88,7 +108,7 @@ async def fetch_page(url: str, saved_etag: str = None, saved_lastmod: str = None
         headers["If-Modified-Since"] = saved_lastmod
 
     try:
-        r = await client.get(url, headers=headers)
+        r = await scheduler.get(url, headers=headers)
         if r.status_code == 304:
             return None, "not_modified", None, None
         r.raise_for_status()
@@ -97,11 +117,13 @@ async def fetch_page(url: str, saved_etag: str = None, saved_lastmod: str = None
         return None, str(e), None, None
 
 # ----------------------------
-# Scrape Articles
+# Extract Candidates (every headline link, before keyword filtering)
 # ----------------------------
-def scrape_articles(url: str, html: str, keywords: list[str]):
-    articles = []
-    soup = BeautifulSoup(html, "html.parser")
+def extract_candidates(url: str, html: str):
+    candidates = []
+    soup = make_soup(html)
+    since = lookback_cutoff()
+    seen_links = set()
 
     for a in soup.find_all("a", href=True):
         title = a.get_text(strip=True)
@@ -109,23 +131,42 @@ def scrape_articles(url: str, html: str, keywords: list[str]):
 
         if not title or len(title.split()) <= 3:
             continue
-        if not link.startswith("http"):
-            link = url.rstrip("/") + "/" + link.lstrip("/")
-        if not any(word.lower() in title.lower() for word in keywords):
+        link = resolve_link(url, link)
+        if not link or canonical_url(link) in seen_links:
+            continue
+
+        # 🔹 real date from the card's <time> or the URL; stale headlines are dropped here
+        published = listing_published(a.parent.find("time") if a.parent else None, link)
+        if is_stale(published, since):
             continue
 
-        pub_time = datetime.now().strftime("%a, %d %b %Y %H:%M:%S GMT")
-        articles.append(
+        seen_links.add(canonical_url(link))
+        candidates.append(
             {
                 "title": title,
                 "description": title,
                 "link": link,
-                "guid": {"isPermaLink": True, "value": link},
+                "guid": {"isPermaLink": True, "value": canonical_url(link)},
                 "dc:creator": "scraper",
-                "pubDate": pub_time,
+                "pubDate": format_pubdate(published),
             }
         )
-    return articles
+    return candidates
+
+# ----------------------------
+# Scrape Articles
+# ----------------------------
+def scrape_articles(candidates: list[dict], keywords: list[str]):
+    matcher = get_matcher(keywords, whole_word=False)
+    return [dict(c) for c in candidates if matcher.search(c["title"])]
+
+# ----------------------------
+# Load Page (fetch + parse, shared through run_cache)
+# ----------------------------
+async def load_page(url: str, saved_etag: str = None, saved_lastmod: str = None):
+    html, error_reason, new_etag, new_lastmod = await fetch_page(url, saved_etag, saved_lastmod)
+    candidates = extract_candidates(url, html) if html else []
+    return candidates, error_reason, new_etag, new_lastmod
 
 # ----------------------------
 # Generic Scraper
@@ -137,17 +178,18 @@ async def scrape_single_url(db: Prisma, country_name, country_id, url, keywords,
                 where={"country_id_url": {"country_id": country_id, "url": url}}
             )
 
-            html, error_reason, new_etag, new_lastmod = await fetch_page(
-                url,
-                saved_row.etag if saved_row else None,
-                saved_row.last_modified if saved_row else None,
+            saved_etag = saved_row.etag if saved_row else None
+            saved_lastmod = saved_row.last_modified if saved_row else None
+            # 🔹 Same page + same validators → one fetch + parse per run, for every country and feed type
+            candidates, error_reason, new_etag, new_lastmod = await run_cache.get(
+                (canonical_url(url), saved_etag, saved_lastmod), load_page, url, saved_etag, saved_lastmod
             )
 
             if error_reason == "not_modified":
                 logger.info(f"[{feed_type}][{country_name}] {url} → not modified")
                 return 0
 
-            articles = scrape_articles(url, html, keywords) if html else []
+            articles = scrape_articles(candidates, keywords)
             status = "success" if articles else ("error" if error_reason else "empty")
 
             rss_json = {
@@ -235,6 +277,7 @@ async def scrape_country_us_mentions(db: Prisma, country, us_sources, us_keyword
 async def main():
     db = Prisma()
     await db.connect()
+    await domain_health.load(db)
 
     countries = await db.country.find_many()
     sources = await db.newssource.find_many()
@@ -268,9 +311,11 @@ async def main():
 
     main_feed_logger.info(f"SUMMARY: MAIN_FEED={total_main}")
     us_mentions_logger.info(f"SUMMARY: US_MENTIONS={total_us}")
+    main_feed_logger.info(f"Run cache: {run_cache.summary()}")
 
+    await domain_health.save(db)
     await db.disconnect()
-    await client.aclose()
+    await scheduler.aclose()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,55 @@
+import os
+import asyncio
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+# ----------------------------
+# Config
+# ----------------------------
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 2)))  # 0 = parse inline on the event loop
+PARSE_QUEUE_PER_WORKER = 2   # pages queued on the executor per worker; further parses wait for a slot
+
+
+class ParsePool:
+    """
+    Bounded process pool for CPU-heavy HTML parsing.
+
+    A caller takes a slot() around run() once its page is downloaded, so at most
+    workers * PARSE_QUEUE_PER_WORKER pages are queued on the executor; downloads
+    themselves are bounded by the FetchScheduler and keep going while workers
+    parse. run() executes a module-level function in a worker and returns its
+    (picklable) result.
+
+    Workers are forked, so call start() first thing in main(), before the DB
+    client, HTTP clients or the event loop's resolver threads exist; forking a
+    process that already runs threads can leave locks held in the children.
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS, queue_per_worker: int = PARSE_QUEUE_PER_WORKER):
+        self.workers = workers
+        self.executor = None
+        if workers > 0:
+            # fork: spawn/forkserver would re-import the calling script (logging setup, clients) in every worker
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        self.slots = asyncio.Semaphore(max(1, workers) * queue_per_worker)
+
+    def start(self):
+        """Fork every worker now (a fork-context pool starts them all on its first job)."""
+        if self.executor is not None:
+            self.executor.submit(int).result()
+
+    @asynccontextmanager
+    async def slot(self):
+        async with self.slots:
+            yield
+
+    async def run(self, func, *args):
+        if self.executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,74 @@
+"""
+Check that every HTML parser backend extracts the same articles from recorded pages.
+
+Usage:
+    python scripts/parser_parity.py --url https://www.example.com --keywords "taliban,kabul" page.html [page2.html ...]
+
+Each file is a saved copy of the source homepage given by --url. Exits with
+status 1 if any backend returns different article links, titles or descriptions.
+"""
+import sys
+import time
+import argparse
+
+from html_parsing import BACKENDS, resolve_backend
+from listing_extract import extract_listing
+
+
+def article_key(article: dict):
+    return (article["link"], article["title"], article["description"])
+
+
+def run_backend(url: str, html: str, keywords: list[str], backend: str):
+    started = time.perf_counter()
+    listing = extract_listing(url, html, keywords, backend=backend)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return [article_key(a) for a in listing["articles"]], listing["favicon_url"], elapsed_ms
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", required=True, help="homepage URL the pages were saved from")
+    parser.add_argument("--keywords", required=True, help="comma separated keywords")
+    parser.add_argument("pages", nargs="+")
+    args = parser.parse_args()
+
+    keywords = [k.strip() for k in args.keywords.split(",") if k.strip()]
+    backends = [b for b in BACKENDS if resolve_backend(b) == b]
+    if len(backends) < 2:
+        print(f"Only {backends} available, install lxml to compare backends", file=sys.stderr)
+        sys.exit(2)
+
+    mismatches = 0
+    for path in args.pages:
+        with open(path, encoding="utf-8", errors="replace") as fh:
+            html = fh.read()
+
+        results = {b: run_backend(args.url, html, keywords, b) for b in backends}
+        reference_name = backends[-1]          # html.parser is the historical behaviour
+        reference, ref_favicon, _ = results[reference_name]
+
+        timings = ", ".join(f"{b}={results[b][2]:.0f}ms" for b in backends)
+        print(f"{path}: {len(reference)} articles ({timings})")
+
+        for name in backends[:-1]:
+            articles, favicon, _ = results[name]
+            missing = [a for a in reference if a not in articles]
+            extra = [a for a in articles if a not in reference]
+            if missing or extra or favicon != ref_favicon:
+                mismatches += 1
+                print(f"  ❌ {name} differs from {reference_name}")
+                for a in missing:
+                    print(f"     - missing: {a[0]} | {a[1]}")
+                for a in extra:
+                    print(f"     + extra:   {a[0]} | {a[1]}")
+                if favicon != ref_favicon:
+                    print(f"     favicon: {favicon!r} vs {ref_favicon!r}")
+            else:
+                print(f"  ✅ {name} matches {reference_name}")
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import re
+import json
+import calendar
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+# ----------------------------
+# Config
+# ----------------------------
+LOOKBACK = timedelta(hours=int(os.getenv("ARTICLE_LOOKBACK_HOURS", "72")))   # older articles are dropped before enrichment
+PUBDATE_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+MIN_YEAR = 1995
+
+PUBLISHED_META = ["article:published_time", "og:published_time", "datepublished", "pubdate", "publishdate", "date", "dc.date.issued"]
+
+_URL_DAY = re.compile(r"/(20\d{2})[/-](0[1-9]|1[0-2])[/-](0[1-9]|[12]\d|3[01])(?=[/._-]|$)")
+_URL_COMPACT_DAY = re.compile(r"/(20\d{2})(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])(?=[/_-]|$)")
+_URL_MONTH = re.compile(r"/(20\d{2})/(0[1-9]|1[0-2])/")
+_EPOCH = re.compile(r"^\d{10}(\d{3})?$")
+
+
+# ----------------------------
+# Parsing
+# ----------------------------
+def parse_date(value):
+    """
+    RFC 822 (RSS pubDate), ISO 8601 (Atom, JSON-LD, <time datetime>, meta tags)
+    or a unix timestamp → aware UTC datetime; None if unparseable or implausible.
+    Naive values are taken as UTC.
+    """
+    value = (value or "").strip() if isinstance(value, str) else ""
+    if not value:
+        return None
+    if _EPOCH.match(value):
+        parsed = datetime.fromtimestamp(int(value[:10]), timezone.utc)
+    else:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            try:
+                parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    parsed = parsed.astimezone(timezone.utc)
+    if parsed.year < MIN_YEAR:
+        return None
+    return parsed
+
+
+def format_pubdate(published: datetime = None) -> str:
+    """Feed pubDate string; now when the publication time is unknown."""
+    return (published or datetime.now(timezone.utc)).astimezone(timezone.utc).strftime(PUBDATE_FORMAT)
+
+
+# ----------------------------
+# Sources of a publication time
+# ----------------------------
+def url_date(url: str):
+    """
+    Date segment in an article URL (/2025/06/10/, /2025-06-10-, /20250610/, /2025/06/).
+    Returns the *latest* moment the segment can stand for (end of that day / month,
+    capped at now), so a lookback filter never drops an article too early.
+    """
+    now = datetime.now(timezone.utc)
+    match = _URL_DAY.search(url or "") or _URL_COMPACT_DAY.search(url or "")
+    if match:
+        year, month, day = (int(g) for g in match.groups())
+        if day > calendar.monthrange(year, month)[1]:
+            return None
+        return min(datetime(year, month, day, 23, 59, 59, tzinfo=timezone.utc), now)
+    match = _URL_MONTH.search(url or "")
+    if match:
+        year, month = int(match.group(1)), int(match.group(2))
+        last_day = calendar.monthrange(year, month)[1]
+        return min(datetime(year, month, last_day, 23, 59, 59, tzinfo=timezone.utc), now)
+    return None
+
+
+def time_tag_date(tag):
+    """<time datetime="..."> (or its text) → datetime."""
+    if tag is None:
+        return None
+    return parse_date(tag.get("datetime") or tag.get("content") or "") or parse_date(tag.get_text(strip=True))
+
+
+def _jsonld_published(node):
+    if isinstance(node, list):
+        return next((found for found in map(_jsonld_published, node) if found), None)
+    if not isinstance(node, dict):
+        return None
+    if node.get("datePublished"):
+        published = parse_date(str(node["datePublished"]))
+        if published:
+            return published
+    return _jsonld_published(node.get("@graph") or node.get("mainEntity") or [])
+
+
+def html_published(soup):
+    """
+    Publication time of an article page: <meta property="article:published_time">
+    and friends, then JSON-LD datePublished, then <time itemprop="datePublished">
+    or the first <time datetime>.
+    """
+    for meta in soup.find_all("meta", content=True):
+        key = (meta.get("property") or meta.get("name") or meta.get("itemprop") or "").lower()
+        if key in PUBLISHED_META:
+            published = parse_date(meta["content"])
+            if published:
+                return published
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            published = _jsonld_published(json.loads(script.string or ""))
+        except (ValueError, TypeError):
+            continue
+        if published:
+            return published
+
+    tag = soup.find("time", itemprop="datePublished") or soup.find("time", datetime=True)
+    return time_tag_date(tag)
+
+
+def listing_published(time_tag, link: str):
+    """Publication time of a headline on a listing page: its card's <time>, else the link's date segment."""
+    return time_tag_date(time_tag) or url_date(link)
+
+
+# ----------------------------
+# Lookback window
+# ----------------------------
+def lookback_cutoff(lookback: timedelta = LOOKBACK) -> datetime:
+    return datetime.now(timezone.utc) - lookback
+
+
+def is_stale(published, since: datetime) -> bool:
+    """True only for a known publication time before `since`; undated articles are kept."""
+    return published is not None and published < since
+
+
+def fresh_articles(articles: list[dict], since: datetime) -> list[dict]:
+    """Feed items whose pubDate is within the window (items store pubDate as a string)."""
+    return [a for a in articles if not is_stale(parse_date(a.get("pubDate")), since)]
@@ -0,0 +1,51 @@
+import asyncio
+
+
+class RunCache:
+    """
+    Run-scoped, single-flight cache for async work (page fetch + parse, og:image
+    lookups, ...).
+
+    The first caller for a key starts the work; callers that ask for the same key
+    while it is in flight await the same task instead of starting their own, and
+    later callers get the stored result. Nothing is evicted, so an instance should
+    live for one crawl run only. Exceptions are cached like results.
+
+    When every caller waiting on a key is cancelled before the work finishes, the
+    work itself is cancelled and forgotten, so a later caller starts it afresh.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self._waiters = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, func, *args, **kwargs):
+        task = self._tasks.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._tasks[key] = task
+        else:
+            self.hits += 1
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # shield: one consumer being cancelled must not cancel the shared work
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # 🔹 ...but once the last consumer is gone nobody needs it: stop the fetch / parse too
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+                self._tasks.pop(key, None)
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def summary(self) -> str:
+        return f"{self.misses} fetched, {self.hits} served from run cache"
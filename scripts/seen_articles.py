@@ -0,0 +1,87 @@
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from prisma import Prisma
+
+from url_utils import canonical_url, url_hash
+
+# ----------------------------
+# Settings
+# ----------------------------
+SEEN_TTL = timedelta(days=int(os.getenv("SEEN_ARTICLE_TTL_DAYS", "7")))   # re-fetch an article after this
+FAILED_TTL = timedelta(hours=6)                                           # retry failed / non-200 pages sooner
+LOAD_CHUNK = 1000                                                         # hashes per find_many
+
+
+class SeenArticleIndex:
+    """
+    Persistent index of article pages the details crawlers already fetched,
+    keyed by a hash of the canonical URL and expiring after SEEN_TTL.
+
+    Each entry keeps the keyword-independent extraction result, so a link seen
+    in an earlier run is re-matched against the current keywords without being
+    fetched again. Failed fetches are stored too (data None) with a shorter TTL.
+
+    Call load(db, urls) with a page's links before scraping them, put() after
+    each fetch, and save(db) / prune(db) before disconnecting.
+    """
+
+    def __init__(self, ttl: timedelta = SEEN_TTL, failed_ttl: timedelta = FAILED_TTL):
+        self.ttl = ttl
+        self.failed_ttl = failed_ttl
+        self.records: dict[str, dict] = {}   # url hash -> extraction result, None = failed
+        self.dirty: dict[str, tuple] = {}    # url hash -> (url, data, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, url: str) -> bool:
+        return url_hash(url) in self.records
+
+    def get(self, url: str):
+        """Return (seen, data); data is None for a page that failed last time."""
+        key = url_hash(url)
+        if key in self.records:
+            self.hits += 1
+            return True, self.records[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, url: str, data: dict):
+        key = url_hash(url)
+        ttl = self.ttl if data is not None else self.failed_ttl
+        self.records[key] = data
+        self.dirty[key] = (canonical_url(url), data, datetime.now(timezone.utc) + ttl)
+
+    async def load(self, db: Prisma, urls: list[str]):
+        keys = list({url_hash(u) for u in urls} - self.records.keys())
+        now = datetime.now(timezone.utc)
+        for i in range(0, len(keys), LOAD_CHUNK):
+            rows = await db.seenarticle.find_many(
+                where={"urlHash": {"in": keys[i : i + LOAD_CHUNK]}, "expiresAt": {"gt": now}}
+            )
+            for row in rows:
+                self.records[row.urlHash] = json.loads(row.data) if row.status == "ok" and row.data else None
+
+    async def save(self, db: Prisma):
+        if not self.dirty:
+            return
+        async with db.batch_() as batcher:
+            for key, (url, data, expires_at) in self.dirty.items():
+                values = {
+                    "url": url,
+                    "status": "ok" if data is not None else "failed",
+                    "data": json.dumps(data, ensure_ascii=False) if data is not None else None,
+                    "expiresAt": expires_at,
+                }
+                batcher.seenarticle.upsert(
+                    where={"urlHash": key},
+                    data={"create": {"urlHash": key, **values}, "update": values},
+                )
+        logging.info(f"[SEEN] saved {len(self.dirty)} articles ({self.hits} reused, {self.misses} fetched this run)")
+        self.dirty.clear()
+
+    async def prune(self, db: Prisma):
+        removed = await db.seenarticle.delete_many(where={"expiresAt": {"lt": datetime.now(timezone.utc)}})
+        logging.info(f"[SEEN] pruned {removed} expired articles")
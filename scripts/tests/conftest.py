@@ -0,0 +1,5 @@
+import os
+import sys
+
+# scripts/ holds flat modules imported by bare name ("from image_cdn import ...")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
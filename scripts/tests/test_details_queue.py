@@ -0,0 +1,48 @@
+import asyncio
+
+from details_queue import DetailsQueue
+from run_cache import RunCache
+
+
+def test_batch_close_cancels_run_cache_work():
+    finished = []
+
+    async def fetch(n):
+        await asyncio.sleep(0.01 if n == 0 else 0.2)
+        finished.append(n)
+        return {"n": n}
+
+    async def job(cache, n):
+        return await cache.get(("details", n), fetch, n)
+
+    async def run():
+        cache, queue = RunCache(), DetailsQueue(workers=4)
+        batch = queue.batch(target=1)
+        for n in range(4):
+            await batch.submit(1.0, job, cache, n)
+        items = await batch.results()
+        await asyncio.sleep(0.3)
+        await queue.close()
+        return items
+
+    assert asyncio.run(run()) == [{"n": 0}]
+    assert finished == [0]
+
+
+def test_queue_close_cancels_running_jobs():
+    finished = []
+
+    async def job():
+        await asyncio.sleep(0.2)
+        finished.append(True)
+
+    async def run():
+        queue = DetailsQueue(workers=2)
+        batch = queue.batch(target=0)
+        await batch.submit(1.0, job)
+        await asyncio.sleep(0.01)
+        await queue.close()
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert finished == []
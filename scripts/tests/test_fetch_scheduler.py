@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("prisma")   # domain_health persists through the Prisma client
+
+from domain_health import DomainHealthRegistry, OPEN, HALF_OPEN  # noqa: E402
+from fetch_scheduler import FetchScheduler  # noqa: E402
+
+
+def half_open_registry(domain: str) -> DomainHealthRegistry:
+    health = DomainHealthRegistry()
+    breaker = health.get(domain)
+    breaker.state = OPEN
+    breaker.opened_until = datetime.now(timezone.utc) - timedelta(seconds=1)
+    return health
+
+
+@pytest.mark.parametrize("stuck_in", ["request", "bucket"])
+def test_cancelled_probe_releases_the_domain(stuck_in):
+    async def run():
+        health = half_open_registry("slow.example.com")
+        scheduler = FetchScheduler(health=health)
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        scheduler.client.get = hang
+        if stuck_in == "bucket":
+            scheduler.host_slot("https://slow.example.com/").bucket.acquire = hang
+
+        probe = asyncio.ensure_future(scheduler.get("https://slow.example.com/a"))
+        await asyncio.sleep(0.01)
+        assert health.get("slow.example.com").state == HALF_OPEN
+        assert health.is_open("slow.example.com")
+
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        await scheduler.aclose()
+        return health
+
+    health = asyncio.run(run())
+    assert not health.is_open("slow.example.com")
+    assert health.allow("slow.example.com")   # the next request becomes the probe
+
+
+def test_recorded_probe_outcome_is_kept():
+    health = half_open_registry("down.example.com")
+    assert health.allow("down.example.com")
+    health.record_failure("down.example.com", 10, "HTTP 503")
+    health.release("down.example.com")
+    assert health.get("down.example.com").state == OPEN
+    assert health.is_open("down.example.com")
@@ -0,0 +1,38 @@
+from image_cdn import rewrite_image_url
+
+
+def test_cloudinary_rendition_replaces_transforms():
+    url = "https://res.cloudinary.com/demo/image/upload/c_fill,w_1600,h_900/v12/news/photo.jpg"
+    assert rewrite_image_url(url, 640) == "https://res.cloudinary.com/demo/image/upload/c_limit,w_640,q_auto/v12/news/photo.jpg"
+
+
+def test_cloudinary_keeps_smaller_width():
+    url = "https://res.cloudinary.com/demo/image/upload/w_300/photo.jpg"
+    assert rewrite_image_url(url, 640) == "https://res.cloudinary.com/demo/image/upload/c_limit,w_300,q_auto/photo.jpg"
+
+
+def test_non_cloudinary_host_with_upload_path_is_untouched():
+    url = "https://example.org/image/upload/photo.jpg"
+    assert rewrite_image_url(url, 640) == url
+
+
+def test_public_id_folder_is_not_taken_for_a_transform():
+    url = "https://res.cloudinary.com/demo/image/upload/news_2024/photo.jpg"
+    assert rewrite_image_url(url, 640) == "https://res.cloudinary.com/demo/image/upload/c_limit,w_640,q_auto/news_2024/photo.jpg"
+
+
+def test_configured_cname_is_rewritten(monkeypatch):
+    import image_cdn
+    monkeypatch.setattr(image_cdn, "CLOUDINARY_HOSTS", {"res.cloudinary.com", "img.site.com"})
+    url = "https://img.site.com/image/upload/q_auto,w_2000/photo.jpg"
+    assert rewrite_image_url(url, 640) == "https://img.site.com/image/upload/c_limit,w_640,q_auto/photo.jpg"
+
+
+def test_unknown_host_with_cloudinary_transforms_is_rewritten():
+    url = "https://images.jpost.com/image/upload/c_fill,g_faces:center,h_448,w_632/682681"
+    assert rewrite_image_url(url, 640) == "https://images.jpost.com/image/upload/c_limit,w_632,q_auto/682681"
+
+
+def test_unknown_host_with_only_a_folder_is_untouched():
+    url = "https://example.org/image/upload/news_2024/photo.jpg"
+    assert rewrite_image_url(url, 640) == url
@@ -0,0 +1,19 @@
+import asyncio
+
+from parse_pool import ParsePool
+
+
+def test_start_forks_every_worker_up_front():
+    pool = ParsePool(workers=2)
+    try:
+        pool.start()
+        assert len(pool.executor._processes) == 2
+        assert asyncio.run(pool.run(len, "abc")) == 3
+    finally:
+        pool.close()
+
+
+def test_inline_when_no_workers():
+    pool = ParsePool(workers=0)
+    pool.start()
+    assert asyncio.run(pool.run(len, "abc")) == 3
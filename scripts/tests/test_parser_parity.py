@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+pytest.importorskip("lxml")
+
+import html_parsing  # noqa: E402
+from listing_extract import extract_candidates  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+URL = "https://www.example.com/"
+
+
+def read(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as fh:
+        return fh.read()
+
+
+@pytest.mark.skipif("SCRAPER_HTML_PARSER" in os.environ, reason="backend overridden")
+def test_default_backend_is_html_parser():
+    assert html_parsing.DEFAULT_BACKEND == "html.parser"
+
+
+def test_listing_parity():
+    def run(backend):
+        listing = extract_candidates(URL, read("listing.html"), backend)
+        items = [(c["article"]["link"], c["article"]["title"], c["article"]["thumbnail_url"], c["context"], c["published"]) for c in listing["candidates"]]
+        return listing["favicon_url"], listing["feed_urls"], items
+
+    reference = run("html.parser")
+    assert reference[2]
+    assert run("lxml") == reference
+
+
+def test_details_parity(monkeypatch):
+    pytest.importorskip("prisma")   # article_details loads the seen index through Prisma
+    from article_details import extract_details
+
+    def run(backend):
+        monkeypatch.setattr(html_parsing, "DEFAULT_BACKEND", backend)
+        return extract_details(URL + "world/2025/06/10/taliban-talks-resume-in-doha.html", read("details.html"))
+
+    reference = run("html.parser")
+    assert reference["content_text"] and reference["published_time"]
+    assert run("lxml") == reference
@@ -0,0 +1,54 @@
+import asyncio
+
+from run_cache import RunCache
+
+
+def test_concurrent_callers_share_one_call():
+    calls = []
+
+    async def work(x):
+        calls.append(x)
+        await asyncio.sleep(0.01)
+        return x * 2
+
+    async def run():
+        cache = RunCache()
+        results = await asyncio.gather(*(cache.get("k", work, 21) for _ in range(3)))
+        return results, cache
+
+    results, cache = asyncio.run(run())
+    assert results == [42, 42, 42]
+    assert calls == [21]
+    assert (cache.misses, cache.hits) == (1, 2)
+
+
+def test_cancelling_one_of_two_callers_keeps_the_work():
+    async def run():
+        cache = RunCache()
+        first = asyncio.ensure_future(cache.get("k", asyncio.sleep, 0.02, "done"))
+        second = asyncio.ensure_future(cache.get("k", asyncio.sleep, 0.02, "done"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_cancelling_the_last_caller_cancels_the_work():
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(True)
+
+    async def run():
+        cache = RunCache()
+        caller = asyncio.ensure_future(cache.get("k", work))
+        await asyncio.sleep(0)
+        caller.cancel()
+        await asyncio.sleep(0.1)
+        return cache
+
+    cache = asyncio.run(run())
+    assert finished == []
+    assert len(cache) == 0
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("prisma")   # fetch_scheduler → domain_health
+
+from thumbnail_store import ThumbnailStore  # noqa: E402
+
+
+def store_image(store: ThumbnailStore, url: str, data: bytes):
+    async def download(_url):
+        return data, "image/png"
+
+    store._download = download
+    return asyncio.run(store.localize(url))
+
+
+def test_two_runs_sharing_the_directory_keep_both_images(tmp_path):
+    first = ThumbnailStore(directory=str(tmp_path), base_url="https://cdn.example.com/thumbs", renditions={"web": 640})
+    second = ThumbnailStore(directory=str(tmp_path), base_url="https://cdn.example.com/thumbs", renditions={"web": 640})
+    assert store_image(first, "https://a.example.com/1.png", b"one")
+    assert store_image(second, "https://b.example.com/2.png", b"two")
+
+    first.save()
+    second.save()
+
+    with open(tmp_path / "index.json", encoding="utf-8") as fh:
+        index = json.load(fh)
+    assert len(index["sources"]) == 2
+    assert len(index["files"]) == 2
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_stored_image_is_served_from_the_index(tmp_path):
+    store = ThumbnailStore(directory=str(tmp_path), base_url="https://cdn.example.com/thumbs", renditions={"web": 640})
+    local = store_image(store, "https://a.example.com/1.png", b"one")
+    store.save()
+
+    reopened = ThumbnailStore(directory=str(tmp_path), base_url="https://cdn.example.com/thumbs", renditions={"web": 640})
+    assert asyncio.run(reopened.localize("https://a.example.com/1.png")) == local
+
+
+def test_eviction_keeps_images_another_run_used_recently(tmp_path):
+    other = ThumbnailStore(directory=str(tmp_path), base_url="https://cdn.example.com/thumbs", renditions={"web": 640})
+    store_image(other, "https://a.example.com/recent.png", b"recent")
+    store_image(other, "https://a.example.com/old.png", b"old")
+    old_hash = other.sources[next(k for k, v in other.sources.items() if other.files[v]["bytes"] == 3)]
+    other.files[old_hash]["last_used"] -= 3 * 24 * 3600
+    other.save()
+
+    store = ThumbnailStore(directory=str(tmp_path), base_url="https://cdn.example.com/thumbs", renditions={"web": 640}, max_bytes=1)
+    store_image(store, "https://b.example.com/new.png", b"new")
+    store.save()
+
+    with open(tmp_path / "index.json", encoding="utf-8") as fh:
+        files = json.load(fh)["files"]
+    assert old_hash not in files   # least recently used, outside the grace window
+    assert len(files) == 2          # the other run's recent image and ours survive
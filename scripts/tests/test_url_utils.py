@@ -0,0 +1,70 @@
+import pytest
+
+from url_utils import canonical_url, clean_url, prefer_canonical, resolve_link
+
+
+@pytest.mark.parametrize("url, expected", [
+    # tracking parameters go, the rest keep their exact encoding and order
+    ("https://site.com/a?q=a%20b&utm_source=x", "https://site.com/a?q=a%20b"),
+    ("https://site.com/a?b=2&fbclid=abc&a=1", "https://site.com/a?b=2&a=1"),
+    ("https://site.com/a?q=a+b&path=%2Fx%2Fy&gclid=1", "https://site.com/a?q=a+b&path=%2Fx%2Fy"),
+    ("https://site.com/a?utm_source=x&utm_medium=y", "https://site.com/a"),
+    ("https://site.com/a?q=a%20b&&z=1", "https://site.com/a?q=a%20b&&z=1"),
+    ("https://site.com/a?page=2#top", "https://site.com/a?page=2"),
+    # AMP variants → the regular page
+    ("https://amp.site.com/news/story", "https://site.com/news/story"),
+    ("https://site.com/news/story/amp/", "https://site.com/news/story"),
+    ("https://site.com/news/story.amp", "https://site.com/news/story"),
+    ("https://site.com/amp/news/story", "https://site.com/news/story"),
+    ("https://site.com/news/story?amp=1&id=7", "https://site.com/news/story?id=7"),
+    ("https://site.com/news/story?outputType=amp", "https://site.com/news/story"),
+    # case, port and trailing slash are left alone
+    ("https://Site.com:8443/News/", "https://Site.com:8443/News/"),
+    ("", ""),
+])
+def test_clean_url(url, expected):
+    assert clean_url(url) == expected
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://Example.com:443/news/?b=2&a=1&utm_source=x#top", "https://example.com/news?a=1&b=2"),
+    ("http://example.com:80/news", "http://example.com/news"),
+    ("https://example.com:8443/news/", "https://example.com:8443/news"),
+    ("https://amp.example.com/news/amp?amp=1", "https://example.com/news"),
+    ("https://example.com/news", "https://example.com/news"),
+    ("https://example.com/news/", "https://example.com/news"),
+])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == expected
+
+
+def test_canonical_url_treats_query_encodings_alike():
+    assert canonical_url("https://example.com/s?q=a%20b") == canonical_url("https://example.com/s?q=a+b")
+
+
+@pytest.mark.parametrize("base, href, expected", [
+    ("https://site.com/news/world/", "../sport/story", "https://site.com/news/sport/story"),
+    ("https://site.com/news/world/index.html", "../../about", "https://site.com/about"),
+    ("https://site.com/news/", "/a?utm_source=x", "https://site.com/a"),
+    ("https://site.com/news/", "//cdn.site.com/a", "https://cdn.site.com/a"),
+    ("https://site.com:8080/news/", "story", "https://site.com:8080/news/story"),
+    ("https://site.com/news/", "https://amp.other.com/a/amp/", "https://other.com/a"),
+    ("https://site.com/news/", "javascript:void(0)", ""),
+    ("https://site.com/news/", "mailto:desk@site.com", ""),
+    ("https://site.com/news/", "#comments", ""),
+    ("https://site.com/news/", "ftp://site.com/file", ""),
+    ("https://site.com/news/", "", ""),
+])
+def test_resolve_link(base, href, expected):
+    assert resolve_link(base, href) == expected
+
+
+@pytest.mark.parametrize("url, canonical, expected", [
+    ("https://site.com/a?amp=1", "/news/a", "https://site.com/news/a"),
+    ("https://site.com/a", "https://site.com/", "https://site.com/a"),
+    ("https://site.com/a", "/", "https://site.com/a"),
+    ("https://site.com/a", "", "https://site.com/a"),
+    ("https://site.com/a", "javascript:void(0)", "https://site.com/a"),
+])
+def test_prefer_canonical(url, canonical, expected):
+    assert prefer_canonical(url, canonical) == expected
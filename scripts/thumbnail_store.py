@@ -0,0 +1,303 @@
+import io
+import os
+import json
+import time
+import fcntl
+import asyncio
+import hashlib
+import logging
+import tempfile
+
+from image_cdn import RENDITIONS, DEFAULT_OUTPUT
+from fetch_scheduler import FetchScheduler
+from domain_health import DomainHealthRegistry
+
+try:
+    from PIL import Image   # optional: without Pillow the original bytes are stored once per image
+except ImportError:
+    Image = None
+
+# ----------------------------
+# Config
+# ----------------------------
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "public/thumbs")             # served by the app as /thumbs
+THUMBNAIL_BASE_URL = os.getenv("THUMBNAIL_BASE_URL", "").rstrip("/")    # e.g. https://cms.example.com/thumbs; unset = store disabled
+THUMBNAIL_MAX_BYTES = int(os.getenv("THUMBNAIL_MAX_MB", "1024")) * 1024 * 1024
+THUMBNAIL_DOWNLOADS = int(os.getenv("THUMBNAIL_DOWNLOADS", "8"))        # concurrent image downloads
+DOWNLOAD_BYTE_CAP = 15 * 1024 * 1024
+EVICT_GRACE = 24 * 3600   # seconds: images used this recently (by any run) are never evicted
+JPEG_QUALITY = 80
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp", "image/avif": ".avif"}
+
+
+class ThumbnailStore:
+    """
+    Local copies of feed thumbnails, served from one origin.
+
+    Each source URL is downloaded once; the bytes are hashed (sha256) so the same
+    image behind different URLs is stored once, then resized to the configured
+    renditions (image_cdn.RENDITIONS, JPEG; Pillow optional) under THUMBNAIL_DIR.
+    index.json maps source URLs to content hashes and tracks size and last use;
+    when the directory grows past THUMBNAIL_MAX_BYTES the least recently used
+    images are deleted (never ones used in the current run or by any run within
+    EVICT_GRACE, as recorded in the on-disk index).
+
+    Downloads go through the crawler's FetchScheduler (per-host limits, domain
+    health breaker); without one the store paces itself with a private scheduler
+    and breaker, closed by aclose(). Several scripts share the directory, so
+    flush() merges this run's changes into the index on disk under a file lock
+    instead of overwriting it; call it (or aclose()) once per run.
+
+    Disabled (items untouched) unless THUMBNAIL_BASE_URL is set, since feed
+    clients need an absolute URL for the local copies.
+    """
+
+    def __init__(self, scheduler: FetchScheduler = None, directory: str = THUMBNAIL_DIR, base_url: str = THUMBNAIL_BASE_URL,
+                 max_bytes: int = THUMBNAIL_MAX_BYTES, renditions: dict = RENDITIONS, downloads: int = THUMBNAIL_DOWNLOADS):
+        self.directory = directory
+        self.base_url = base_url
+        self.max_bytes = max_bytes
+        self.renditions = renditions
+        self.enabled = bool(base_url)
+        self.download_slots = asyncio.Semaphore(downloads)
+        self.scheduler = scheduler
+        self.owns_scheduler = False
+        self.in_flight: dict[str, asyncio.Task] = {}
+        self.failed: set[str] = set()     # source URLs that could not be stored this run
+        self.run_started = time.time()    # images used since then are never evicted
+        index = self._read_index()
+        self.sources: dict[str, str] = index.get("sources", {})   # sha1(source url) -> content hash
+        self.files: dict[str, dict] = index.get("files", {})      # content hash -> {"renditions", "bytes", "last_used"}
+        self.changed_sources: set[str] = set()   # written this run, merged into the index on disk by save()
+        self.changed_files: set[str] = set()
+        self.dirty = False
+
+    # ---- index ----
+    def _read_index(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _merge_index(self):
+        """Take what other processes stored since we read the index; our own changes win."""
+        index = self._read_index()
+        files = index.get("files", {})
+        for content_hash in self.changed_files:
+            ours = self.files[content_hash]
+            theirs = files.get(content_hash)
+            if theirs is not None:
+                ours["last_used"] = max(ours.get("last_used", 0), theirs.get("last_used", 0))
+            files[content_hash] = ours
+        sources = index.get("sources", {})
+        sources.update({key: self.sources[key] for key in self.changed_sources})
+        self.files = files
+        self.sources = {key: content_hash for key, content_hash in sources.items() if content_hash in files}
+
+    def _write_index(self):
+        fd, tmp = tempfile.mkstemp(prefix=INDEX_FILE, suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump({"sources": self.sources, "files": self.files}, fh)
+            os.replace(tmp, os.path.join(self.directory, INDEX_FILE))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def save(self):
+        """Merge into the index on disk, evict down to the size limit and write it back, all under the lock."""
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_FILE), "w") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._merge_index()
+                self.evict()
+                self._write_index()
+            self.changed_sources.clear()
+            self.changed_files.clear()
+            self.dirty = False
+        except OSError as e:
+            logging.warning(f"[THUMBS] could not write index: {e}")
+
+    # ---- storage ----
+    def _public_urls(self, entry: dict) -> dict:
+        return {name: f"{self.base_url}/{path}" for name, path in entry["renditions"].items()}
+
+    def _write_renditions(self, content_hash: str, data: bytes, content_type: str) -> dict:
+        """Write the renditions for one image (runs in a thread: Pillow is CPU-bound)."""
+        subdir = content_hash[:2]
+        os.makedirs(os.path.join(self.directory, subdir), exist_ok=True)
+        renditions, total = {}, 0
+
+        image = None
+        if Image is not None:
+            try:
+                image = Image.open(io.BytesIO(data))
+                image.load()
+            except Exception:
+                image = None
+
+        if image is None:
+            # no Pillow / unreadable: keep the original once for every rendition
+            path = f"{subdir}/{content_hash}{EXTENSIONS.get(content_type, '.img')}"
+            with open(os.path.join(self.directory, path), "wb") as fh:
+                fh.write(data)
+            return {"renditions": {name: path for name in self.renditions}, "bytes": len(data)}
+
+        if image.mode not in ("RGB", "L"):
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA").split()[-1])
+            image = background
+        for name, width in self.renditions.items():
+            resized = image.copy()
+            if resized.width > width:
+                resized.thumbnail((width, round(resized.height * width / resized.width)))
+            path = f"{subdir}/{content_hash}_{width}.jpg"
+            full = os.path.join(self.directory, path)
+            if not os.path.exists(full):
+                resized.save(full, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            renditions[name] = path
+            total += os.path.getsize(full)
+        return {"renditions": renditions, "bytes": total}
+
+    async def _download(self, url: str):
+        if self.scheduler is None:
+            self.scheduler = FetchScheduler(timeout=15, health=DomainHealthRegistry())
+            self.owns_scheduler = True
+        async with self.download_slots:
+            # 🔹 same per-host limits and breaker as the page fetches (DomainOpenError when open)
+            async with self.scheduler.stream(url, timeout=15) as r:
+                content_type = (r.headers.get("content-type") or "").split(";")[0].strip().lower()
+                if r.status_code != 200 or not content_type.startswith("image/"):
+                    return None, None
+                chunks, size = [], 0
+                async for chunk in r.aiter_bytes():
+                    size += len(chunk)
+                    if size > DOWNLOAD_BYTE_CAP:
+                        return None, None
+                    chunks.append(chunk)
+                return b"".join(chunks), content_type
+
+    async def _store(self, url: str, source_key: str):
+        data, content_type = await self._download(url)
+        if not data:
+            self.failed.add(source_key)
+            return None
+        content_hash = hashlib.sha256(data).hexdigest()
+        entry = self.files.get(content_hash)
+        if not self._usable(entry):
+            entry = await asyncio.to_thread(self._write_renditions, content_hash, data, content_type)
+            self.files[content_hash] = entry
+        self.sources[source_key] = content_hash
+        entry["last_used"] = time.time()
+        self.changed_sources.add(source_key)
+        self.changed_files.add(content_hash)
+        self.dirty = True
+        return self._public_urls(entry)
+
+    def _usable(self, entry: dict) -> bool:
+        """Stored with the current renditions and still on disk."""
+        return (
+            entry is not None
+            and entry["renditions"].keys() == self.renditions.keys()
+            and all(os.path.exists(os.path.join(self.directory, p)) for p in entry["renditions"].values())
+        )
+
+    async def localize(self, url: str):
+        """{output: local url} for an image URL, downloading it only if it is not stored yet; None on failure."""
+        if not self.enabled or not url or not url.startswith("http"):
+            return None
+        source_key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        if source_key in self.failed:
+            return None
+        content_hash = self.sources.get(source_key, "")
+        entry = self.files.get(content_hash)
+        if self._usable(entry):
+            entry["last_used"] = time.time()
+            self.changed_files.add(content_hash)
+            self.dirty = True
+            return self._public_urls(entry)
+
+        task = self.in_flight.get(source_key)
+        if task is None:
+            task = asyncio.ensure_future(self._store(url, source_key))
+            self.in_flight[source_key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(source_key, None))
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            self.failed.add(source_key)
+            logging.warning(f"[THUMBS] {url} → {e}")
+            return None
+
+    # ---- eviction ----
+    def evict(self):
+        total = sum(entry.get("bytes", 0) for entry in self.files.values())
+        if total <= self.max_bytes:
+            return
+        removed = set()
+        # 🔹 self.files already carries last_used merged from the locked on-disk index (save()),
+        #    so images another run used recently are protected too
+        protected_since = min(self.run_started, time.time() - EVICT_GRACE)
+        for content_hash, entry in sorted(self.files.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            if total <= self.max_bytes or entry.get("last_used", 0) >= protected_since:
+                break
+            for path in set(entry["renditions"].values()):
+                try:
+                    os.remove(os.path.join(self.directory, path))
+                except OSError:
+                    pass
+            total -= entry.get("bytes", 0)
+            removed.add(content_hash)
+        for content_hash in removed:
+            del self.files[content_hash]
+        self.sources = {k: v for k, v in self.sources.items() if v not in removed}
+        self.changed_files -= removed
+        self.changed_sources = {k for k in self.changed_sources if k in self.sources}
+        self.dirty = True
+        logging.info(f"[THUMBS] evicted {len(removed)} images, {total // (1024 * 1024)} MB kept")
+
+    # ---- feed items ----
+    def _download_url(self, item: dict) -> str:
+        """Largest CDN rendition if image_cdn produced one (smaller download than the source), else the URL itself."""
+        renditions = item.get("thumbnail_renditions") or {}
+        if renditions and self.renditions:
+            largest = max(self.renditions, key=self.renditions.get)
+            return renditions.get(largest) or renditions.get("source") or item.get("thumbnail_url") or ""
+        return item.get("thumbnail_url") or ""
+
+    async def apply(self, item: dict) -> dict:
+        """Point an item's thumbnail_url / thumbnail_renditions / images at local copies where possible."""
+        if not self.enabled:
+            return item
+        local = await self.localize(self._download_url(item))
+        if local:
+            item["thumbnail_renditions"] = {**(item.get("thumbnail_renditions") or {}), **local}
+            item["thumbnail_url"] = local.get(DEFAULT_OUTPUT) or next(iter(local.values()))
+        if item.get("images"):
+            images = []
+            for image_url in item["images"]:
+                local_image = await self.localize(image_url)
+                images.append(local_image.get(DEFAULT_OUTPUT) or next(iter(local_image.values())) if local_image else image_url)
+            item["images"] = images
+        return item
+
+    async def apply_all(self, items: list[dict]) -> list[dict]:
+        if self.enabled and items:
+            await asyncio.gather(*(self.apply(item) for item in items), return_exceptions=True)
+        return items
+
+    def flush(self):
+        """Evict down to the size limit and persist the index."""
+        if self.enabled:
+            self.save()
+
+    async def aclose(self):
+        self.flush()
+        if self.owns_scheduler:
+            await self.scheduler.aclose()
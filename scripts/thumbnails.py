@@ -0,0 +1,92 @@
+import re
+from urllib.parse import urljoin
+
+# ----------------------------
+# Listing image → thumbnail URL
+# ----------------------------
+LAZY_SRC_ATTRS = ["data-src", "data-lazy-src", "data-original", "data-lazy", "data-url"]
+SRCSET_ATTRS = ["data-srcset", "srcset"]
+PLACEHOLDER_HINTS = ["placeholder", "blank.gif", "spacer.gif", "transparent.gif", "transparent.png", "pixel.gif", "loader.gif", "loading.gif"]
+MIN_DIMENSION = 60   # width/height attributes below this are icons, not thumbnails
+
+_DESCRIPTOR = re.compile(r"^(\d+(?:\.\d+)?)([wx])$")
+
+
+def parse_srcset(srcset: str) -> list[tuple[str, str, float]]:
+    """
+    Split a srcset into [(url, "w" | "x" | "", value), ...]. URLs may contain
+    commas (Cloudinary "c_fill,w_300"), so candidates are split the way browsers
+    do it: the URL runs to the next whitespace, its descriptor to the next comma.
+    """
+    candidates = []
+    pos, n = 0, len(srcset)
+    while pos < n:
+        while pos < n and (srcset[pos].isspace() or srcset[pos] == ","):
+            pos += 1
+        start = pos
+        while pos < n and not srcset[pos].isspace():
+            pos += 1
+        url = srcset[start:pos]
+        descriptor = ""
+        if url.endswith(","):
+            url = url.rstrip(",")
+        else:
+            start = pos
+            while pos < n and srcset[pos] != ",":
+                pos += 1
+            descriptor = srcset[start:pos].strip()
+            pos += 1
+        if not url:
+            continue
+        match = _DESCRIPTOR.match(descriptor)
+        if match:
+            candidates.append((url, match.group(2), float(match.group(1))))
+        else:
+            candidates.append((url, "", 0.0))
+    return candidates
+
+
+def best_srcset_url(srcset: str) -> str:
+    """Largest candidate: highest width descriptor, else highest density, else the first URL."""
+    candidates = [c for c in parse_srcset(srcset) if not _is_placeholder(c[0])]
+    if not candidates:
+        return ""
+    for kind in ("w", "x"):
+        sized = [c for c in candidates if c[1] == kind]
+        if sized:
+            return max(sized, key=lambda c: c[2])[0]
+    return candidates[0][0]
+
+
+def _is_placeholder(url: str) -> bool:
+    lowered = url.lower()
+    return lowered.startswith("data:") or lowered.endswith(".svg") or any(h in lowered for h in PLACEHOLDER_HINTS)
+
+
+def _too_small(img) -> bool:
+    for attr in ("width", "height"):
+        value = (img.get(attr) or "").strip().rstrip("px")
+        if value.isdigit() and int(value) < MIN_DIMENSION:
+            return True
+    return False
+
+
+def listing_image_url(img, base_url: str) -> str:
+    """
+    Best thumbnail URL for an <img> found next to a headline on a listing page:
+    srcset / data-srcset (largest candidate), then lazy-load attributes
+    (data-src, ...), then src. Placeholders, data: URIs, SVGs and icon-sized
+    images give "". Relative URLs are resolved against base_url.
+    """
+    if img is None or _too_small(img):
+        return ""
+    for attr in SRCSET_ATTRS:
+        if img.get(attr):
+            url = best_srcset_url(img[attr])
+            if url:
+                return urljoin(base_url, url)
+    for attr in LAZY_SRC_ATTRS + ["src"]:
+        url = (img.get(attr) or "").strip()
+        if url and not _is_placeholder(url):
+            return urljoin(base_url, url)
+    return ""
@@ -0,0 +1,162 @@
+import os
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, parse_qsl
+
+from prisma import Prisma
+
+from url_utils import canonical_url, url_hash
+
+# ----------------------------
+# Settings
+# ----------------------------
+MIN_SAMPLES = int(os.getenv("URL_PATTERN_MIN_SAMPLES", "5"))   # fetched pages of a shape before it is judged
+NAV_RATIO = 0.1                # at most this share of articles → the shape is navigation
+EXPLORE_EVERY = 20             # 1 in N links of a rejected shape is still fetched, so a changed layout is noticed
+PATTERN_TTL = timedelta(days=int(os.getenv("URL_PATTERN_TTL_DAYS", "90")))   # shapes not seen for this long are dropped
+ARTICLE_MIN_CHARS = 1500       # body text of a dated page that makes it an article
+LOAD_CHUNK = 500
+
+_YEAR = re.compile(r"^(19|20)\d{2}$")
+_DAY = re.compile(r"^(19|20)\d{2}-?(0[1-9]|1[0-2])-?(0[1-9]|[12]\d|3[01])$")
+_MONTH_OR_DAY = re.compile(r"^\d{1,2}$")
+_NUMBER = re.compile(r"^\d+$")
+_LONG_ID = re.compile(r"\d{5,}")
+_WORDS = re.compile(r"[-_+]+")
+_EXTENSION = re.compile(r"\.([a-z0-9]{2,5})$", re.IGNORECASE)
+
+
+# ----------------------------
+# URL shape
+# ----------------------------
+def _segment_shape(segment: str, previous: str, first: bool) -> str:
+    if _DAY.match(segment) or _YEAR.match(segment) or (previous == "{date}" and _MONTH_OR_DAY.match(segment)):
+        return "{date}"
+    if _NUMBER.match(segment):
+        return "{num}"
+    words = [w for w in _WORDS.split(segment) if w]
+    if len(words) >= 3:
+        return "{slug}"   # "pm-meets-us-envoy", "story-title-12345"
+    if _LONG_ID.search(segment):
+        return "{id}"     # "a1234567", "article123456"
+    # 🔹 the top-level section stays literal (/world vs /tag); deeper single words are values (/tag/{word})
+    return segment.lower() if first else "{word}"
+
+
+def url_pattern(url: str) -> tuple:
+    """
+    (domain, shape) of a URL: every path segment reduced to {date}, {num}, {id},
+    {slug} or {word} (the first segment is kept as is), plus the sorted query keys.
+    "https://www.site.com/world/2025/06/10/pm-meets-envoy.html?id=3" →
+    ("site.com", "/world/{date}/{slug}.html?id").
+    """
+    parts = urlsplit(canonical_url(url))
+    domain = (parts.hostname or "").removeprefix("www.")
+    shape = []
+    for i, segment in enumerate(s for s in parts.path.split("/") if s):
+        match = _EXTENSION.search(segment)
+        extension = match.group(0).lower() if match and not _NUMBER.match(match.group(1)) else ""
+        token = _segment_shape(segment[: len(segment) - len(extension)], shape[-1] if shape else "", i == 0)
+        if token == "{date}" and shape and shape[-1] == "{date}":
+            continue   # /2025/06/10/ is one date
+        shape.append(token + extension)
+    keys = sorted({k.lower() for k, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    return domain, "/" + "/".join(shape) + ("?" + "&".join(keys) if keys else "")
+
+
+def article_shape(url: str) -> bool:
+    """Prior for a URL nothing was learned about: a date, slug or long id in the path reads like an article."""
+    shape = url_pattern(url)[1]
+    return any(token in shape for token in ("{date}", "{slug}", "{id}"))
+
+
+def looks_like_article(details: dict) -> bool:
+    """Training label for a fetched page: og:type article, or a dated page with a real body."""
+    if not details:
+        return False
+    if (details.get("og_type") or "").lower() == "article":
+        return True
+    return bool(details.get("published_time")) and len(details.get("content_text") or "") >= ARTICLE_MIN_CHARS
+
+
+# ----------------------------
+# Per-domain model
+# ----------------------------
+class UrlPatternModel:
+    """
+    Per-domain URL shapes learned from pages the crawlers fetched, kept across runs.
+
+    Each (domain, shape) counts how many fetched pages were articles and how many
+    were not (section fronts, tag pages, pagination, ...). Once a shape has
+    MIN_SAMPLES pages and at most NAV_RATIO of them were articles, is_nav() rejects
+    links of that shape with one dict lookup, before any DOM work or fetch. Unknown
+    shapes are never rejected, and one in EXPLORE_EVERY links of a rejected shape
+    is let through so the counts keep up with layout changes.
+
+    Call load(db, domains) before filtering a page's links, is_nav() per link,
+    learn() after each fetched page, and save(db) / prune(db) before disconnecting.
+    """
+
+    def __init__(self, min_samples: int = MIN_SAMPLES, nav_ratio: float = NAV_RATIO):
+        self.min_samples = min_samples
+        self.nav_ratio = nav_ratio
+        self.counts: dict[tuple, list] = {}   # (domain, shape) -> [articles, others]
+        self.dirty: dict[tuple, list] = {}    # (domain, shape) -> [articles, others] learned this run
+        self.loaded: set[str] = set()
+        self.rejected = 0
+
+    async def load(self, db: Prisma, domains):
+        domains = list({d.removeprefix("www.") for d in domains if d} - self.loaded)
+        for i in range(0, len(domains), LOAD_CHUNK):
+            rows = await db.urlpattern.find_many(where={"domain": {"in": domains[i : i + LOAD_CHUNK]}})
+            for row in rows:
+                counts = self.counts.setdefault((row.domain, row.pattern), [0, 0])
+                counts[0] += row.articles
+                counts[1] += row.others
+        self.loaded.update(domains)
+
+    def is_nav(self, url: str) -> bool:
+        counts = self.counts.get(url_pattern(url))
+        if not counts:
+            return False
+        articles, others = counts
+        total = articles + others
+        if total < self.min_samples or articles > total * self.nav_ratio:
+            return False
+        if int(url_hash(url)[:8], 16) % EXPLORE_EVERY == 0:
+            return False
+        self.rejected += 1
+        return True
+
+    def article_share(self, url: str):
+        """Share of fetched pages of this URL's shape that were articles; None until MIN_SAMPLES were seen."""
+        counts = self.counts.get(url_pattern(url))
+        if not counts or sum(counts) < self.min_samples:
+            return None
+        return counts[0] / sum(counts)
+
+    def learn(self, url: str, is_article: bool):
+        key = url_pattern(url)
+        slot = 0 if is_article else 1
+        self.counts.setdefault(key, [0, 0])[slot] += 1
+        self.dirty.setdefault(key, [0, 0])[slot] += 1
+
+    async def save(self, db: Prisma):
+        if not self.dirty:
+            return
+        async with db.batch_() as batcher:
+            for (domain, pattern), (articles, others) in self.dirty.items():
+                batcher.urlpattern.upsert(
+                    where={"domain_pattern": {"domain": domain, "pattern": pattern}},
+                    data={
+                        "create": {"domain": domain, "pattern": pattern, "articles": articles, "others": others},
+                        "update": {"articles": {"increment": articles}, "others": {"increment": others}},
+                    },
+                )
+        logging.info(f"[URL PATTERNS] saved {len(self.dirty)} shapes ({self.rejected} links rejected this run)")
+        self.dirty.clear()
+
+    async def prune(self, db: Prisma):
+        removed = await db.urlpattern.delete_many(where={"updatedAt": {"lt": datetime.now(timezone.utc) - PATTERN_TTL}})
+        logging.info(f"[URL PATTERNS] pruned {removed} stale shapes")
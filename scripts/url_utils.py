@@ -0,0 +1,135 @@
+import hashlib
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, unquote_plus, urlencode
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# query parameters that only track where a click came from
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_", "at_", "__twitter_impression")
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid", "igshid", "mc_cid", "mc_eid",
+    "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "ref_src", "ref_url", "cmpid", "ocid", "smid", "sr_share",
+    "ito", "icid", "ncid", "xtor", "taid", "guccounter", "guce_referrer",
+}
+AMP_PARAMS = {"amp": {"", "1", "true"}, "outputtype": {"amp"}, "output": {"amp"}}
+SKIP_SCHEMES = ("javascript:", "mailto:", "tel:", "sms:", "data:", "whatsapp:", "#")
+
+
+# ----------------------------
+# Clean URL (for links we store, fetch and show)
+# ----------------------------
+def _is_tracking(key: str) -> bool:
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def _is_dropped(segment: str) -> bool:
+    """A raw "key=value" query segment that only tracks the click or asks for the AMP page (?amp=1 / ?outputType=amp)."""
+    key, _, value = segment.partition("=")
+    key, value = unquote_plus(key).lower(), unquote_plus(value).lower()
+    return _is_tracking(key) or value in AMP_PARAMS.get(key, ())
+
+
+def _strip_amp(host: str, path: str) -> tuple:
+    """AMP variants of an article → the regular page: amp. hosts, /amp(/) and .amp paths."""
+    if host.startswith("amp."):
+        host = host[4:]
+    trimmed = path.rstrip("/")
+    if trimmed.endswith("/amp"):
+        path = trimmed[:-4] or "/"
+    elif trimmed.endswith(".amp"):
+        path = trimmed[:-4]
+    elif trimmed.startswith("/amp/"):
+        path = path[4:]
+    return host, path
+
+
+def clean_url(url: str) -> str:
+    """
+    The URL an article should be stored and fetched under: no fragment, no
+    tracking parameters (utm_*, fbclid, ...), and the regular page instead of
+    its AMP variant ("https://amp.site.com/a/amp/?utm_source=x#top" →
+    "https://site.com/a"). Case, port and trailing slash are left alone.
+    """
+    if not url:
+        return ""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    netloc, path = parts.netloc, parts.path
+    host = (parts.hostname or "").lower()
+    if host:
+        stripped_host, path = _strip_amp(host, path)
+        if stripped_host != host:
+            netloc = netloc.lower().replace(host, stripped_host, 1)
+    # 🔹 drop whole raw segments, so the parameters that survive keep their exact encoding (q=a%20b stays q=a%20b)
+    segments = parts.query.split("&")
+    kept = [seg for seg in segments if not _is_dropped(seg)]
+    query = parts.query if len(kept) == len(segments) else "&".join(seg for seg in kept if seg)
+    return urlunsplit((parts.scheme, netloc, path, query, ""))
+
+
+def resolve_link(base_url: str, href: str) -> str:
+    """
+    Absolute, cleaned URL for an href found on base_url (../ paths and sources
+    below the site root included); "" for javascript:, mailto:, bare #fragments
+    and other non-page links.
+    """
+    href = (href or "").strip()
+    if not href or href.lower().startswith(SKIP_SCHEMES):
+        return ""
+    try:
+        absolute = urljoin(base_url, href)
+    except ValueError:
+        return ""
+    if not absolute.lower().startswith(("http://", "https://")):
+        return ""
+    return clean_url(absolute)
+
+
+def prefer_canonical(url: str, canonical: str) -> str:
+    """
+    An article's <link rel=canonical> (resolved and cleaned) in place of url,
+    unless it is missing or points at a site root — some CMSs emit the homepage
+    as every page's canonical.
+    """
+    resolved = resolve_link(url, canonical) if canonical else ""
+    if not resolved or urlsplit(resolved).path.strip("/") == "":
+        return url
+    return resolved
+
+
+# ----------------------------
+# Canonical URL (dedup / cache key)
+# ----------------------------
+def canonical_url(url: str) -> str:
+    """
+    Normalised form of a URL for use as a cache / dedup key: clean_url(), then
+    lower-case scheme and host, no default port, no trailing slash on the path
+    and sorted query parameters
+    ("https://Example.com:443/news/?b=2&a=1&utm_source=x#top" → "https://example.com/news?a=1&b=2").
+    """
+    url = clean_url(url)
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and DEFAULT_PORTS.get(scheme) != port:
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)), safe=":/,@")
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def url_hash(url: str) -> str:
+    """sha1 of the canonical URL, for fixed-size DB keys."""
+    return hashlib.sha1(canonical_url(url).encode("utf-8")).hexdigest()